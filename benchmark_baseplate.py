@@ -0,0 +1,625 @@
+#!/usr/bin/env python3
+"""
+Per-stage benchmarks of the irregular baseplate generator.
+
+This script times the individual stages of generate_irregular_baseplate.py
+(image loading, rectangle decomposition, edge/interior split, border and
+frame geometry, rectangle merging and script generation) on seeded
+synthetic masks, stores the timings as JSON and compares two result files
+to flag regressions. The scaling command measures the speedup of the tiled
+decomposition (--tiles, --jobs) over the serial one per core count.
+"""
+
+import sys
+import io
+import argparse
+import contextlib
+import json
+import os
+import platform
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image
+import numpy as np
+from typing import Callable, Dict, List, Tuple
+
+import generate_irregular_baseplate as gib
+
+
+# Benchmark result file format version. Bump it whenever the stored fields
+# change meaning.
+BENCHMARK_FORMAT_VERSION = 1
+
+# Default mask sizes (square, in brick units) and seed of the generators
+DEFAULT_BENCHMARK_SIZES = (10, 50, 100, 250, 500)
+DEFAULT_BENCHMARK_SEED = 1
+DEFAULT_BENCHMARK_REPEAT = 3
+
+# Timed stages, in pipeline order
+BENCHMARK_STAGES = ('load', 'decompose', 'edge', 'border', 'frame', 'merge', 'script')
+
+# Stage options: edge thickness in brick units, border thickness and frame
+# padding in mm, and the border height adjustment that adds the inset top layer
+BENCHMARK_EDGE = 2
+BENCHMARK_BORDER_MM = 3.3
+BENCHMARK_FRAME_PADDING_MM = 2.5
+BENCHMARK_BORDER_HEIGHT_ADJUST_MM = 1.5
+
+# A stage regresses when it is more than this many percent slower than in
+# the baseline. Stages faster than the noise floor (seconds) are not compared.
+DEFAULT_REGRESSION_THRESHOLD = 10.0
+DEFAULT_NOISE_FLOOR = 0.001
+
+# Scaling command defaults: one large connected shape, cut into
+# DEFAULT_SCALING_TILES strips of rows, timed with these numbers of worker
+# processes. Tiles do not change the result, so there are enough strips to
+# keep the largest pool busy.
+DEFAULT_SCALING_SHAPE = 'blobs'
+DEFAULT_SCALING_SIZE = 500
+DEFAULT_SCALING_TILES = 8
+DEFAULT_SCALING_JOBS = (1, 2, 4, 8)
+
+
+def blob_mask(size: int, rng: np.random.Generator) -> np.ndarray:
+    """
+    Union of random discs.
+
+    Args:
+        size: Width and height of the mask
+        rng: Seeded random generator
+
+    Returns:
+        2D boolean mask
+    """
+    rows, cols = np.mgrid[0:size, 0:size]
+    mask = np.zeros((size, size), dtype=bool)
+    for _ in range(max(1, size // 8)):
+        cy, cx = rng.uniform(0, size, 2)
+        radius = rng.uniform(size / 20, size / 6) + 1
+        mask |= (rows - cy) ** 2 + (cols - cx) ** 2 <= radius ** 2
+    return mask
+
+
+def spiral_mask(size: int, rng: np.random.Generator) -> np.ndarray:
+    """
+    Archimedean spiral band around the centre, with a random start angle.
+
+    Args:
+        size: Width and height of the mask
+        rng: Seeded random generator
+
+    Returns:
+        2D boolean mask
+    """
+    rows, cols = np.mgrid[0:size, 0:size]
+    dy = rows - (size - 1) / 2
+    dx = cols - (size - 1) / 2
+    radius = np.hypot(dx, dy)
+    angle = (np.arctan2(dy, dx) + rng.uniform(0, 2 * np.pi)) % (2 * np.pi)
+
+    # Radius grows by one pitch per turn; the band covers half of each pitch
+    pitch = max(4.0, size / 10)
+    phase = (radius - angle / (2 * np.pi) * pitch) % pitch
+    return (phase < pitch / 2) & (radius <= size / 2)
+
+
+def checkerboard_mask(size: int, rng: np.random.Generator) -> np.ndarray:
+    """
+    Checkerboard of 2x2 cell squares with a random phase.
+
+    Args:
+        size: Width and height of the mask
+        rng: Seeded random generator
+
+    Returns:
+        2D boolean mask
+    """
+    rows, cols = np.mgrid[0:size, 0:size]
+    return ((rows // 2 + cols // 2 + int(rng.integers(2))) % 2).astype(bool)
+
+
+def l_shape_mask(size: int, rng: np.random.Generator) -> np.ndarray:
+    """
+    L-shape with random arm thicknesses.
+
+    Args:
+        size: Width and height of the mask
+        rng: Seeded random generator
+
+    Returns:
+        2D boolean mask
+    """
+    mask = np.zeros((size, size), dtype=bool)
+    vertical_arm = int(rng.integers(max(1, size // 5), max(2, size // 2)))
+    horizontal_arm = int(rng.integers(max(1, size // 5), max(2, size // 2)))
+    mask[:, :vertical_arm] = True
+    mask[size - horizontal_arm:, :] = True
+    return mask
+
+
+def ring_mask(size: int, rng: np.random.Generator) -> np.ndarray:
+    """
+    Concentric thin rings (1-2 cells wide) around a random centre.
+
+    Args:
+        size: Width and height of the mask
+        rng: Seeded random generator
+
+    Returns:
+        2D boolean mask
+    """
+    rows, cols = np.mgrid[0:size, 0:size]
+    cy, cx = rng.uniform(size / 3, 2 * size / 3, 2)
+    radius = np.hypot(rows - cy, cols - cx)
+    width = 1 + int(rng.integers(2))
+    return (radius % 6 < width) & (radius <= size / 2)
+
+
+# Synthetic mask generators by name
+MASK_GENERATORS: Dict[str, Callable[[int, np.random.Generator], np.ndarray]] = {
+    'blobs': blob_mask,
+    'spiral': spiral_mask,
+    'checkerboard': checkerboard_mask,
+    'lshape': l_shape_mask,
+    'rings': ring_mask,
+}
+
+
+def time_stage(function: Callable[[], object], repeat: int) -> Tuple[float, object]:
+    """
+    Run a stage several times and keep the fastest run.
+
+    Args:
+        function: Stage to run, without arguments
+        repeat: Number of runs
+
+    Returns:
+        Tuple of (best wall time in seconds, result of the last run)
+    """
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def benchmark_mask(mask: np.ndarray, image_path: str, config: Dict[str, float], unit_size: float,
+                   engine: str, geometry: str, repeat: int) -> Tuple[Dict[str, float], Dict[str, int]]:
+    """
+    Time every stage of the pipeline on one mask.
+
+    Args:
+        mask: 2D boolean mask
+        image_path: PNG file holding the same mask (dark = inside)
+        config: Parsed OpenSCAD config dictionary
+        unit_size: Size of one brick unit in mm
+        engine: Rectangle decomposition engine
+        geometry: Border/frame geometry engine
+        repeat: Number of runs per stage; the fastest one is kept
+
+    Returns:
+        Tuple of (stage name -> seconds, output name -> rectangle count)
+    """
+    inset_mm = -config.get('baseSideAdjustment', -0.1)
+    timings = {}
+    counts = {}
+
+    timings['load'], _ = time_stage(lambda: gib.load_and_threshold_image(image_path), repeat)
+    timings['decompose'], rectangles = time_stage(lambda: gib.greedy_rectangle_decomposition(mask, engine), repeat)
+    timings['edge'], _ = time_stage(lambda: gib.extract_edge_and_interior(mask, BENCHMARK_EDGE), repeat)
+    timings['border'], border_rectangles = time_stage(
+        lambda: (gib.extract_border_rectangles_mm(mask, BENCHMARK_BORDER_MM, unit_size, 0.0, engine, geometry),
+                 gib.extract_border_rectangles_mm(mask, BENCHMARK_BORDER_MM, unit_size, inset_mm, engine, geometry)), repeat)
+    timings['frame'], frame_rectangles = time_stage(
+        lambda: (gib.extract_frame_rectangles_mm(mask, BENCHMARK_FRAME_PADDING_MM, unit_size, 0.0, engine, geometry),
+                 gib.extract_frame_rectangles_mm(mask, BENCHMARK_FRAME_PADDING_MM, unit_size, inset_mm, engine, geometry)), repeat)
+    timings['merge'], _ = time_stage(lambda: gib.merge_mm_rectangles(border_rectangles[0]), repeat)
+
+    def generate_script() -> int:
+        script = io.StringIO()
+        with contextlib.redirect_stdout(io.StringIO()):
+            gib.generate_openscad_script(rectangles, script, image_height=mask.shape[0], image_width=mask.shape[1],
+                                         border_rectangles=border_rectangles[0], border_rectangles_top=border_rectangles[1],
+                                         border_thickness_mm=BENCHMARK_BORDER_MM,
+                                         border_height_adjust_mm=BENCHMARK_BORDER_HEIGHT_ADJUST_MM,
+                                         unit_size=unit_size, config=config)
+        return len(script.getvalue())
+
+    timings['script'], script_size = time_stage(generate_script, repeat)
+
+    counts['plates'] = len(rectangles)
+    counts['border_rectangles'] = len(border_rectangles[0]) + len(border_rectangles[1])
+    counts['frame_rectangles'] = len(frame_rectangles[0]) + len(frame_rectangles[1])
+    counts['script_bytes'] = script_size
+    return timings, counts
+
+
+def run_benchmarks(args: argparse.Namespace) -> Dict[str, object]:
+    """
+    Benchmark every selected mask generator at every selected size.
+
+    Args:
+        args: Parsed command line options of the run command
+
+    Returns:
+        Result dictionary as written to the JSON file
+
+    Raises:
+        FileNotFoundError: If the config file does not exist
+        ValueError: If the config file is missing required values
+    """
+    config = gib.parse_openscad_config(args.config)
+    unit_size = gib.calculate_unit_size(config)
+
+    cases = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for shape in args.shapes:
+            for size in args.sizes:
+                # Seed per case so a subset of cases produces the same masks
+                rng = np.random.default_rng([args.seed, size, list(MASK_GENERATORS).index(shape)])
+                mask = MASK_GENERATORS[shape](size, rng)
+                image_path = os.path.join(temp_dir, f"{shape}-{size}.png")
+                Image.fromarray(np.where(mask, 0, 255).astype(np.uint8), 'L').save(image_path)
+
+                timings, counts = benchmark_mask(mask, image_path, config, unit_size, args.engine, args.borderGeometry, args.repeat)
+                cases.append({
+                    'case': f"{shape}-{size}",
+                    'shape': shape,
+                    'size': size,
+                    'cells': int(mask.sum()),
+                    'stages': {stage: round(seconds, 6) for stage, seconds in timings.items()},
+                    'counts': counts,
+                })
+                print(f"  {shape}-{size}: " + ", ".join(f"{stage} {timings[stage] * 1000:.1f}ms" for stage in BENCHMARK_STAGES),
+                      file=sys.stderr)
+
+    return {
+        'format': BENCHMARK_FORMAT_VERSION,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'options': {
+            'engine': args.engine,
+            'border_geometry': args.borderGeometry,
+            'repeat': args.repeat,
+            'seed': args.seed,
+        },
+        'cases': cases,
+    }
+
+
+def run_scaling(args: argparse.Namespace) -> Dict[str, object]:
+    """
+    Time the serial and the tiled decomposition of one mask per core count.
+
+    Every run decomposes the plates and the border (outline and inset top
+    layer) of the mask. The serial run uses one process without tiles; the
+    tiled runs cut the mask into args.tiles strips of rows and sweep
+    them on a warmed pool of N worker processes (in-process for N = 1).
+
+    Args:
+        args: Parsed command line options of the scaling command
+
+    Returns:
+        Result dictionary as written to the JSON file
+
+    Raises:
+        FileNotFoundError: If the config file does not exist
+        ValueError: If the config file is missing required values
+    """
+    config = gib.parse_openscad_config(args.config)
+    unit_size = gib.calculate_unit_size(config)
+    inset_mm = -config.get('baseSideAdjustment', -0.1)
+    rng = np.random.default_rng([args.seed, args.size, list(MASK_GENERATORS).index(args.shape)])
+    mask = MASK_GENERATORS[args.shape](args.size, rng)
+
+    def decompose(executor, tiles: int) -> Tuple[int, int]:
+        plates = gib.decompose_mask(mask, 'greedy', args.engine, executor=executor, tiles=tiles)
+        border = [gib.extract_border_rectangles_mm(mask, BENCHMARK_BORDER_MM, unit_size, inset, args.engine,
+                                                   args.borderGeometry, executor=executor, tiles=tiles)
+                  for inset in (0.0, inset_mm)]
+        return len(plates), sum(len(layer) for layer in border)
+
+    serial_seconds, (serial_plates, serial_border) = time_stage(lambda: decompose(None, 1), args.repeat)
+    print(f"  serial: {serial_seconds * 1000:.1f}ms, {serial_plates} plates, {serial_border} border rectangles",
+          file=sys.stderr)
+
+    runs = []
+    for jobs in args.jobs:
+        if jobs == 1:
+            seconds, (plates, border) = time_stage(lambda: decompose(None, args.tiles), args.repeat)
+        else:
+            with ProcessPoolExecutor(jobs) as executor:
+                # Start the workers before timing
+                list(executor.map(abs, range(jobs)))
+                seconds, (plates, border) = time_stage(lambda: decompose(executor, args.tiles), args.repeat)
+        runs.append({
+            'jobs': jobs,
+            'seconds': round(seconds, 6),
+            'speedup': round(serial_seconds / seconds, 3),
+            'plates': plates,
+            'border_rectangles': border,
+        })
+        print(f"  {jobs} jobs: {seconds * 1000:.1f}ms, speedup {serial_seconds / seconds:.2f}x, "
+              f"{plates} plates ({plates - serial_plates:+d}), {border} border rectangles ({border - serial_border:+d})",
+              file=sys.stderr)
+
+    return {
+        'format': BENCHMARK_FORMAT_VERSION,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'options': {
+            'shape': args.shape,
+            'size': args.size,
+            'tiles': args.tiles,
+            'engine': args.engine,
+            'border_geometry': args.borderGeometry,
+            'repeat': args.repeat,
+            'seed': args.seed,
+        },
+        'cells': int(mask.sum()),
+        'serial': {
+            'seconds': round(serial_seconds, 6),
+            'plates': serial_plates,
+            'border_rectangles': serial_border,
+        },
+        'runs': runs,
+    }
+
+
+def load_benchmark_results(path: str) -> Dict[str, Dict[str, float]]:
+    """
+    Load the stage timings of a benchmark result file.
+
+    Args:
+        path: Path to a JSON file written by the run command
+
+    Returns:
+        Dictionary mapping case name -> stage name -> seconds
+
+    Raises:
+        FileNotFoundError: If the file does not exist
+        ValueError: If the file is not a benchmark result of this format
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Benchmark results not found: {path}")
+    try:
+        with open(path, 'r') as f:
+            data = json.load(f)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Invalid JSON in benchmark results {path}: {e}")
+    if not isinstance(data, dict) or data.get('format') != BENCHMARK_FORMAT_VERSION:
+        raise ValueError(f"{path} is not a benchmark result file (format {BENCHMARK_FORMAT_VERSION})")
+    return {case['case']: case['stages'] for case in data['cases']}
+
+
+def compare_benchmarks(baseline: Dict[str, Dict[str, float]], current: Dict[str, Dict[str, float]],
+                       threshold: float, noise_floor: float) -> List[Tuple[str, str, float, float, bool]]:
+    """
+    Compare the stage timings of two benchmark runs.
+
+    Args:
+        baseline: Case -> stage -> seconds of the reference run
+        current: Case -> stage -> seconds of the run to check
+        threshold: Slowdown in percent above which a stage regresses
+        noise_floor: Stages faster than this many seconds in both runs are skipped
+
+    Returns:
+        List of (case, stage, baseline seconds, current seconds, regressed)
+        for every stage present in both runs
+    """
+    rows = []
+    for case, stages in baseline.items():
+        for stage, before in stages.items():
+            after = current.get(case, {}).get(stage)
+            if after is None or max(before, after) < noise_floor:
+                continue
+            regressed = after > before * (1 + threshold / 100)
+            rows.append((case, stage, before, after, regressed))
+    return rows
+
+
+def main():
+    """Main entry point for the benchmark script."""
+    parser = argparse.ArgumentParser(
+        description='Per-stage benchmarks of generate_irregular_baseplate.py on synthetic masks.'
+    )
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='Run the benchmarks and write the timings as JSON')
+    run_parser.add_argument(
+        '-o', '--output',
+        default='benchmark.json',
+        help='Path of the JSON result file (default: benchmark.json)'
+    )
+    run_parser.add_argument(
+        '--shapes',
+        nargs='+',
+        choices=list(MASK_GENERATORS),
+        default=list(MASK_GENERATORS),
+        help='Synthetic mask generators to run (default: all)'
+    )
+    run_parser.add_argument(
+        '--sizes',
+        nargs='+',
+        type=int,
+        default=list(DEFAULT_BENCHMARK_SIZES),
+        metavar='SIZE',
+        help=f'Mask sizes in brick units, square (default: {" ".join(str(s) for s in DEFAULT_BENCHMARK_SIZES)})'
+    )
+    run_parser.add_argument(
+        '--repeat',
+        type=int,
+        default=DEFAULT_BENCHMARK_REPEAT,
+        metavar='N',
+        help=f'Runs per stage; the fastest run is kept (default: {DEFAULT_BENCHMARK_REPEAT})'
+    )
+    run_parser.add_argument(
+        '--seed',
+        type=int,
+        default=DEFAULT_BENCHMARK_SEED,
+        help=f'Seed of the synthetic mask generators (default: {DEFAULT_BENCHMARK_SEED})'
+    )
+    run_parser.add_argument(
+        '--engine',
+        choices=gib.DECOMPOSITION_ENGINES,
+        default=gib.DEFAULT_DECOMPOSITION_ENGINE,
+        help=f'Rectangle decomposition engine (default: {gib.DEFAULT_DECOMPOSITION_ENGINE})'
+    )
+    run_parser.add_argument(
+        '--borderGeometry',
+        choices=gib.BORDER_GEOMETRIES,
+        default=gib.DEFAULT_BORDER_GEOMETRY,
+        help=f'Border/frame geometry engine (default: {gib.DEFAULT_BORDER_GEOMETRY})'
+    )
+    run_parser.add_argument(
+        '--config',
+        default='machineblocks/config/config-default.scad',
+        metavar='CONFIG_PATH',
+        help='Path to OpenSCAD config file (default: machineblocks/config/config-default.scad)'
+    )
+
+    scaling_parser = commands.add_parser('scaling', help='Measure the speedup of the tiled decomposition per core count')
+    scaling_parser.add_argument(
+        '-o', '--output',
+        help='Also write the timings as JSON to this file'
+    )
+    scaling_parser.add_argument(
+        '--shape',
+        choices=list(MASK_GENERATORS),
+        default=DEFAULT_SCALING_SHAPE,
+        help=f'Synthetic mask generator (default: {DEFAULT_SCALING_SHAPE})'
+    )
+    scaling_parser.add_argument(
+        '--size',
+        type=int,
+        default=DEFAULT_SCALING_SIZE,
+        help=f'Mask size in brick units, square (default: {DEFAULT_SCALING_SIZE})'
+    )
+    scaling_parser.add_argument(
+        '--tiles',
+        type=int,
+        default=DEFAULT_SCALING_TILES,
+        metavar='K',
+        help=f'Cut the mask into K strips of rows (default: {DEFAULT_SCALING_TILES})'
+    )
+    scaling_parser.add_argument(
+        '--jobs',
+        nargs='+',
+        type=int,
+        default=list(DEFAULT_SCALING_JOBS),
+        metavar='N',
+        help=f'Numbers of worker processes to time (default: {" ".join(str(j) for j in DEFAULT_SCALING_JOBS)})'
+    )
+    scaling_parser.add_argument(
+        '--repeat',
+        type=int,
+        default=DEFAULT_BENCHMARK_REPEAT,
+        metavar='N',
+        help=f'Runs per measurement; the fastest run is kept (default: {DEFAULT_BENCHMARK_REPEAT})'
+    )
+    scaling_parser.add_argument(
+        '--seed',
+        type=int,
+        default=DEFAULT_BENCHMARK_SEED,
+        help=f'Seed of the synthetic mask generator (default: {DEFAULT_BENCHMARK_SEED})'
+    )
+    scaling_parser.add_argument(
+        '--engine',
+        choices=gib.DECOMPOSITION_ENGINES,
+        default=gib.DEFAULT_DECOMPOSITION_ENGINE,
+        help=f'Rectangle decomposition engine (default: {gib.DEFAULT_DECOMPOSITION_ENGINE})'
+    )
+    scaling_parser.add_argument(
+        '--borderGeometry',
+        choices=('exact', 'raster'),
+        default=gib.DEFAULT_BORDER_GEOMETRY,
+        help=f'Border geometry engine (default: {gib.DEFAULT_BORDER_GEOMETRY})'
+    )
+    scaling_parser.add_argument(
+        '--config',
+        default='machineblocks/config/config-default.scad',
+        metavar='CONFIG_PATH',
+        help='Path to OpenSCAD config file (default: machineblocks/config/config-default.scad)'
+    )
+
+    compare_parser = commands.add_parser('compare', help='Compare two result files and flag regressions')
+    compare_parser.add_argument('baseline', help='JSON result file of the reference run')
+    compare_parser.add_argument('current', help='JSON result file of the run to check')
+    compare_parser.add_argument(
+        '--threshold',
+        type=float,
+        default=DEFAULT_REGRESSION_THRESHOLD,
+        metavar='PERCENT',
+        help=f'Flag stages more than this many percent slower than the baseline (default: {DEFAULT_REGRESSION_THRESHOLD})'
+    )
+    compare_parser.add_argument(
+        '--noiseFloor',
+        type=float,
+        default=DEFAULT_NOISE_FLOOR,
+        metavar='SECONDS',
+        help=f'Skip stages faster than this in both runs (default: {DEFAULT_NOISE_FLOOR})'
+    )
+
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        if args.repeat < 1:
+            parser.error("--repeat value must be >= 1")
+        if min(args.sizes) < 1:
+            parser.error("--sizes values must be >= 1")
+        try:
+            results = run_benchmarks(args)
+        except (FileNotFoundError, ValueError) as e:
+            parser.error(f"Config error: {e}")
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Benchmark results written: {args.output} ({len(results['cases'])} cases)")
+        return
+
+    if args.command == 'scaling':
+        if args.repeat < 1:
+            parser.error("--repeat value must be >= 1")
+        if args.size < 1:
+            parser.error("--size value must be >= 1")
+        if args.tiles < 1:
+            parser.error("--tiles value must be >= 1")
+        if min(args.jobs) < 1:
+            parser.error("--jobs values must be >= 1")
+        try:
+            results = run_scaling(args)
+        except (FileNotFoundError, ValueError) as e:
+            parser.error(f"Config error: {e}")
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(results, f, indent=2)
+            print(f"Scaling results written: {args.output}")
+        return
+
+    try:
+        baseline = load_benchmark_results(args.baseline)
+        current = load_benchmark_results(args.current)
+    except (FileNotFoundError, ValueError) as e:
+        parser.error(str(e))
+
+    rows = compare_benchmarks(baseline, current, args.threshold, args.noiseFloor)
+    print(f"{'case':<20} {'stage':<10} {'baseline':>10} {'current':>10} {'change':>8}")
+    for case, stage, before, after, regressed in rows:
+        change = (after / before - 1) * 100 if before > 0 else float('inf')
+        print(f"{case:<20} {stage:<10} {before * 1000:>8.1f}ms {after * 1000:>8.1f}ms {change:>+7.1f}%{'  REGRESSION' if regressed else ''}")
+
+    regressions = sum(1 for row in rows if row[4])
+    print(f"\n{len(rows)} stages compared, {regressions} regressions above {args.threshold}%")
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -8,15 +8,193 @@ baseplates arranged to match the shape.
 """
 
 import sys
+import base64
+import bisect
 import argparse
 import colorsys
 import random
 import re
 import os
+import json
+import hashlib
+import zipfile
+import glob
+import time
+import contextlib
+import functools
+import cProfile
+import tracemalloc
+import io
+import signal
+import socket
+import socketserver
+import ipaddress
+import stat
+import threading
+import struct
+import zlib
+from dataclasses import dataclass, field
+from concurrent.futures import Executor, ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from PIL import Image
 import numpy as np
-from scipy import ndimage
-from typing import List, Tuple, Set, Optional, Dict
+from scipy import ndimage, sparse
+from scipy.sparse.csgraph import connected_components
+from typing import Callable, List, Tuple, Set, Optional, Dict, Iterator, TextIO, Union
+
+
+# Available rectangle decomposition engines. All engines return exactly the
+# same rectangles; they only differ in speed.
+DECOMPOSITION_ENGINES = ('rle', 'histogram', 'scan')
+DEFAULT_DECOMPOSITION_ENGINE = 'rle'
+
+# Number of mask rows run-length encoded per NumPy pass, bounding the size of
+# the temporary arrays for very large masks
+RLE_CHUNK_ROWS = 1024
+
+# Resolution of the grid border and frame rectangles are snapped to
+BORDER_RESOLUTION_MM = 0.1
+
+# Border/frame geometry engines. 'exact' works on the compressed grid of
+# distinct rectangle edges, 'raster' on the full 0.1mm high-res mask and
+# 'packed' on the same mask stored as packed bits (8 cells per byte). All
+# produce exactly the same rectangles.
+BORDER_GEOMETRIES = ('exact', 'raster', 'packed')
+DEFAULT_BORDER_GEOMETRY = 'exact'
+
+# Rectangle edges are matched on coordinates snapped to this grid: whole
+# brick units for baseplates and interior cubes, 0.01mm for border/frame cubes
+MERGE_QUANTUM_MM = 0.01
+
+# Decomposition strategies. 'greedy' is the top-left greedy scan, 'optimal'
+# the minimum rectangle partition, computed per connected component and
+# falling back to greedy for components larger than the cell limit, and
+# 'cost' the candidate with the lowest predicted OpenSCAD render cost.
+DECOMPOSITION_STRATEGIES = ('greedy', 'optimal', 'cost')
+DEFAULT_DECOMPOSITION_STRATEGY = 'greedy'
+DEFAULT_OPTIMAL_MAX_CELLS = 250000
+
+# Predicted OpenSCAD render cost coefficients (roughly seconds): per
+# machineblock() plate, per stud, per brick unit of plate-to-plate seam and
+# per cube. Override them with a calibration file (see load_render_cost_model).
+DEFAULT_RENDER_COST_MODEL = {
+    'plate': 0.8,
+    'stud': 0.05,
+    'seam': 0.02,
+    'cube': 0.01,
+}
+
+# On-disk cache of decomposition results. Bump the format version whenever
+# the cached content or the geometry it depends on changes.
+CACHE_FORMAT_VERSION = 3
+DEFAULT_CACHE_DIR = os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache')), 'base-plate-outliner')
+DEFAULT_CACHE_SIZE_MB = 256
+
+# Incremental mode keeps the previous mask and rectangles next to the output.
+# Rectangles within this many cells of a changed cell are decomposed again.
+LAYOUT_SIDECAR_SUFFIX = '.layout.json'
+INCREMENTAL_NEIGHBOURHOOD = 1
+
+# --profile keeps the per-stage measurements in a JSON file next to the
+# output, and --profileStats the cProfile statistics of the slowest stage
+PROFILE_SIDECAR_SUFFIX = '.profile.json'
+PROFILE_STATS_SUFFIX = '.prof'
+
+# Server mode: default listen address, number of jobs that may wait for a
+# free worker, and the largest accepted job request
+DEFAULT_SERVER_ADDRESS = '127.0.0.1:8765'
+# Jobs read and write files inside this directory only (relative paths
+# without '..'); listening beyond loopback needs --allowRemote
+DEFAULT_SERVER_ROOT = '.'
+DEFAULT_SERVER_QUEUE_SIZE = 16
+MAX_JOB_REQUEST_BYTES = 64 * 1024 * 1024
+UNIX_SOCKET_PREFIX = 'unix:'
+
+# Raw mask inputs read without decoding an image (.npy arrays are memory
+# mapped), and the number of rows images are thresholded and masks unpacked
+# or hashed per pass. Keep the strip height a multiple of 8.
+RAW_MASK_EXTENSIONS = ('.npy', '.pbm')
+IMAGE_STRIP_ROWS = 1024
+
+# With --streamPng non-interlaced PNGs are decoded by read_png_gray_strips()
+# instead of PIL: file signature and number of samples per pixel of every
+# color type
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+PNG_CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+
+# --jobs decomposes the connected parts of a mask in worker processes.
+# Parts are cropped to their bounding box; consecutive parts are batched
+# into one task until their boxes hold this many cells.
+DEFAULT_JOBS = 1
+COMPONENT_BATCH_CELLS = 1 << 18
+
+# --tiles=K cuts the greedy decompositions into K strips of rows that are swept
+# independently (on the --jobs pool if there is one) and stitched together
+# again by a seam pass; the result is the same as without tiles
+DEFAULT_TILES = 1
+
+# Arguments passed to every machineblock() call after its size; studHeight is
+# dropped when the config does not define it
+MACHINEBLOCK_ARGUMENT_LINES = (
+    "baseCutoutType = \"none\",",
+    "studs = true,",
+    "studType = \"solid\",",
+    "studIcon = \"none\",",
+    "pillars = false,",
+    "",
+    "// Config parameters",
+    "unitMbu = unitMbu,",
+    "unitGrid = unitGrid,",
+    "scale = scale,",
+    "baseHeightAdjustment = baseHeightAdjustment,",
+    "baseSideAdjustment = 0,  // Set to 0 to eliminate gaps between baseplates",
+    "baseWallThicknessAdjustment = baseWallThicknessAdjustment,",
+    "baseClampThickness = baseClampThickness,",
+    "tubeXDiameterAdjustment = tubeXDiameterAdjustment,",
+    "tubeYDiameterAdjustment = tubeYDiameterAdjustment,",
+    "tubeZDiameterAdjustment = tubeZDiameterAdjustment,",
+    "holeXDiameterAdjustment = holeXDiameterAdjustment,",
+    "holeYDiameterAdjustment = holeYDiameterAdjustment,",
+    "holeZDiameterAdjustment = holeZDiameterAdjustment,",
+    "pinDiameterAdjustment = pinDiameterAdjustment,",
+    "studDiameterAdjustment = studDiameterAdjustment,",
+    "studHeight = studHeight,",
+    "studCutoutAdjustment = studCutoutAdjustment,",
+    "previewRender = previewRender,",
+    "previewQuality = previewQuality,",
+    "baseRoundingResolution = roundingResolution,",
+    "holeRoundingResolution = roundingResolution,",
+    "studRoundingResolution = roundingResolution,",
+    "pillarRoundingResolution = roundingResolution",
+)
+
+# Scripts are streamed to disk through a buffer of this size; STDOUT_PATH as
+# output path writes to standard output instead
+SCRIPT_WRITE_BUFFER_SIZE = 1024 * 1024
+STDOUT_PATH = '-'
+
+# Interior and border cubes can be written as one merged mesh that the
+# script import()s. Coordinates are rounded to this many decimals (in mm)
+# so that edges computed along different paths line up.
+CUBE_MESH_FORMATS = ('stl', '3mf')
+MESH_COORDINATE_DECIMALS = 6
+
+# Sharded output: each shard script is rendered to a mesh of this type next
+# to it, and the shards are listed in a JSON manifest
+SHARD_MESH_EXTENSION = '.stl'
+SHARD_MANIFEST_SUFFIX = '.shards.json'
+
+# Border/frame emission styles: one cube per rectangle, or one extruded
+# polygon per layer traced from the rectangles' outline
+BORDER_STYLES = ('cubes', 'outline')
+DEFAULT_BORDER_STYLE = 'cubes'
+
+# Command line options that only make sense for the command line run itself
+# (input/output files, batch and server mode, caches, profiling, the threshold
+# sweep report); the library API rejects them
+CLI_ONLY_OPTIONS = ('image', 'output', 'batch', 'workers', 'serve', 'listen', 'queueSize', 'incremental',
+                    'no_cache', 'cacheDir', 'cacheSize', 'profile', 'profileStats', 'sweep', 'serveRoot', 'allowRemote')
 
 
 def parse_openscad_config(config_path: str) -> Dict[str, float]:
@@ -98,32 +276,467 @@ def calculate_unit_size(config: Dict[str, float]) -> float:
     return unit_grid[0] * unit_mbu * scale_val
 
 
-def load_and_threshold_image(image_path: str, threshold: int = 128) -> np.ndarray:
+def new_profile(cprofile: bool = False) -> Dict[str, object]:
     """
-    Load a PNG image and convert it to a binary mask.
+    Create an empty pipeline profile for profile_stage().
 
     Args:
-        image_path: Path to the PNG image
+        cprofile: If True, run every stage under cProfile and keep the
+                  profiler of the slowest one
+
+    Returns:
+        Dictionary with 'stages' (stage records in run order), the cProfile
+        setting and 'slowest' ((wall time, profiler) of the slowest stage)
+    """
+    return {'stages': [], 'cprofile': cprofile, 'slowest': None}
+
+
+@contextlib.contextmanager
+def profile_stage(profile: Optional[Dict[str, object]], name: str) -> Iterator[Dict[str, object]]:
+    """
+    Measure one pipeline stage: wall time, CPU time and peak traced memory.
+
+    The peak memory is only recorded while tracemalloc is tracing. Stages
+    must not be nested.
+
+    Args:
+        profile: Profile from new_profile(), or None to measure nothing
+        name: Stage name
+
+    Yields:
+        Stage record; the stage adds its sizes and counts to it
+    """
+    record = {'stage': name}
+    if profile is None:
+        yield record
+        return
+
+    profiler = cProfile.Profile() if profile['cprofile'] else None
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.reset_peak()
+    start_wall = time.perf_counter()
+    start_cpu = time.process_time()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield record
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        wall = time.perf_counter() - start_wall
+        record['wall_s'] = round(wall, 6)
+        record['cpu_s'] = round(time.process_time() - start_cpu, 6)
+        if tracing:
+            record['peak_mb'] = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 3)
+        profile['stages'].append(record)
+        if profiler is not None and (profile['slowest'] is None or wall > profile['slowest'][0]):
+            profile['slowest'] = (wall, name, profiler)
+
+
+def mask_strips(height: int, rows: int = IMAGE_STRIP_ROWS) -> Iterator[slice]:
+    """Yield row slices covering a mask of the given height in strips."""
+    for top in range(0, height, rows):
+        yield slice(top, min(top + rows, height))
+
+
+def load_npy_mask(mask_path: str, threshold: int = 128) -> np.ndarray:
+    """
+    Open a raw .npy mask without reading it into memory.
+
+    A 2D boolean array is returned as a read-only memory map, so only the pages
+    the later stages touch are read from disk. Numeric arrays are treated as
+    grayscale images and thresholded strip by strip.
+
+    Args:
+        mask_path: Path to the .npy file
+        threshold: Grayscale threshold for numeric arrays. Values below it are "inside"
+
+    Returns:
+        2D boolean array (True = inside shape, False = outside)
+
+    Raises:
+        ValueError: If the array is not 2D or neither boolean nor numeric
+    """
+    array = np.load(mask_path, mmap_mode='r', allow_pickle=False)
+    if array.ndim != 2:
+        raise ValueError(f"Mask {mask_path} must be a 2D array, got shape {array.shape}")
+    if array.dtype == bool:
+        return array
+    if not np.issubdtype(array.dtype, np.number):
+        raise ValueError(f"Mask {mask_path} must be a boolean or numeric array, got {array.dtype}")
+    binary_mask = np.empty(array.shape, dtype=bool)
+    for strip in mask_strips(array.shape[0]):
+        np.less(array[strip], threshold, out=binary_mask[strip])
+    return binary_mask
+
+
+def load_pbm_mask(mask_path: str) -> np.ndarray:
+    """
+    Open a binary PBM (P4) bitmap as a mask, 1 bits being inside the shape.
+
+    The rows are packed 8 pixels per byte, most significant bit first, which is
+    the np.packbits() layout; they are memory mapped and unpacked strip by strip.
+
+    Args:
+        mask_path: Path to the .pbm file
+
+    Returns:
+        2D boolean array (True = inside shape, False = outside)
+
+    Raises:
+        ValueError: If the file is not a complete binary PBM bitmap
+    """
+    with open(mask_path, 'rb') as f:
+        header = f.read(1024)
+    # Magic number, width and height separated by whitespace and comments,
+    # followed by a single whitespace character before the bits
+    match = re.match(rb'P4((?:\s+|#[^\n]*\n)+)(\d+)((?:\s+|#[^\n]*\n)+)(\d+)\s', header)
+    if not match:
+        raise ValueError(f"Mask {mask_path} is not a binary PBM (P4) bitmap")
+    width, height = int(match.group(2)), int(match.group(4))
+    row_bytes = (width + 7) // 8
+    if os.path.getsize(mask_path) < match.end() + row_bytes * height:
+        raise ValueError(f"Mask {mask_path} is truncated, expected {width}x{height} pixels")
+    binary_mask = np.empty((height, width), dtype=bool)
+    if not width or not height:
+        return binary_mask
+    bits = np.memmap(mask_path, dtype=np.uint8, mode='r', offset=match.end(), shape=(height, row_bytes))
+    for strip in mask_strips(height):
+        binary_mask[strip] = np.unpackbits(bits[strip], axis=1, count=width).view(bool)
+    return binary_mask
+
+
+def rgb_to_gray(rgb: np.ndarray) -> np.ndarray:
+    """ITU-R 601-2 luma of (..., 3) uint8 RGB values, rounded like PIL's convert('L')."""
+    rgb = rgb.astype(np.uint32)
+    return ((rgb[..., 0] * 19595 + rgb[..., 1] * 38470 + rgb[..., 2] * 7471 + 0x8000) >> 16).astype(np.uint8)
+
+
+def read_png_chunks(f: io.IOBase, path: str) -> Iterator[Tuple[bytes, bytes]]:
+    """Yield the (type, data) chunks of a PNG file positioned after its signature, checking their CRCs."""
+    while True:
+        head = f.read(8)
+        if len(head) < 8:
+            raise ValueError(f"Image {path} is truncated")
+        length, chunk_type = struct.unpack('>I4s', head)
+        data = f.read(length)
+        crc = f.read(4)
+        if len(data) < length or len(crc) < 4:
+            raise ValueError(f"Image {path} is truncated")
+        if zlib.crc32(data, zlib.crc32(chunk_type)) != struct.unpack('>I', crc)[0]:
+            raise ValueError(f"Image {path} is broken: bad CRC in {chunk_type.decode('latin-1')} chunk")
+        yield chunk_type, data
+        if chunk_type == b'IEND':
+            return
+
+
+def unfilter_png_rows(filtered: np.ndarray, filters: np.ndarray, previous: np.ndarray, bpp: int) -> np.ndarray:
+    """
+    Undo the PNG row filters of a band of rows.
+
+    Sub and Up only need the row itself and the row above, so rows using
+    just those are restored one at a time. Average and Paeth depend on the
+    restored byte to the left as well; a byte then depends on its left, upper
+    and upper-left neighbours only, so all pixels on one anti-diagonal of the
+    band are independent and each diagonal is restored in one NumPy step.
+
+    Args:
+        filtered: Filtered bytes, one row per band row (without the filter byte)
+        filters: Filter type of every row (0 None, 1 Sub, 2 Up, 3 Average, 4 Paeth)
+        previous: Restored row above the band (zeros above the first row)
+        bpp: Bytes per complete pixel, at least 1
+
+    Returns:
+        Restored bytes as a uint8 array shaped like filtered
+    """
+    rows, stride = filtered.shape
+    pixels = stride // bpp
+    if not np.isin(filters, (3, 4)).any():
+        restored = np.empty_like(filtered)
+        above = previous
+        for row in range(rows):
+            line = filtered[row]
+            if filters[row] == 1:
+                line = np.cumsum(line.reshape(pixels, bpp), axis=0, dtype=np.uint8).reshape(stride)
+            elif filters[row] == 2:
+                line = line + above
+            restored[row] = line
+            above = restored[row]
+        return restored
+
+    # Skewed layout: pixel x of band row i - 1 (row 0 is the row above) sits
+    # in column x + i + 1, so an anti-diagonal is a column and column i of
+    # row i stays zero as the left neighbour of the first pixel
+    columns = pixels + rows + 1
+    skewed = np.zeros((rows + 1, columns, bpp), dtype=np.int16)
+    skewed_input = np.zeros((rows + 1, columns, bpp), dtype=np.int16)
+    skewed[0, 1:pixels + 1] = previous.reshape(pixels, bpp)
+    for row in range(rows):
+        skewed_input[row + 1, row + 2:row + 2 + pixels] = filtered[row].reshape(pixels, bpp)
+    row_filters = np.concatenate(([0], filters)).astype(np.int16)[:, None]
+
+    for column in range(2, pixels + rows + 1):
+        lo, hi = max(1, column - pixels), min(rows, column - 1) + 1
+        a = skewed[lo:hi, column - 1]
+        b = skewed[lo - 1:hi - 1, column - 1]
+        c = skewed[lo - 1:hi - 1, column - 2]
+        kind = row_filters[lo:hi]
+        pa, pb, pc = np.abs(b - c), np.abs(a - c), np.abs(a + b - 2 * c)
+        paeth = np.where((pa <= pb) & (pa <= pc), a, np.where(pb <= pc, b, c))
+        predicted = np.where(kind == 1, a, np.where(kind == 2, b, np.where(kind == 3, (a + b) >> 1, np.where(kind == 4, paeth, 0))))
+        skewed[lo:hi, column] = (skewed_input[lo:hi, column] + predicted) & 0xFF
+
+    restored = np.empty_like(filtered)
+    for row in range(rows):
+        restored[row] = skewed[row + 1, row + 2:row + 2 + pixels].reshape(stride)
+    return restored
+
+
+def png_rows_to_gray(rows: np.ndarray, width: int, depth: int, color_type: int, palette_gray: Optional[np.ndarray]) -> np.ndarray:
+    """
+    Convert restored PNG rows to 8-bit gray levels the way PIL's convert('L') does.
+
+    Color is weighted 299/587/114 (ITU-R 601-2 luma) and alpha is ignored.
+    Palette indices are looked up in palette_gray. Gray samples below 8 bits
+    are scaled to 0-255, 16-bit gray is clipped to 255 and the other 16-bit
+    samples keep their high byte.
+    """
+    channels = PNG_CHANNELS[color_type]
+    if depth < 8:
+        bits = np.unpackbits(rows, axis=1)[:, :width * depth].reshape(rows.shape[0], width, depth)
+        samples = (bits @ (1 << np.arange(depth - 1, -1, -1))).astype(np.uint16)
+        if color_type == 3:
+            return palette_gray[samples]
+        return (samples * (255 // ((1 << depth) - 1))).astype(np.uint8)
+    if depth == 16:
+        pairs = rows.reshape(rows.shape[0], width, channels, 2)
+        if color_type == 0:
+            return np.where(pairs[:, :, 0, 0] == 0, pairs[:, :, 0, 1], 255).astype(np.uint8)
+        samples = pairs[..., 0]
+    else:
+        samples = rows.reshape(rows.shape[0], width, channels)
+    if color_type == 3:
+        return palette_gray[samples[:, :, 0]]
+    if color_type in (0, 4):
+        return samples[:, :, 0].copy()
+    return rgb_to_gray(samples[:, :, :3])
+
+
+def read_png_gray_strips(f: io.IOBase, path: str, rows: int = IMAGE_STRIP_ROWS) -> Optional[Tuple[int, int, Iterator[Tuple[slice, np.ndarray]]]]:
+    """
+    Decode a PNG as gray levels in strips of rows, never holding the whole image.
+
+    The IDAT stream is inflated incrementally, at most one strip of raw rows
+    at a time; each strip is unfiltered (see unfilter_png_rows()) and
+    converted to gray (see png_rows_to_gray()). Only the last restored row is
+    kept for the next strip.
+
+    Args:
+        f: Binary file object positioned at the start of the image
+        path: Name of the image for error messages
+        rows: Rows per strip
+
+    Returns:
+        (width, height, iterator of (row slice, uint8 gray strip)), or None
+        with the file rewound if it is not a PNG or is interlaced (PIL then
+        decodes it as a whole)
+
+    Raises:
+        ValueError: If the PNG is truncated, broken or has an invalid header
+    """
+    start = f.tell()
+    if f.read(len(PNG_SIGNATURE)) != PNG_SIGNATURE:
+        f.seek(start)
+        return None
+    chunks = read_png_chunks(f, path)
+    chunk_type, header = next(chunks)
+    if chunk_type != b'IHDR' or len(header) != 13:
+        raise ValueError(f"Image {path} is broken: IHDR chunk missing")
+    width, height, depth, color_type, _, _, interlace = struct.unpack('>IIBBBBB', header)
+    if color_type not in PNG_CHANNELS or depth not in (1, 2, 4, 8, 16):
+        raise ValueError(f"Image {path} has an invalid color type {color_type} or bit depth {depth}")
+    if interlace:
+        f.seek(start)
+        return None
+
+    bits_per_pixel = PNG_CHANNELS[color_type] * depth
+    bpp = max(1, bits_per_pixel // 8)
+    stride = (width * bits_per_pixel + 7) // 8
+
+    strip_bytes = min(rows, height) * (stride + 1)
+    palette = []
+
+    def inflated() -> Iterator[bytes]:
+        # Inflate the IDAT stream at most one strip of raw rows per piece
+        inflater = zlib.decompressobj()
+        for chunk_type, data in chunks:
+            if chunk_type == b'PLTE':
+                palette.append(data)
+            elif chunk_type == b'IDAT':
+                while data:
+                    yield inflater.decompress(data, strip_bytes)
+                    data = inflater.unconsumed_tail
+        yield inflater.flush()
+
+    def strips() -> Iterator[Tuple[slice, np.ndarray]]:
+        pieces = inflated()
+        pending = bytearray()
+        previous = np.zeros(stride, dtype=np.uint8)
+        palette_gray = None
+        for strip in mask_strips(height, rows):
+            size = (strip.stop - strip.start) * (stride + 1)
+            while len(pending) < size:
+                piece = next(pieces, None)
+                if piece is None:
+                    raise ValueError(f"Image {path} is truncated: image data ends in rows {strip.start}-{strip.stop}")
+                pending += piece
+            raw = np.frombuffer(bytes(pending[:size]), dtype=np.uint8).reshape(-1, stride + 1)
+            del pending[:size]
+            if raw[:, 0].max() > 4:
+                raise ValueError(f"Image {path} is broken: unknown row filter {raw[:, 0].max()}")
+            if color_type == 3 and palette_gray is None:
+                if not palette:
+                    raise ValueError(f"Image {path} is broken: PLTE chunk missing")
+                # Indices beyond the palette are black, as in PIL
+                rgb = np.zeros((256, 3), dtype=np.uint8)
+                entries = np.frombuffer(palette[0], dtype=np.uint8)[:len(palette[0]) // 3 * 3].reshape(-1, 3)[:256]
+                rgb[:len(entries)] = entries
+                palette_gray = rgb_to_gray(rgb)
+            restored = unfilter_png_rows(raw[:, 1:], raw[:, 0], previous, bpp)
+            previous = restored[-1]
+            yield strip, png_rows_to_gray(restored, width, depth, color_type, palette_gray)
+
+    return width, height, strips()
+
+
+@contextlib.contextmanager
+def open_gray_strips(image_path: Union[str, io.IOBase], stream_png: bool = False) -> Iterator[Tuple[int, int, Iterator[Tuple[slice, np.ndarray]]]]:
+    """
+    Open an image for reading as gray levels strip by strip.
+
+    Images are decoded as a whole by PIL and converted one strip at a time.
+    With stream_png non-interlaced PNGs are decoded strip by strip instead
+    (see read_png_gray_strips()), which is several times slower than PIL.
+
+    Args:
+        image_path: Path or binary file object of the image
+        stream_png: Decode non-interlaced PNGs with read_png_gray_strips()
+
+    Yields:
+        (width, height, iterator of (row slice, uint8 gray strip))
+    """
+    with contextlib.ExitStack() as stack:
+        if isinstance(image_path, (str, os.PathLike)):
+            f = stack.enter_context(open(image_path, 'rb'))
+            name = os.fspath(image_path)
+        else:
+            f = image_path
+            name = getattr(image_path, 'name', '<stream>')
+        streamed = read_png_gray_strips(f, name) if stream_png and f.seekable() else None
+        if streamed is None:
+            img = Image.open(f)
+            img.load()
+            width, height = img.size
+
+            def converted() -> Iterator[Tuple[slice, np.ndarray]]:
+                for strip in mask_strips(height):
+                    rows = img.crop((0, strip.start, width, strip.stop))
+                    yield strip, np.asarray(rows if rows.mode == 'L' else rows.convert('L'))
+
+            streamed = (width, height, converted())
+        yield streamed
+
+
+def load_and_threshold_image(image_path: Union[str, io.IOBase], threshold: int = 128, profile: Optional[Dict[str, object]] = None,
+                             stream_png: bool = False) -> np.ndarray:
+    """
+    Load an image and convert it to a binary mask.
+
+    Images are decoded as a whole by PIL and converted and thresholded strip
+    by strip into a preallocated mask (see open_gray_strips()). Raw masks are
+    read directly: .npy arrays (see load_npy_mask(), boolean arrays stay
+    memory mapped) and binary PBM bitmaps (see load_pbm_mask(), unpacked
+    strip by strip).
+
+    Args:
+        image_path: Path to the image or raw mask, or binary file object of an image
         threshold: Grayscale threshold (0-255). Pixels darker than this are "inside"
+        profile: Optional profile from new_profile() to record the load and
+                 threshold stages in
+        stream_png: Decode non-interlaced PNGs strip by strip with
+                    read_png_gray_strips() instead of PIL
 
     Returns:
         2D numpy array of booleans (True = inside shape, False = outside)
+
+    Raises:
+        ValueError: If a PNG is truncated or broken
     """
-    # Load image and convert to grayscale
-    img = Image.open(image_path)
+    extension = os.path.splitext(image_path)[1].lower() if isinstance(image_path, (str, os.PathLike)) else ''
+    if extension in RAW_MASK_EXTENSIONS:
+        with profile_stage(profile, 'load') as record:
+            binary_mask = load_npy_mask(image_path, threshold) if extension == '.npy' else load_pbm_mask(image_path)
+            record['image'] = f"{binary_mask.shape[1]}x{binary_mask.shape[0]}"
+            record['memory_mapped'] = isinstance(binary_mask, np.memmap)
+        return binary_mask
+
+    with contextlib.ExitStack() as stack:
+        # Streamed PNGs are only read up to the image header here; their
+        # rows are decoded during the threshold stage
+        with profile_stage(profile, 'load') as record:
+            width, height, strips = stack.enter_context(open_gray_strips(image_path, stream_png))
+            record['image'] = f"{width}x{height}"
+
+        with profile_stage(profile, 'threshold') as record:
+            # Threshold: pixels with value < threshold are "inside" (dark = inside)
+            # In grayscale, 0 is black, 255 is white.
+            binary_mask = np.empty((height, width), dtype=bool)
+            for strip, gray in strips:
+                np.less(gray, threshold, out=binary_mask[strip])
+            record['inside_cells'] = int(np.count_nonzero(binary_mask))
+
+    return binary_mask
 
-    # Convert to grayscale if needed
-    if img.mode != 'L':
-        img = img.convert('L')
 
-    # Convert to numpy array
-    img_array = np.array(img)
+def load_grayscale_image(image_path: Union[str, io.IOBase], stream_png: bool = False) -> np.ndarray:
+    """
+    Load an image or numeric .npy array as 8-bit gray levels for multi-level thresholding.
 
-    # Threshold: pixels with value < threshold are "inside" (dark = inside)
-    # In grayscale, 0 is black, 255 is white
-    binary_mask = img_array < threshold
+    Images are converted strip by strip into a preallocated array (see
+    open_gray_strips()); .npy values are clipped to 0-255 and truncated, which keeps every
+    "value < threshold" test for whole thresholds unchanged.
 
-    return binary_mask
+    Args:
+        image_path: Path to the image or .npy array, or binary file object of an image
+        stream_png: Decode non-interlaced PNGs strip by strip with
+                    read_png_gray_strips() instead of PIL
+
+    Returns:
+        2D uint8 array of gray levels (0 = black)
+
+    Raises:
+        ValueError: If the input is a binary mask (.pbm or boolean .npy) without gray levels
+    """
+    extension = os.path.splitext(image_path)[1].lower() if isinstance(image_path, (str, os.PathLike)) else ''
+    if extension == '.pbm':
+        raise ValueError(f"Mask {image_path} is a binary bitmap and has no gray levels")
+    if extension == '.npy':
+        array = np.load(image_path, mmap_mode='r', allow_pickle=False)
+        if array.ndim != 2 or array.dtype == bool or not np.issubdtype(array.dtype, np.number):
+            raise ValueError(f"Mask {image_path} must be a 2D numeric array to have gray levels")
+        if array.dtype == np.uint8:
+            return array
+        gray = np.empty(array.shape, dtype=np.uint8)
+        for strip in mask_strips(array.shape[0]):
+            gray[strip] = np.clip(array[strip], 0, 255)
+        return gray
+
+    with open_gray_strips(image_path, stream_png) as (width, height, strips):
+        gray = np.empty((height, width), dtype=np.uint8)
+        for strip, rows in strips:
+            gray[strip] = rows
+    return gray
 
 
 def find_largest_rectangle(mask: np.ndarray, start_row: int, start_col: int) -> Tuple[int, int]:
@@ -177,79 +790,769 @@ def find_largest_rectangle(mask: np.ndarray, start_row: int, start_col: int) ->
     return (best_width, best_height)
 
 
-def extract_border_rectangles_mm(mask: np.ndarray, border_thickness_mm: float, unit_size: float = 8.0, inset_mm: float = 0.0) -> List[Tuple[float, float, float, float]]:
+def shape_cell_rectangles_hr(mask: np.ndarray, col_starts: np.ndarray, col_ends: np.ndarray, row_starts: np.ndarray, row_ends: np.ndarray) -> np.ndarray:
+    """
+    List the high-res pixel rectangles covered by the filled cells of a mask.
+
+    Args:
+        mask: 2D boolean array where True = inside shape (in brick units)
+        col_starts: High-res x coordinate where each brick column starts
+        col_ends: High-res x coordinate where each brick column ends
+        row_starts: High-res y coordinate where each brick row starts
+        row_ends: High-res y coordinate where each brick row ends
+
+    Returns:
+        Integer array of shape (N, 4) with (x0, y0, x1, y1) half-open pixel bounds
+    """
+    cell_rows, cell_cols = np.nonzero(mask)
+    return np.stack([
+        col_starts[cell_cols],
+        row_starts[cell_rows],
+        col_ends[cell_cols],
+        row_ends[cell_rows],
+    ], axis=1).astype(np.int64)
+
+
+def upsample_mask_hr(mask: np.ndarray, col_starts: np.ndarray, col_ends: np.ndarray, row_starts: np.ndarray, row_ends: np.ndarray, window: Tuple[int, int, int, int]) -> np.ndarray:
+    """
+    Map a brick-unit mask onto a high-res grid without per-cell loops.
+
+    Brick column c covers high-res x in [col_starts[c], col_ends[c]) and
+    brick row r covers high-res y in [row_starts[r], row_ends[r]); a high-res
+    pixel is set if any filled cell covers it. Because the bounds are
+    non-decreasing, the cells covering a pixel form a contiguous index range,
+    so every pixel is resolved with two searchsorted lookups and a prefix sum.
+    This matches painting every filled cell's rectangle one by one.
+
+    Args:
+        mask: 2D boolean array where True = inside shape (in brick units)
+        col_starts: High-res x coordinate where each brick column starts
+        col_ends: High-res x coordinate where each brick column ends
+        row_starts: High-res y coordinate where each brick row starts
+        row_ends: High-res y coordinate where each brick row ends
+        window: (x0, y0, x1, y1) high-res region to build, half-open
+
+    Returns:
+        2D boolean array of shape (y1 - y0, x1 - x0) for the requested window
+    """
+    x0, y0, x1, y1 = window
+    xs = np.arange(x0, x1)
+    ys = np.arange(y0, y1)
+
+    # Range of brick columns/rows covering each high-res pixel
+    col_lo = np.searchsorted(col_ends, xs, side='right')
+    col_hi = np.maximum(np.searchsorted(col_starts, xs, side='right'), col_lo)
+    row_lo = np.searchsorted(row_ends, ys, side='right')
+    row_hi = np.maximum(np.searchsorted(row_starts, ys, side='right'), row_lo)
+
+    # Upsample columns first, then rows, using prefix sums to OR cell ranges
+    col_prefix = np.zeros((mask.shape[0], mask.shape[1] + 1), dtype=np.int32)
+    np.cumsum(mask, axis=1, out=col_prefix[:, 1:])
+    wide = (col_prefix[:, col_hi] - col_prefix[:, col_lo]) > 0
+
+    row_prefix = np.zeros((mask.shape[0] + 1, wide.shape[1]), dtype=np.int32)
+    np.cumsum(wide, axis=0, out=row_prefix[1:])
+    return (row_prefix[row_hi] - row_prefix[row_lo]) > 0
+
+
+class PackedMask:
+    """
+    Binary mask stored as packed bits, 8 cells per byte.
+
+    Rows use the np.packbits() layout (first cell in the most significant
+    bit, each row padded to whole bytes) and the padding bits are kept zero.
+    The mask supports &, | and ~, row and column shifts, square (chessboard)
+    dilation and run extraction. Slicing rows returns a boolean array, so a
+    packed mask can be run-length encoded by encode_mask_runs() chunk by chunk
+    without ever unpacking it as a whole.
+    """
+
+    def __init__(self, bits: np.ndarray, width: int):
+        """
+        Args:
+            bits: uint8 array of shape (rows, ceil(width / 8)) with zero padding bits
+            width: Number of cells per row
+        """
+        self.bits = bits
+        self.width = width
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return (self.bits.shape[0], self.width)
+
+    @classmethod
+    def zeros(cls, shape: Tuple[int, int]) -> 'PackedMask':
+        """Empty packed mask of the given (rows, cols) shape."""
+        return cls(np.zeros((shape[0], (shape[1] + 7) // 8), dtype=np.uint8), shape[1])
+
+    @classmethod
+    def from_bool(cls, mask: np.ndarray) -> 'PackedMask':
+        """Pack a 2D boolean array."""
+        return cls(np.packbits(np.asarray(mask, dtype=bool), axis=1), mask.shape[1])
+
+    @classmethod
+    def from_cells(cls, mask: np.ndarray, col_starts: np.ndarray, col_ends: np.ndarray, row_starts: np.ndarray, row_ends: np.ndarray,
+                   window: Tuple[int, int, int, int]) -> 'PackedMask':
+        """
+        Packed equivalent of upsample_mask_hr(), built without the full boolean raster.
+
+        Every brick row is upsampled along x and packed once; each high-res row
+        is then the OR of the packed rows of the brick rows covering it.
+
+        Args:
+            mask: 2D boolean array where True = inside shape (in brick units)
+            col_starts: High-res x coordinate where each brick column starts
+            col_ends: High-res x coordinate where each brick column ends
+            row_starts: High-res y coordinate where each brick row starts
+            row_ends: High-res y coordinate where each brick row ends
+            window: (x0, y0, x1, y1) high-res region to build, half-open
+
+        Returns:
+            Packed mask of shape (y1 - y0, x1 - x0)
+        """
+        x0, y0, x1, y1 = window
+        xs = np.arange(x0, x1)
+        ys = np.arange(y0, y1)
+        col_lo = np.searchsorted(col_ends, xs, side='right')
+        col_hi = np.maximum(np.searchsorted(col_starts, xs, side='right'), col_lo)
+        row_lo = np.searchsorted(row_ends, ys, side='right')
+        row_hi = np.maximum(np.searchsorted(row_starts, ys, side='right'), row_lo)
+
+        # Packed high-res pattern of every brick row, a chunk of rows at a time
+        col_prefix = np.zeros((mask.shape[0], mask.shape[1] + 1), dtype=np.int32)
+        np.cumsum(mask, axis=1, out=col_prefix[:, 1:])
+        brick_rows = np.zeros((mask.shape[0], (len(xs) + 7) // 8), dtype=np.uint8)
+        for chunk_start in range(0, mask.shape[0], RLE_CHUNK_ROWS):
+            chunk = col_prefix[chunk_start:chunk_start + RLE_CHUNK_ROWS]
+            brick_rows[chunk_start:chunk_start + RLE_CHUNK_ROWS] = np.packbits((chunk[:, col_hi] - chunk[:, col_lo]) > 0, axis=1)
+
+        # Usually one brick row covers a high-res row; rounding can make it two
+        bits = np.zeros((len(ys), brick_rows.shape[1]), dtype=np.uint8)
+        span = row_hi - row_lo
+        for offset in range(int(span.max()) if len(ys) else 0):
+            covered = np.nonzero(span > offset)[0]
+            bits[covered] |= brick_rows[row_lo[covered] + offset]
+        return cls(bits, len(xs))
+
+    def clear_padding(self) -> 'PackedMask':
+        """Zero the padding bits at the end of every row (in place) and return the mask."""
+        tail = self.width % 8
+        if tail:
+            self.bits[:, -1] &= np.uint8((0xFF << (8 - tail)) & 0xFF)
+        return self
+
+    def to_bool(self) -> np.ndarray:
+        """Unpack into a 2D boolean array."""
+        return np.unpackbits(self.bits, axis=1, count=self.width).astype(bool)
+
+    def __getitem__(self, rows: slice) -> np.ndarray:
+        """Unpack a slice of rows into a 2D boolean array."""
+        return np.unpackbits(self.bits[rows], axis=1, count=self.width).astype(bool)
+
+    def __and__(self, other: 'PackedMask') -> 'PackedMask':
+        return PackedMask(self.bits & other.bits, self.width)
+
+    def __or__(self, other: 'PackedMask') -> 'PackedMask':
+        return PackedMask(self.bits | other.bits, self.width)
+
+    def __invert__(self) -> 'PackedMask':
+        return PackedMask(~self.bits, self.width).clear_padding()
+
+    def any(self) -> bool:
+        return bool(self.bits.any())
+
+    def count(self) -> int:
+        """Number of set cells."""
+        return int(np.unpackbits(self.bits).sum(dtype=np.int64))
+
+    def shift_rows(self, offset: int) -> 'PackedMask':
+        """
+        Move every row down by offset rows (up if negative), filling with zeros.
+
+        Args:
+            offset: Number of rows; cell (r, c) moves to (r + offset, c)
+
+        Returns:
+            New packed mask
+        """
+        bits = np.zeros_like(self.bits)
+        rows = bits.shape[0]
+        if abs(offset) < rows:
+            if offset >= 0:
+                bits[offset:] = self.bits[:rows - offset]
+            else:
+                bits[:rows + offset] = self.bits[-offset:]
+        return PackedMask(bits, self.width)
+
+    def shift_cols(self, offset: int) -> 'PackedMask':
+        """
+        Move every cell right by offset columns (left if negative), filling with zeros.
+
+        Args:
+            offset: Number of columns; cell (r, c) moves to (r, c + offset)
+
+        Returns:
+            New packed mask
+        """
+        byte_offset, bit_offset = divmod(abs(offset), 8)
+        row_bytes = self.bits.shape[1]
+        bits = np.zeros_like(self.bits)
+        if byte_offset >= row_bytes:
+            return PackedMask(bits, self.width)
+
+        # Whole bytes first, then the remaining bits with a carry from the
+        # neighbouring byte
+        if offset >= 0:
+            bits[:, byte_offset:] = self.bits[:, :row_bytes - byte_offset]
+            if bit_offset:
+                carry = np.zeros_like(bits)
+                carry[:, 1:] = bits[:, :-1] << (8 - bit_offset)
+                bits = (bits >> bit_offset) | carry
+        else:
+            bits[:, :row_bytes - byte_offset] = self.bits[:, byte_offset:]
+            if bit_offset:
+                carry = np.zeros_like(bits)
+                carry[:, :-1] = bits[:, 1:] >> (8 - bit_offset)
+                bits = (bits << bit_offset) | carry
+        return PackedMask(bits, self.width).clear_padding()
+
+    def dilate(self, pixels: int) -> 'PackedMask':
+        """
+        Dilate by a square of radius pixels, bit-identical to dilate_chessboard().
+
+        The square is separable into a row and a column pass. Each pass ORs
+        the mask over offsets 0..pixels in both directions by doubling the
+        covered offset range, so it takes O(log pixels) shifts.
+
+        Args:
+            pixels: Dilation radius in pixels (0 returns a copy)
+
+        Returns:
+            New packed mask
+        """
+        if pixels <= 0:
+            return PackedMask(self.bits.copy(), self.width)
+
+        def spread(mask: 'PackedMask', shift: Callable[['PackedMask', int], 'PackedMask']) -> 'PackedMask':
+            result = mask
+            for direction in (1, -1):
+                # power covers offsets [0, span); covered is the range already in result
+                power = mask
+                span = 1
+                covered = 1
+                remaining = pixels
+                while remaining:
+                    if remaining & 1:
+                        result = result | shift(power, direction * covered)
+                        covered += span
+                    remaining >>= 1
+                    if remaining:
+                        power = power | shift(power, direction * span)
+                        span *= 2
+            return result
+
+        return spread(spread(self, PackedMask.shift_rows), PackedMask.shift_cols)
+
+    def runs(self) -> List[Tuple[List[int], List[int]]]:
+        """Row runs as returned by encode_mask_runs(), unpacking one chunk of rows at a time."""
+        return encode_mask_runs(self)
+
+
+def split_components(mask: np.ndarray, batch_cells: int = COMPONENT_BATCH_CELLS) -> List[List[Tuple[int, int, np.ndarray]]]:
+    """
+    Crop the 4-connected components of a mask and group them into batches.
+
+    No rectangle of a decomposition crosses between 4-connected components,
+    and the greedy scan visits the cells of one component in the same order
+    whether the others are there or not, so each component can be decomposed
+    on its own.
+
+    Args:
+        mask: 2D boolean array where True = inside shape
+        batch_cells: Bounding box cells after which a batch is closed; larger
+                     components get a batch of their own
+
+    Returns:
+        Batches of (row offset, column offset, component mask) in label order
+    """
+    labels, _ = ndimage.label(mask)
+    batches = []
+    batch = []
+    batch_size = 0
+    for label, bbox in enumerate(ndimage.find_objects(labels), start=1):
+        component = labels[bbox] == label
+        batch.append((bbox[0].start, bbox[1].start, component))
+        batch_size += component.size
+        if batch_size >= batch_cells:
+            batches.append(batch)
+            batch = []
+            batch_size = 0
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def split_row_strips(mask: np.ndarray, tiles: int) -> Tuple[List[int], List[np.ndarray]]:
+    """
+    Cut a mask into strips of rows and measure the runs continuing below each one.
+
+    Args:
+        mask: 2D boolean array where True = inside shape
+        tiles: Number of strips
+
+    Returns:
+        Tuple of (row cuts from 0 to the mask height, one array per strip with
+        the number of consecutive True cells below the strip in every column)
+    """
+    rows, cols = mask.shape
+    cuts = sorted(set(np.linspace(0, rows, tiles + 1).round().astype(int).tolist()))
+    carries = []
+    carry = np.zeros(cols, dtype=np.int32)
+    # Bottom-up: a column full of True cells passes the run below it on
+    for top, bottom in reversed(list(zip(cuts, cuts[1:]))):
+        carries.append(carry)
+        strip = np.asarray(mask[top:bottom], dtype=bool)
+        carry = np.where(strip.all(axis=0), bottom - top + carry, np.argmin(strip, axis=0)).astype(np.int32)
+    carries.reverse()
+    return cuts, carries
+
+
+def strip_down_runs(strip: np.ndarray, carry: np.ndarray) -> np.ndarray:
+    """compute_down_runs() of a strip of rows, with runs reaching its bottom continued by carry (see split_row_strips())."""
+    down = compute_down_runs(strip)
+    reaches_bottom = down == (strip.shape[0] - np.arange(strip.shape[0], dtype=np.int32))[:, None]
+    return down + np.where(reaches_bottom, carry[None, :], 0).astype(np.int32)
+
+
+def greedy_row_rectangles(down_row: np.ndarray, free: np.ndarray, row: int, col_edges: np.ndarray, row_edges: np.ndarray) -> List[Tuple[int, int, int, int]]:
+    """
+    Place the greedy rectangles starting in one row.
+
+    Within every run of free cells the rectangle with the largest weighted
+    area is placed at the run start, exactly as in
+    weighted_rectangle_decomposition(), and the scan continues right of it.
+
+    Args:
+        down_row: Downward run heights of the row in the whole mask
+        free: Cells of the row not covered by a rectangle from above
+        row: Index of the row in the whole mask
+        col_edges: Cumulative column widths, one more than there are columns
+        row_edges: Cumulative row heights, one more than there are rows
+
+    Returns:
+        List of rectangles as (col, row, col_count, row_count) tuples
+    """
+    rectangles = []
+    edges = np.diff(np.concatenate(([False], free, [False])).astype(np.int8))
+    for run_start, run_end in zip(np.flatnonzero(edges == 1).tolist(), np.flatnonzero(edges == -1).tolist()):
+        col = run_start
+        while col < run_end:
+            if col + 1 == run_end:
+                rectangles.append((col, row, 1, int(down_row[col])))
+                break
+            counts = np.minimum.accumulate(down_row[col:run_end])
+            heights = row_edges[row + counts] - row_edges[row]
+            widths = col_edges[col + 1:run_end + 1] - col_edges[col]
+            best = int(np.argmax(widths * heights))
+            rectangles.append((col, row, best + 1, int(counts[best])))
+            col += best + 1
+    return rectangles
+
+
+def sweep_row_strip(strip_batch: Tuple[int, np.ndarray, np.ndarray], col_edges: np.ndarray, row_edges: np.ndarray) -> List[Tuple[int, int, int, int]]:
+    """
+    Greedy decomposition of one strip of rows as if nothing covered it from above (runs in a worker process).
+
+    Args:
+        strip_batch: (first row, strip of the mask, runs continuing below the strip)
+        col_edges: Cumulative column widths of the whole mask
+        row_edges: Cumulative row heights of the whole mask
+
+    Returns:
+        Rectangles starting in the strip in mask coordinates and row-major
+        order, with their full height even where it reaches below the strip
+    """
+    top, strip, carry = strip_batch
+    down = strip_down_runs(strip, carry)
+    covered_until = np.zeros(strip.shape[1], dtype=np.int64)
+    rectangles = []
+    for offset in range(strip.shape[0]):
+        row = top + offset
+        for rect in greedy_row_rectangles(down[offset], (down[offset] > 0) & (covered_until <= row), row, col_edges, row_edges):
+            rectangles.append(rect)
+            covered_until[rect[0]:rect[0] + rect[2]] = row + rect[3]
+    return rectangles
+
+
+def tiled_greedy_decomposition(mask: np.ndarray, tiles: int, executor: Optional[Executor] = None,
+                               col_widths: Optional[np.ndarray] = None, row_heights: Optional[np.ndarray] = None) -> List[Tuple[int, int, int, int]]:
+    """
+    Greedy decomposition of a mask cut into strips of rows that are swept independently.
+
+    A greedy rectangle starting in a row takes its width and height from the
+    free cells of that row and the runs below it, and it ends where one of its
+    columns does, so a row only depends on which cells the rectangles from
+    above still cover. Every strip is first swept as if nothing came from
+    above (on the executor if given). A seam pass then walks down the strips
+    with the real coverage: rows where the coverage matches the strip's own
+    sweep keep its rectangles, and only runs of free cells that differ are
+    decomposed again. Once the coverage of the rows below matches too, the
+    rest of the strip is kept as it is. The result is exactly the untiled
+    greedy decomposition.
+
+    Args:
+        mask: 2D boolean array where True = inside shape
+        tiles: Number of strips of rows
+        executor: Optional executor the strips are swept on
+        col_widths: Width of every column, 1 if not given
+        row_heights: Height of every row, 1 if not given
+
+    Returns:
+        List of rectangles as (x, y, width, height) tuples in cells, in
+        top-left scan order
+    """
+    rows, cols = mask.shape
+    col_edges = np.arange(cols + 1) if col_widths is None else np.concatenate(([0], np.cumsum(col_widths, dtype=np.int64)))
+    row_edges = np.arange(rows + 1) if row_heights is None else np.concatenate(([0], np.cumsum(row_heights, dtype=np.int64)))
+    cuts, carries = split_row_strips(mask, tiles)
+    batches = [(top, mask[top:bottom], carry) for top, bottom, carry in zip(cuts, cuts[1:], carries)]
+    worker = functools.partial(sweep_row_strip, col_edges=col_edges, row_edges=row_edges)
+    swept = list(executor.map(worker, batches) if executor is not None else map(worker, batches))
+
+    rectangles = []
+    covered_until = np.zeros(cols, dtype=np.int64)
+    for (top, strip, carry), strip_rectangles in zip(batches, swept):
+        bottom = top + strip.shape[0]
+        strip_rows = [rect[1] for rect in strip_rectangles]
+        strip_covered_until = np.zeros(cols, dtype=np.int64)
+        down = None
+        index = 0
+        row = top
+        while row < bottom:
+            # Columns whose coverage from this row on differs from the sweep
+            covered = np.maximum(covered_until, row)
+            strip_covered = np.maximum(strip_covered_until, row)
+            differs = np.flatnonzero(covered != strip_covered)
+            if differs.size == 0:
+                break
+            # Free cells cannot differ before one of those columns is freed,
+            # so the rows up to there are the same as in the sweep
+            same_until = min(bottom, int(np.minimum(covered[differs], strip_covered[differs]).min()))
+            if same_until == row:
+                same_until = row + 1
+                if down is None:
+                    down = strip_down_runs(strip, carry)
+                filled = down[row - top] > 0
+                free = filled & (covered_until <= row)
+                differing = np.concatenate(([0], np.cumsum(free != (filled & (strip_covered_until <= row)))))
+                row_end = bisect.bisect_left(strip_rows, row + 1, index)
+                row_cols = [rect[0] for rect in strip_rectangles[index:row_end]]
+                edges = np.diff(np.concatenate(([False], free, [False])).astype(np.int8))
+                for run_start, run_end in zip(np.flatnonzero(edges == 1).tolist(), np.flatnonzero(edges == -1).tolist()):
+                    if differing[min(run_end + 1, cols)] == differing[max(run_start - 1, 0)]:
+                        # Same run with the same ends: same rectangles as the sweep
+                        run_rectangles = strip_rectangles[index + bisect.bisect_left(row_cols, run_start):index + bisect.bisect_left(row_cols, run_end)]
+                    else:
+                        run_free = np.zeros(cols, dtype=bool)
+                        run_free[run_start:run_end] = True
+                        run_rectangles = greedy_row_rectangles(down[row - top], run_free, row, col_edges, row_edges)
+                    for (x, y, w, h) in run_rectangles:
+                        rectangles.append((x, y, w, h))
+                        covered_until[x:x + w] = y + h
+                for (x, y, w, h) in strip_rectangles[index:row_end]:
+                    strip_covered_until[x:x + w] = y + h
+                index = row_end
+            else:
+                same_end = bisect.bisect_left(strip_rows, same_until, index)
+                for (x, y, w, h) in strip_rectangles[index:same_end]:
+                    rectangles.append((x, y, w, h))
+                    covered_until[x:x + w] = y + h
+                    strip_covered_until[x:x + w] = y + h
+                index = same_end
+            row = same_until
+        rectangles.extend(strip_rectangles[index:])
+        for (x, y, w, h) in strip_rectangles[index:]:
+            if y + h > bottom:
+                covered_until[x:x + w] = y + h
+
+    rectangles.sort(key=lambda r: (r[1], r[0]))
+    return rectangles
+
+
+def decompose_component_batch(batch: List[Tuple[int, int, np.ndarray]], strategy: str = DEFAULT_DECOMPOSITION_STRATEGY,
+                              engine: str = DEFAULT_DECOMPOSITION_ENGINE, max_component_cells: int = DEFAULT_OPTIMAL_MAX_CELLS,
+                              cost_model: Optional[Dict[str, float]] = None) -> List[Tuple[int, int, int, int]]:
+    """Decompose a batch from split_components() in mask coordinates (runs in a worker process)."""
+    rectangles = []
+    for row_offset, col_offset, component in batch:
+        rectangles.extend((x + col_offset, y + row_offset, w, h)
+                          for (x, y, w, h) in decompose_mask(component, strategy, engine, max_component_cells, cost_model))
+    return rectangles
+
+
+def weighted_component_batch(batch: List[Tuple[int, int, np.ndarray]], col_widths: np.ndarray, row_heights: np.ndarray) -> List[Tuple[int, int, int, int]]:
+    """Run weighted_rectangle_decomposition() on a batch from split_components() in grid coordinates (runs in a worker process)."""
+    rectangles = []
+    for row_offset, col_offset, component in batch:
+        component_widths = col_widths[col_offset:col_offset + component.shape[1]]
+        component_heights = row_heights[row_offset:row_offset + component.shape[0]]
+        rectangles.extend((x + col_offset, y + row_offset, w, h)
+                          for (x, y, w, h) in weighted_rectangle_decomposition(component, component_widths, component_heights))
+    return rectangles
+
+
+def run_component_batches(executor: Optional[Executor], worker: Callable[..., List[Tuple[int, int, int, int]]],
+                          batches: List[List[Tuple[int, int, np.ndarray]]]) -> List[Tuple[int, int, int, int]]:
+    """
+    Decompose component batches on an executor and merge them in a fixed order.
+
+    Args:
+        executor: Executor the batches are submitted to, or None to run them here
+        worker: Picklable function decomposing one batch, e.g. a functools.partial
+                of decompose_component_batch()
+        batches: Batches from split_components()
+
+    Returns:
+        All rectangles in top-left scan order, independent of the number of
+        workers and of the order the batches finish in
+    """
+    results = executor.map(worker, batches) if executor is not None else map(worker, batches)
+    rectangles = [rect for part in results for rect in part]
+    rectangles.sort(key=lambda r: (r[1], r[0]))
+    return rectangles
+
+
+def compressed_region_rectangles(include: np.ndarray, exclude: np.ndarray, executor: Optional[Executor] = None,
+                                 tiles: int = DEFAULT_TILES) -> List[Tuple[int, int, int, int]]:
+    """
+    Decompose (union of include) minus (union of exclude) on a compressed grid.
+
+    Only the distinct x and y edges of the given rectangles are used as grid
+    lines, so the grid size follows the boundary complexity of the shape
+    instead of its area in pixels. The greedy decomposition is then run on
+    that grid weighted by the real cell sizes, which yields exactly the same
+    rectangles as running it on the full pixel raster: every rectangle placed
+    by the raster greedy ends on one of these grid lines.
+
+    Args:
+        include: Integer array (N, 4) of (x0, y0, x1, y1) pixel rectangles to cover
+        exclude: Integer array (M, 4) of (x0, y0, x1, y1) pixel rectangles to cut out
+        executor: Optional executor the connected parts or strips of the grid
+                  are decomposed on (see split_components())
+        tiles: Sweep the compressed grid in this many strips of rows (see
+               tiled_greedy_decomposition())
+
+    Returns:
+        List of rectangles as (x, y, width, height) tuples in pixel units
+    """
+    if len(include) == 0:
+        return []
+
+    both = np.concatenate([include, exclude]) if len(exclude) else include
+    xs = np.unique(np.concatenate([both[:, 0], both[:, 2]]))
+    ys = np.unique(np.concatenate([both[:, 1], both[:, 3]]))
+
+    def paint(rects: np.ndarray) -> np.ndarray:
+        # 2D difference array: +1/-1 at the corners, then prefix sums
+        coverage = np.zeros((len(ys), len(xs)), dtype=np.int32)
+        if len(rects):
+            x0 = np.searchsorted(xs, rects[:, 0])
+            x1 = np.searchsorted(xs, rects[:, 2])
+            y0 = np.searchsorted(ys, rects[:, 1])
+            y1 = np.searchsorted(ys, rects[:, 3])
+            np.add.at(coverage, (y0, x0), 1)
+            np.add.at(coverage, (y0, x1), -1)
+            np.add.at(coverage, (y1, x0), -1)
+            np.add.at(coverage, (y1, x1), 1)
+            coverage = coverage.cumsum(axis=0).cumsum(axis=1)
+        return coverage[:-1, :-1] > 0
+
+    region = paint(include) & ~paint(exclude)
+
+    worker = functools.partial(weighted_component_batch, col_widths=np.diff(xs), row_heights=np.diff(ys))
+    if tiles > 1:
+        cells = tiled_greedy_decomposition(region, tiles, executor, np.diff(xs), np.diff(ys))
+    else:
+        batches = split_components(region) if executor is not None else []
+        if len(batches) > 1:
+            cells = run_component_batches(executor, worker, batches)
+        else:
+            cells = weighted_rectangle_decomposition(region, np.diff(xs), np.diff(ys))
+    return [
+        (int(xs[col]), int(ys[row]), int(xs[col + width] - xs[col]), int(ys[row + height] - ys[row]))
+        for (col, row, width, height) in cells
+    ]
+
+
+def update_region_rectangles(include: np.ndarray, exclude: np.ndarray, previous: np.ndarray, dirty: np.ndarray) -> Tuple[np.ndarray, List[Tuple[int, int, int, int]]]:
+    """
+    Update a previous decomposition of a region after part of it changed.
+
+    Previous rectangles clear of every dirty window are kept as they are.
+    The rest of the region can only lie inside the dirty windows or the
+    dropped rectangles, so it is decomposed on their bounding box alone with
+    the kept rectangles cut out, which keeps the result an exact cover.
+
+    Args:
+        include: Integer array (N, 4) of (x0, y0, x1, y1) pixel rectangles to cover
+        exclude: Integer array (M, 4) of (x0, y0, x1, y1) pixel rectangles to cut out
+        previous: Integer array (K, 4) of (x, y, width, height) rectangles
+                  covering the region before the change
+        dirty: Integer array (D, 4) of (x0, y0, x1, y1) pixel windows outside
+               of which the region is unchanged
+
+    Returns:
+        Tuple of (keep, rectangles): boolean array marking the kept previous
+        rectangles, and the new (x, y, width, height) rectangles
+    """
+    previous_bounds = np.concatenate([previous[:, :2], previous[:, :2] + previous[:, 2:]], axis=1).reshape(-1, 4)
+    if len(dirty) == 0:
+        return np.ones(len(previous_bounds), dtype=bool), []
+
+    # A previous rectangle is dropped if it overlaps any dirty window
+    overlaps = (
+        (previous_bounds[:, None, 0] < dirty[None, :, 2]) & (dirty[None, :, 0] < previous_bounds[:, None, 2]) &
+        (previous_bounds[:, None, 1] < dirty[None, :, 3]) & (dirty[None, :, 1] < previous_bounds[:, None, 3])
+    )
+    keep = ~overlaps.any(axis=1)
+
+    freed = np.concatenate([dirty, previous_bounds[~keep]])
+    window = np.concatenate([freed[:, :2].min(axis=0), freed[:, 2:].max(axis=0)])
+
+    def clip(rects: np.ndarray) -> np.ndarray:
+        clipped = np.concatenate([np.maximum(rects[:, :2], window[:2]), np.minimum(rects[:, 2:], window[2:])], axis=1)
+        return clipped[(clipped[:, 0] < clipped[:, 2]) & (clipped[:, 1] < clipped[:, 3])].reshape(-1, 4)
+
+    cutout = np.concatenate([exclude.reshape(-1, 4), previous_bounds[keep]])
+    return keep, compressed_region_rectangles(clip(include.reshape(-1, 4)), clip(cutout))
+
+
+def extract_border_rectangles_mm(mask: np.ndarray, border_thickness_mm: float, unit_size: float = 8.0, inset_mm: float = 0.0, engine: str = DEFAULT_DECOMPOSITION_ENGINE, geometry: str = DEFAULT_BORDER_GEOMETRY, previous: Optional[Tuple[np.ndarray, List[Tuple[float, float, float, float]]]] = None, stats: Optional[Dict[str, object]] = None, executor: Optional[Executor] = None, tiles: int = DEFAULT_TILES) -> List[Tuple[float, float, float, float]]:
     """
     Extract border region outside the shape and decompose into mm-based rectangles.
 
     This uses a high-resolution approach:
-    1. Create a high-res mask with fine resolution
+    1. Map the shape onto a grid with fine resolution
     2. Mark all border pixels in this high-res space
     3. Apply greedy rectangle decomposition to find optimal rectangles
 
+    With the 'exact' geometry the high-res raster is never built: the shape
+    and its dilations are unions of axis-aligned rectangles, so the border is
+    decomposed on the compressed grid of their distinct edges instead.
+
     Args:
         mask: 2D boolean array where True = inside shape (in brick units)
         border_thickness_mm: Thickness of border in millimeters
         unit_size: Size of one brick unit in mm (default 8.0)
         inset_mm: Inset amount in millimeters to shrink the shape before creating border (default 0.0)
                   Positive value creates clearance for stacked bricks
+        engine: Rectangle decomposition engine, one of DECOMPOSITION_ENGINES (raster geometry only)
+        geometry: Border geometry engine, one of BORDER_GEOMETRIES
+        previous: Optional (mask, rectangles) of an earlier run with the same
+                  options; with the 'exact' geometry only rectangles within
+                  border reach of changed cells are recomputed
+        stats: Optional dictionary that receives 'hr_mask', the size
+               (width x height) of the 0.1mm grid the border lives on
+        executor: Optional executor the connected parts of the border are
+                  decomposed on ('exact' and 'raster' geometry)
+        tiles: Sweep the border in this many strips of rows ('exact' and
+               'raster' geometry, see tiled_greedy_decomposition())
 
     Returns:
         List of rectangles as (x_mm, y_mm, width_mm, height_mm) tuples in millimeters
+
+    Raises:
+        ValueError: If geometry is not a known border geometry engine
     """
     rows, cols = mask.shape
 
     # Use a fine resolution (0.1mm) to accurately represent any border thickness
     # This ensures precise mapping regardless of border_thickness_mm value
-    resolution_mm = 0.1
+    resolution_mm = BORDER_RESOLUTION_MM
 
     # Calculate padded dimensions to accommodate border
     border_pixels = int(np.ceil(border_thickness_mm / resolution_mm))
-
-    # High-res dimensions - calculate exact sizes
-    hr_width = int(np.round(cols * unit_size / resolution_mm)) + 2 * border_pixels
-    hr_height = int(np.round(rows * unit_size / resolution_mm)) + 2 * border_pixels
-
-    # Create high-res masks
-    hr_shape_mask = np.zeros((hr_height, hr_width), dtype=bool)
-
-    # Map original shape to high-res grid using exact floating-point arithmetic
-    for row in range(rows):
-        for col in range(cols):
-            if mask[row, col]:
-                # Calculate high-res coordinates for this brick unit using rounding
-                # to ensure consistent mapping
-                hr_col_start = int(np.round(col * unit_size / resolution_mm)) + border_pixels
-                hr_row_start = int(np.round(row * unit_size / resolution_mm)) + border_pixels
-                hr_col_end = int(np.round((col + 1) * unit_size / resolution_mm)) + border_pixels
-                hr_row_end = int(np.round((row + 1) * unit_size / resolution_mm)) + border_pixels
-
-                hr_shape_mask[hr_row_start:hr_row_end, hr_col_start:hr_col_end] = True
-
-    # Dilate the shape to create border region
-    struct = ndimage.generate_binary_structure(2, 2)
-    dilated = hr_shape_mask.copy()
-    for _ in range(border_pixels):
-        dilated = ndimage.binary_dilation(dilated, structure=struct)
-
-    # For inset version: expand the inner edge cutout
-    if inset_mm > 0:
-        inset_pixels = int(np.round(inset_mm / resolution_mm))
-        struct = ndimage.generate_binary_structure(2, 2)
-        # Expand the shape mask to create clearance on inner edge
-        inner_edge = hr_shape_mask.copy()
-        for _ in range(inset_pixels):
-            inner_edge = ndimage.binary_dilation(inner_edge, structure=struct)
-        # Border is between outer edge (dilated) and inner edge (expanded shape)
-        hr_border_mask = dilated & ~inner_edge
+    inset_pixels = int(np.round(inset_mm / resolution_mm)) if inset_mm > 0 else 0
+
+    # High-res boundaries of every brick column and row, rounded once
+    col_edges = np.round(np.arange(cols + 1) * unit_size / resolution_mm).astype(np.int64) + border_pixels
+    row_edges = np.round(np.arange(rows + 1) * unit_size / resolution_mm).astype(np.int64) + border_pixels
+    col_starts, col_ends = col_edges[:-1], col_edges[1:]
+    row_starts, row_ends = row_edges[:-1], row_edges[1:]
+    if stats is not None:
+        stats['hr_mask'] = f"{int(col_edges[-1]) + border_pixels}x{int(row_edges[-1]) + border_pixels}"
+
+    kept_rectangles = []
+    if geometry == 'exact':
+        # Dilating with the 8-connected structure n times grows every shape
+        # cell by n pixels on each side, so both the outer edge and the inner
+        # cutout are plain unions of grown cell rectangles
+        cells = shape_cell_rectangles_hr(mask, col_starts, col_ends, row_starts, row_ends)
+        grow = np.array([-1, -1, 1, 1], dtype=np.int64)
+        if previous is not None and previous[0].shape == mask.shape:
+            # A pixel's border status only depends on shape cells within
+            # border reach, so changed cells grown by it bound the update
+            previous_mask, previous_rectangles = previous
+            changed = shape_cell_rectangles_hr(previous_mask != mask, col_starts, col_ends, row_starts, row_ends)
+            previous_hr = np.array([
+                (round(x_mm / resolution_mm) + border_pixels, round(y_mm / resolution_mm) + border_pixels,
+                 round(width_mm / resolution_mm), round(height_mm / resolution_mm))
+                for (x_mm, y_mm, width_mm, height_mm) in previous_rectangles
+            ], dtype=np.int64).reshape(-1, 4)
+            keep, hr_rectangles = update_region_rectangles(
+                cells + grow * border_pixels, cells + grow * inset_pixels,
+                previous_hr, changed + grow * max(border_pixels, inset_pixels))
+            kept_rectangles = [tuple(rect) for rect, kept in zip(previous_rectangles, keep) if kept]
+        else:
+            hr_rectangles = compressed_region_rectangles(cells + grow * border_pixels, cells + grow * inset_pixels, executor, tiles)
+    elif geometry in ('raster', 'packed'):
+        shape_rows, shape_cols = np.nonzero(mask)
+        if len(shape_rows) == 0:
+            return []
+
+        # Only the shape's bounding box grown by the border can be affected,
+        # so build the high-res mask for that window alone
+        window = (
+            max(int(col_starts[shape_cols.min()]) - border_pixels, 0),
+            max(int(row_starts[shape_rows.min()]) - border_pixels, 0),
+            int(col_ends[shape_cols.max()]) + border_pixels,
+            int(row_ends[shape_rows.max()]) + border_pixels,
+        )
+        if geometry == 'packed':
+            # Same steps on packed bits: shifted ORs replace the distance transform
+            hr_shape_mask = PackedMask.from_cells(mask, col_starts, col_ends, row_starts, row_ends, window)
+            dilated = hr_shape_mask.dilate(border_pixels)
+            inner_edge = hr_shape_mask.dilate(inset_pixels) if inset_mm > 0 else hr_shape_mask
+            del hr_shape_mask
+            hr_border_mask = dilated & ~inner_edge
+        else:
+            hr_shape_mask = upsample_mask_hr(mask, col_starts, col_ends, row_starts, row_ends, window)
+
+            # Dilate the shape to create border region. One distance transform
+            # serves both the outer edge and the inset inner edge.
+            distance = chessboard_distance_to(hr_shape_mask)
+            dilated = dilate_chessboard(distance, border_pixels, hr_shape_mask.shape)
+
+            # For inset version: expand the inner edge cutout
+            if inset_mm > 0:
+                # Expand the shape mask to create clearance on inner edge
+                inner_edge = dilate_chessboard(distance, inset_pixels, hr_shape_mask.shape)
+                # Border is between outer edge (dilated) and inner edge (expanded shape)
+                hr_border_mask = dilated & ~inner_edge
+            else:
+                # Border is dilated minus original shape
+                hr_border_mask = dilated & ~hr_shape_mask
+
+        # Apply greedy rectangle decomposition to the high-res border mask
+        hr_rectangles = [
+            (hr_col + window[0], hr_row + window[1], hr_width, hr_height)
+            for (hr_col, hr_row, hr_width, hr_height) in decompose_mask(hr_border_mask, 'greedy', engine, executor=executor, tiles=tiles)
+        ]
     else:
-        # Border is dilated minus original shape
-        hr_border_mask = dilated & ~hr_shape_mask
-
-    # Apply greedy rectangle decomposition to the high-res border mask
-    hr_rectangles = greedy_rectangle_decomposition(hr_border_mask)
+        raise ValueError(f"Unknown border geometry: {geometry} (expected one of: {', '.join(BORDER_GEOMETRIES)})")
 
     # Convert high-res rectangles back to mm coordinates
-    mm_rectangles = []
+    mm_rectangles = kept_rectangles
     for (hr_col, hr_row, hr_width, hr_height) in hr_rectangles:
         # Convert from high-res grid to mm coordinates
         # Subtract border_pixels offset and multiply by resolution
@@ -263,7 +1566,7 @@ def extract_border_rectangles_mm(mask: np.ndarray, border_thickness_mm: float, u
     return mm_rectangles
 
 
-def extract_frame_rectangles_mm(mask: np.ndarray, padding_mm: float, unit_size: float = 8.0, inset_mm: float = 0.0) -> List[Tuple[float, float, float, float]]:
+def extract_frame_rectangles_mm(mask: np.ndarray, padding_mm: float, unit_size: float = 8.0, inset_mm: float = 0.0, engine: str = DEFAULT_DECOMPOSITION_ENGINE, geometry: str = DEFAULT_BORDER_GEOMETRY, previous: Optional[Tuple[np.ndarray, List[Tuple[float, float, float, float]]]] = None, stats: Optional[Dict[str, object]] = None, executor: Optional[Executor] = None, tiles: int = DEFAULT_TILES) -> List[Tuple[float, float, float, float]]:
     """
     Extract frame region - a filled rectangular border enclosing the entire shape.
 
@@ -277,9 +1580,24 @@ def extract_frame_rectangles_mm(mask: np.ndarray, padding_mm: float, unit_size:
         unit_size: Size of one brick unit in mm (default 8.0)
         inset_mm: Inset amount in millimeters to shrink the shape before creating frame (default 0.0)
                   Positive value creates clearance for stacked bricks
+        engine: Rectangle decomposition engine, one of DECOMPOSITION_ENGINES (raster geometry only)
+        geometry: Frame geometry engine, one of BORDER_GEOMETRIES
+        previous: Optional (mask, rectangles) of an earlier run with the same
+                  options; with the 'exact' geometry and an unchanged shape
+                  bounding box only rectangles within inset reach of changed
+                  cells are recomputed
+        stats: Optional dictionary that receives 'hr_mask', the size
+               (width x height) of the 0.1mm grid the frame lives on
+        executor: Optional executor the connected parts of the frame are
+                  decomposed on ('exact' and 'raster' geometry)
+        tiles: Sweep the frame in this many strips of rows ('exact' and
+               'raster' geometry, see tiled_greedy_decomposition())
 
     Returns:
         List of rectangles as (x_mm, y_mm, width_mm, height_mm) tuples in millimeters
+
+    Raises:
+        ValueError: If geometry is not a known border geometry engine
     """
     rows, cols = mask.shape
 
@@ -310,59 +1628,84 @@ def extract_frame_rectangles_mm(mask: np.ndarray, padding_mm: float, unit_size:
     outer_height_mm = inner_height_mm + 2 * padding_mm
 
     # Create a high-resolution mask to identify frame region
-    resolution_mm = 0.1
+    resolution_mm = BORDER_RESOLUTION_MM
 
     # Calculate dimensions for high-res grid
     hr_width = int(np.round(outer_width_mm / resolution_mm))
     hr_height = int(np.round(outer_height_mm / resolution_mm))
+    if stats is not None:
+        stats['hr_mask'] = f"{hr_width}x{hr_height}"
+
+    # High-res bounds of every brick column and row relative to the outer
+    # rectangle origin, rounded once and clamped to the valid range
+    shape_x_mm = np.arange(cols) * unit_size - outer_x_mm
+    shape_y_mm = np.arange(rows) * unit_size - outer_y_mm
+    col_starts = np.clip(np.round(shape_x_mm / resolution_mm), 0, hr_width).astype(np.int64)
+    col_ends = np.clip(np.round((shape_x_mm + unit_size) / resolution_mm), 0, hr_width).astype(np.int64)
+    row_starts = np.clip(np.round(shape_y_mm / resolution_mm), 0, hr_height).astype(np.int64)
+    row_ends = np.clip(np.round((shape_y_mm + unit_size) / resolution_mm), 0, hr_height).astype(np.int64)
+
+    kept_rectangles = []
+    if geometry == 'exact':
+        # Shape cells grown by the inset; the frame is the outer rectangle
+        # minus them
+        cells = shape_cell_rectangles_hr(mask, col_starts, col_ends, row_starts, row_ends)
+        inset_pixels = int(np.round(inset_mm / resolution_mm)) if inset_mm > 0 else 0
+        grow = np.array([-1, -1, 1, 1], dtype=np.int64)
+        outer = np.array([[0, 0, hr_width, hr_height]], dtype=np.int64)
+        same_bounds = False
+        if previous is not None and previous[0].shape == mask.shape:
+            previous_mask, previous_rectangles = previous
+            previous_rows, previous_cols = np.where(previous_mask)
+            same_bounds = len(previous_rows) > 0 and (
+                (previous_rows.min(), previous_rows.max(), previous_cols.min(), previous_cols.max()) ==
+                (min_row, max_row, min_col, max_col)
+            )
+        if same_bounds:
+            # Same bounding box, so the outer rectangle is unchanged and only
+            # pixels within inset reach of changed cells can differ
+            changed = shape_cell_rectangles_hr(previous_mask != mask, col_starts, col_ends, row_starts, row_ends)
+            previous_hr = np.array([
+                (round((x_mm - outer_x_mm) / resolution_mm), round((y_mm - outer_y_mm) / resolution_mm),
+                 round(width_mm / resolution_mm), round(height_mm / resolution_mm))
+                for (x_mm, y_mm, width_mm, height_mm) in previous_rectangles
+            ], dtype=np.int64).reshape(-1, 4)
+            keep, hr_rectangles = update_region_rectangles(outer, cells + grow * inset_pixels, previous_hr, changed + grow * inset_pixels)
+            kept_rectangles = [tuple(rect) for rect, kept in zip(previous_rectangles, keep) if kept]
+        else:
+            hr_rectangles = compressed_region_rectangles(outer, cells + grow * inset_pixels, executor, tiles)
+    elif geometry == 'packed':
+        # Outer rectangle minus the (inset-expanded) shape on packed bits;
+        # inverting a packed mask keeps it within the outer rectangle
+        hr_shape_mask = PackedMask.from_cells(mask, col_starts, col_ends, row_starts, row_ends, (0, 0, hr_width, hr_height))
+        if inset_mm > 0:
+            hr_shape_mask = hr_shape_mask.dilate(int(np.round(inset_mm / resolution_mm)))
+        hr_rectangles = greedy_rectangle_decomposition(~hr_shape_mask, engine)
+    elif geometry == 'raster':
+        # Create high-res frame mask (everything inside outer rectangle)
+        hr_frame_mask = np.ones((hr_height, hr_width), dtype=bool)
+
+        # Create high-res shape mask and subtract it from frame
+        hr_shape_mask = upsample_mask_hr(mask, col_starts, col_ends, row_starts, row_ends, (0, 0, hr_width, hr_height))
+
+        # For inset version: expand the inner edge cutout
+        if inset_mm > 0:
+            inset_pixels = int(np.round(inset_mm / resolution_mm))
+            # Expand the shape mask to create clearance on inner edge
+            inner_edge = dilate_chessboard(chessboard_distance_to(hr_shape_mask), inset_pixels, hr_shape_mask.shape)
+            # Frame is between outer rectangle and inner edge (expanded shape)
+            hr_frame_mask = hr_frame_mask & ~inner_edge
+        else:
+            # Frame region is outer rectangle minus shape
+            hr_frame_mask = hr_frame_mask & ~hr_shape_mask
 
-    # Create high-res frame mask (everything inside outer rectangle)
-    hr_frame_mask = np.ones((hr_height, hr_width), dtype=bool)
-
-    # Create high-res shape mask and subtract it from frame
-    hr_shape_mask = np.zeros((hr_height, hr_width), dtype=bool)
-
-    # Map original shape to high-res grid
-    for row in range(rows):
-        for col in range(cols):
-            if mask[row, col]:
-                # Calculate position relative to outer rectangle origin
-                shape_x_mm = col * unit_size - outer_x_mm
-                shape_y_mm = row * unit_size - outer_y_mm
-
-                # Convert to high-res coordinates
-                hr_col_start = int(np.round(shape_x_mm / resolution_mm))
-                hr_row_start = int(np.round(shape_y_mm / resolution_mm))
-                hr_col_end = int(np.round((shape_x_mm + unit_size) / resolution_mm))
-                hr_row_end = int(np.round((shape_y_mm + unit_size) / resolution_mm))
-
-                # Clamp to valid range
-                hr_col_start = max(0, min(hr_width, hr_col_start))
-                hr_col_end = max(0, min(hr_width, hr_col_end))
-                hr_row_start = max(0, min(hr_height, hr_row_start))
-                hr_row_end = max(0, min(hr_height, hr_row_end))
-
-                hr_shape_mask[hr_row_start:hr_row_end, hr_col_start:hr_col_end] = True
-
-    # For inset version: expand the inner edge cutout
-    if inset_mm > 0:
-        inset_pixels = int(np.round(inset_mm / resolution_mm))
-        struct = ndimage.generate_binary_structure(2, 2)
-        # Expand the shape mask to create clearance on inner edge
-        inner_edge = hr_shape_mask.copy()
-        for _ in range(inset_pixels):
-            inner_edge = ndimage.binary_dilation(inner_edge, structure=struct)
-        # Frame is between outer rectangle and inner edge (expanded shape)
-        hr_frame_mask = hr_frame_mask & ~inner_edge
+        # Apply greedy rectangle decomposition
+        hr_rectangles = decompose_mask(hr_frame_mask, 'greedy', engine, executor=executor, tiles=tiles)
     else:
-        # Frame region is outer rectangle minus shape
-        hr_frame_mask = hr_frame_mask & ~hr_shape_mask
-
-    # Apply greedy rectangle decomposition
-    hr_rectangles = greedy_rectangle_decomposition(hr_frame_mask)
+        raise ValueError(f"Unknown border geometry: {geometry} (expected one of: {', '.join(BORDER_GEOMETRIES)})")
 
     # Convert high-res rectangles back to mm coordinates (relative to outer rectangle origin)
-    mm_rectangles = []
+    mm_rectangles = kept_rectangles
     for (hr_col, hr_row, hr_width_px, hr_height_px) in hr_rectangles:
         # Convert from high-res grid to mm coordinates, offset by outer rectangle position
         x_mm = outer_x_mm + hr_col * resolution_mm
@@ -375,6 +1718,97 @@ def extract_frame_rectangles_mm(mask: np.ndarray, padding_mm: float, unit_size:
     return mm_rectangles
 
 
+def merge_rectangles(rectangles: List[Tuple[float, float, float, float]], quantum: float = 1) -> List[Tuple[float, float, float, float]]:
+    """
+    Merge rectangles that share a complete edge until no two of them do.
+
+    Every rectangle is indexed by its four edges in hash maps keyed by the
+    quantised edge coordinates, so the neighbour sharing an edge is a single
+    lookup. A worklist revisits every merged rectangle, so merges cascade in
+    both directions until a fixpoint: at most one merge per input rectangle,
+    after sorting them once.
+
+    Args:
+        rectangles: List of non-overlapping (x, y, width, height) tuples
+        quantum: Coordinates closer than half of this are treated as equal
+
+    Returns:
+        Merged rectangles sorted by (y, x); unmerged rectangles are returned unchanged
+    """
+    def snap(value: float) -> int:
+        return int(round(value / quantum))
+
+    # id -> (x0, y0, x1, y1) on the quantised grid, and the original tuple
+    # of rectangles that were not merged
+    boxes = {}
+    originals = {}
+    values = {}
+    for rect in sorted(set(rectangles), key=lambda r: (r[1], r[0])):
+        x, y, w, h = rect
+        box = (snap(x), snap(y), snap(x + w), snap(y + h))
+        if box[0] == box[2] or box[1] == box[3]:
+            continue
+        for key, value in zip(box, (x, y, x + w, y + h)):
+            values.setdefault(key, value)
+        originals[len(boxes)] = rect
+        boxes[len(boxes)] = box
+
+    by_left, by_right, by_top, by_bottom = {}, {}, {}, {}
+
+    def edges(box: Tuple[int, int, int, int]) -> Iterator[Tuple[dict, Tuple[int, int, int]]]:
+        x0, y0, x1, y1 = box
+        yield by_left, (x0, y0, y1)
+        yield by_right, (x1, y0, y1)
+        yield by_top, (y0, x0, x1)
+        yield by_bottom, (y1, x0, x1)
+
+    def add(rect_id: int) -> None:
+        for index, key in edges(boxes[rect_id]):
+            index.setdefault(key, rect_id)
+
+    def remove(rect_id: int) -> None:
+        for index, key in edges(boxes.pop(rect_id)):
+            if index.get(key) == rect_id:
+                del index[key]
+        originals.pop(rect_id, None)
+
+    for rect_id in boxes:
+        add(rect_id)
+
+    worklist = list(reversed(boxes))
+    next_id = len(boxes)
+    while worklist:
+        rect_id = worklist.pop()
+        if rect_id not in boxes:
+            continue
+        x0, y0, x1, y1 = boxes[rect_id]
+        # Right, bottom, left and top neighbours sharing the whole edge
+        for index, key, merged in ((by_left, (x1, y0, y1), lambda b: (x0, y0, b[2], y1)),
+                                   (by_top, (y1, x0, x1), lambda b: (x0, y0, x1, b[3])),
+                                   (by_right, (x0, y0, y1), lambda b: (b[0], y0, x1, y1)),
+                                   (by_bottom, (y0, x0, x1), lambda b: (x0, b[1], x1, y1))):
+            neighbour = index.get(key)
+            if neighbour is not None and neighbour != rect_id:
+                box = merged(boxes[neighbour])
+                remove(rect_id)
+                remove(neighbour)
+                boxes[next_id] = box
+                add(next_id)
+                worklist.append(next_id)
+                next_id += 1
+                break
+
+    merged_rectangles = []
+    for rect_id, (x0, y0, x1, y1) in boxes.items():
+        if rect_id in originals:
+            merged_rectangles.append(originals[rect_id])
+        else:
+            x, y = values[x0], values[y0]
+            merged_rectangles.append((x, y, values[x1] - x, values[y1] - y))
+    merged_rectangles.sort(key=lambda r: (r[1], r[0]))
+    return merged_rectangles
+
+
 def merge_mm_rectangles(rectangles: List[Tuple[float, float, float, float]]) -> List[Tuple[float, float, float, float]]:
     """
     Merge adjacent mm-based rectangles to minimize the number of cubes.
@@ -385,41 +1819,171 @@ def merge_mm_rectangles(rectangles: List[Tuple[float, float, float, float]]) ->
     Returns:
         Merged list of rectangles
     """
-    if not rectangles:
-        return []
+    return merge_rectangles(rectangles, MERGE_QUANTUM_MM)
 
-    # Sort rectangles by y, then x
-    sorted_rects = sorted(rectangles, key=lambda r: (r[1], r[0]))
 
-    merged = []
-    current = list(sorted_rects[0])
+def trace_region_outlines(rectangles: List[Tuple[float, float, float, float]]) -> List[List[Tuple[float, float]]]:
+    """
+    Trace the outline of a union of rectangles into closed polygon loops.
 
-    for rect in sorted_rects[1:]:
-        x, y, w, h = rect
-        cx, cy, cw, ch = current
+    The rectangles are painted onto the grid of their distinct x and y edges,
+    and every grid edge between a filled and an empty cell becomes a directed
+    boundary edge with the region on its right (in image coordinates, Y
+    down). The edges are chained into loops, turning towards the region
+    where two loops touch at a corner so they stay separate. A loop that
+    still passes a vertex twice (a hole touching the outline at a corner) is
+    split there, and vertices between collinear edges are dropped. Outer outlines and holes both come
+    out as loops, so the region is their even-odd fill.
 
-        # Try to merge horizontally (same y, height, and adjacent/overlapping x)
-        if abs(y - cy) < 0.01 and abs(h - ch) < 0.01:
-            if abs(x - (cx + cw)) < 0.01:  # Adjacent on right
-                current[2] += w  # Extend width
-                continue
-            elif abs(x - cx) < 0.01 and abs(w - cw) < 0.01:  # Same position
-                continue  # Skip duplicate
+    Args:
+        rectangles: List of rectangles as (x, y, width, height) tuples
 
-        # Try to merge vertically (same x, width, and adjacent/overlapping y)
-        if abs(x - cx) < 0.01 and abs(w - cw) < 0.01:
-            if abs(y - (cy + ch)) < 0.01:  # Adjacent on bottom
-                current[3] += h  # Extend height
-                continue
+    Returns:
+        List of loops, each a list of (x, y) vertices without repeating the first
+    """
+    if not rectangles:
+        return []
+
+    # Round away floating point noise so nearly equal edges share a grid line
+    rects = np.round(np.array(rectangles, dtype=np.float64).reshape(-1, 4), MESH_COORDINATE_DECIMALS)
+    bounds = np.round(np.concatenate([rects[:, :2], rects[:, :2] + rects[:, 2:]], axis=1), MESH_COORDINATE_DECIMALS)
+    xs = np.unique(np.concatenate([bounds[:, 0], bounds[:, 2]]))
+    ys = np.unique(np.concatenate([bounds[:, 1], bounds[:, 3]]))
+
+    # Paint the cells with a 2D difference array, padded by one empty cell
+    coverage = np.zeros((len(ys), len(xs)), dtype=np.int32)
+    x0, x1 = np.searchsorted(xs, bounds[:, 0]), np.searchsorted(xs, bounds[:, 2])
+    y0, y1 = np.searchsorted(ys, bounds[:, 1]), np.searchsorted(ys, bounds[:, 3])
+    np.add.at(coverage, (y0, x0), 1)
+    np.add.at(coverage, (y0, x1), -1)
+    np.add.at(coverage, (y1, x0), -1)
+    np.add.at(coverage, (y1, x1), 1)
+    filled = np.zeros((len(ys) + 1, len(xs) + 1), dtype=bool)
+    filled[1:-1, 1:-1] = coverage.cumsum(axis=0).cumsum(axis=1)[:-1, :-1] > 0
+
+    # Directed boundary edges between grid points (column, row), keyed by start
+    outgoing = {}
+
+    def add_edges(starts: Tuple[np.ndarray, np.ndarray], step: Tuple[int, int]) -> None:
+        for col, row in zip(*starts):
+            outgoing.setdefault((int(col), int(row)), []).append((int(col) + step[0], int(row) + step[1]))
+
+    # Vertical grid line i separates padded cells (r, i) and (r, i + 1)
+    left, right = filled[:, :-1], filled[:, 1:]
+    rows, cols = np.nonzero(left & ~right)
+    add_edges((cols, rows - 1), (0, 1))
+    rows, cols = np.nonzero(right & ~left)
+    add_edges((cols, rows), (0, -1))
+    # Horizontal grid line j separates padded cells (j, c) and (j + 1, c)
+    above, below = filled[:-1, :], filled[1:, :]
+    rows, cols = np.nonzero(above & ~below)
+    add_edges((cols, rows), (-1, 0))
+    rows, cols = np.nonzero(below & ~above)
+    add_edges((cols - 1, rows), (1, 0))
+
+    loops = []
+    while outgoing:
+        start = next(iter(outgoing))
+        loop = [start]
+        direction = None
+        point = start
+        while True:
+            targets = outgoing[point]
+            if len(targets) > 1 and direction is not None:
+                # Two loops touch here: prefer turning right (towards the
+                # region), then straight on, then left
+                preference = [(-direction[1], direction[0]), direction, (direction[1], -direction[0])]
+                targets.sort(key=lambda t: preference.index((t[0] - point[0], t[1] - point[1])))
+            target = targets.pop(0)
+            if not targets:
+                del outgoing[point]
+            direction = (target[0] - point[0], target[1] - point[1])
+            point = target
+            if point == start:
+                break
+            loop.append(point)
+
+        # Where a hole touches the outline at a corner the loop passes that
+        # vertex twice; split it there into simple loops with the same edges
+        pieces = []
+        path = []
+        seen = {}
+        for point in loop:
+            if point in seen:
+                index = seen[point]
+                pieces.append(path[index:])
+                for dropped in path[index + 1:]:
+                    del seen[dropped]
+                path = path[:index + 1]
+            else:
+                seen[point] = len(path)
+                path.append(point)
+        pieces.append(path)
+
+        # Drop vertices between collinear edges
+        for piece in pieces:
+            corners = []
+            for i, current in enumerate(piece):
+                previous, following = piece[i - 1], piece[(i + 1) % len(piece)]
+                if (current[0] - previous[0]) * (following[1] - current[1]) != (current[1] - previous[1]) * (following[0] - current[0]):
+                    corners.append((float(xs[current[0]]), float(ys[current[1]])))
+            loops.append(corners)
+
+    return loops
+
+
+def chessboard_distance_to(mask: np.ndarray) -> Optional[np.ndarray]:
+    """
+    Compute the chessboard distance from every pixel to the nearest True pixel.
+
+    Thresholding the result gives the 8-connected dilation of the mask by any
+    number of pixels: distance <= n is bit-identical to n iterations of
+    ndimage.binary_dilation() with the 3x3 structure, so one transform serves
+    every thickness.
+
+    Args:
+        mask: 2D boolean array
+
+    Returns:
+        2D int32 array of distances (0 on True pixels), or None if the mask is empty
+    """
+    if not mask.any():
+        return None
+    return ndimage.distance_transform_cdt(~mask, metric='chessboard')
+
+
+def chessboard_depth(mask: np.ndarray) -> np.ndarray:
+    """
+    Compute the chessboard distance from every True pixel to the nearest False one.
+
+    Pixels outside the array count as False, so depth > n is bit-identical to
+    n iterations of ndimage.binary_erosion() with the 3x3 structure.
+
+    Args:
+        mask: 2D boolean array
+
+    Returns:
+        2D int32 array of depths (0 on False pixels)
+    """
+    padded = np.pad(mask, 1, constant_values=False)
+    return ndimage.distance_transform_cdt(padded, metric='chessboard')[1:-1, 1:-1]
 
-        # Can't merge, save current and start new
-        merged.append(tuple(current))
-        current = list(rect)
 
-    # Add the last rectangle
-    merged.append(tuple(current))
+def dilate_chessboard(distance: Optional[np.ndarray], pixels: int, shape: Tuple[int, int]) -> np.ndarray:
+    """
+    Threshold a chessboard distance transform into a dilated mask.
+
+    Args:
+        distance: Result of chessboard_distance_to() (None for an empty mask)
+        pixels: Dilation radius in pixels (0 returns the original mask)
+        shape: Shape of the mask, used when distance is None
 
-    return merged
+    Returns:
+        2D boolean array of the dilated mask
+    """
+    if distance is None:
+        return np.zeros(shape, dtype=bool)
+    return distance <= max(pixels, 0)
 
 
 def extract_edge_and_interior(mask: np.ndarray, edge_thickness: int) -> Tuple[np.ndarray, np.ndarray]:
@@ -433,13 +1997,9 @@ def extract_edge_and_interior(mask: np.ndarray, edge_thickness: int) -> Tuple[np
     Returns:
         Tuple of (edge_mask, interior_mask)
     """
-    # Create structuring element for erosion (8-connectivity for diagonal edges)
-    struct = ndimage.generate_binary_structure(2, 2)
-
-    # Erode the mask by edge_thickness pixels
-    eroded_mask = mask.copy()
-    for _ in range(edge_thickness):
-        eroded_mask = ndimage.binary_erosion(eroded_mask, structure=struct)
+    # Erode the mask by edge_thickness pixels (8-connectivity for diagonal
+    # edges): a pixel survives if it is deeper than the edge thickness
+    eroded_mask = chessboard_depth(mask) > edge_thickness
 
     # Edge is original minus eroded, interior is eroded
     edge_mask = mask & ~eroded_mask
@@ -448,9 +2008,284 @@ def extract_edge_and_interior(mask: np.ndarray, edge_thickness: int) -> Tuple[np
     return edge_mask, interior_mask
 
 
-def greedy_rectangle_decomposition(mask: np.ndarray) -> List[Tuple[int, int, int, int]]:
+def compute_down_runs(mask: np.ndarray) -> np.ndarray:
     """
-    Decompose a binary mask into rectangles using a greedy algorithm.
+    Compute per-column run heights of a binary mask.
+
+    Each cell holds the number of consecutive True cells starting at that cell
+    and going down (towards increasing row index), so 0 marks a False cell.
+
+    Args:
+        mask: 2D boolean array where True = inside shape
+
+    Returns:
+        2D int32 array of the same shape with the downward run heights
+    """
+    rows, cols = mask.shape
+    down = np.zeros((rows, cols), dtype=np.int32)
+    below = np.zeros(cols, dtype=np.int32)
+
+    # Walk rows bottom-up: a True cell extends the run of the cell below it
+    for row in range(rows - 1, -1, -1):
+        below = np.where(mask[row], below + 1, 0).astype(np.int32)
+        down[row] = below
+
+    return down
+
+
+def histogram_rectangle_decomposition(mask: np.ndarray) -> List[Tuple[int, int, int, int]]:
+    """
+    Decompose a binary mask into rectangles using per-column run heights.
+
+    Produces exactly the same rectangles as the cell-by-cell scan engine, but
+    the height of every candidate width is read from a running minimum over the
+    per-column run heights instead of re-checking every row. Placing a
+    rectangle only zeroes the run heights of the cells it covers, because runs
+    count downwards and rectangles always start on the row being scanned.
+
+    Args:
+        mask: 2D boolean array where True = inside shape
+
+    Returns:
+        List of rectangles as (x, y, width, height) tuples
+    """
+    rectangles = []
+    rows, cols = mask.shape
+    if rows == 0 or cols == 0:
+        return rectangles
+
+    down = compute_down_runs(mask)
+
+    for row in range(rows):
+        row_runs = down[row]
+        filled = row_runs > 0
+        if not filled.any():
+            continue
+
+        # Start and end columns of the horizontal runs in this row. Rectangles
+        # placed while scanning this row only clear cells left of the next
+        # candidate, so the run ends stay valid for the whole row.
+        edges = np.diff(np.concatenate(([False], filled, [False])).astype(np.int8))
+        run_starts = np.flatnonzero(edges == 1)
+        run_ends = np.flatnonzero(edges == -1)
+
+        for run_start, run_end in zip(run_starts.tolist(), run_ends.tolist()):
+            col = run_start
+            while col < run_end:
+                # Height available for every width is the running minimum of
+                # the column run heights; the first maximum area wins ties,
+                # matching the scan engine's preference for narrower shapes
+                heights = np.minimum.accumulate(row_runs[col:run_end])
+                areas = heights * np.arange(1, run_end - col + 1)
+                best = int(np.argmax(areas))
+                width = best + 1
+                height = int(heights[best])
+
+                rectangles.append((col, row, width, height))
+
+                # Mark these cells as used
+                down[row:row + height, col:col + width] = 0
+                col += width
+
+    return rectangles
+
+
+def weighted_rectangle_decomposition(mask: np.ndarray, col_widths: np.ndarray, row_heights: np.ndarray) -> List[Tuple[int, int, int, int]]:
+    """
+    Greedy rectangle decomposition of a grid whose cells have different sizes.
+
+    Works like histogram_rectangle_decomposition(), but rectangle areas are
+    measured with the real column widths and row heights. On a compressed grid
+    this picks exactly the rectangles the plain greedy would pick on the
+    uncompressed raster.
+
+    Args:
+        mask: 2D boolean array where True = inside shape
+        col_widths: Width of every grid column
+        row_heights: Height of every grid row
+
+    Returns:
+        List of rectangles as (col, row, col_count, row_count) tuples in grid cells
+    """
+    rectangles = []
+    rows, cols = mask.shape
+    if rows == 0 or cols == 0:
+        return rectangles
+
+    down = compute_down_runs(mask)
+    col_edges = np.concatenate(([0], np.cumsum(col_widths, dtype=np.int64)))
+    row_edges = np.concatenate(([0], np.cumsum(row_heights, dtype=np.int64)))
+
+    for row in range(rows):
+        row_runs = down[row]
+        filled = row_runs > 0
+        if not filled.any():
+            continue
+
+        edges = np.diff(np.concatenate(([False], filled, [False])).astype(np.int8))
+        run_starts = np.flatnonzero(edges == 1)
+        run_ends = np.flatnonzero(edges == -1)
+
+        for run_start, run_end in zip(run_starts.tolist(), run_ends.tolist()):
+            col = run_start
+            while col < run_end:
+                counts = np.minimum.accumulate(row_runs[col:run_end])
+                heights = row_edges[row + counts] - row_edges[row]
+                widths = col_edges[col + 1:run_end + 1] - col_edges[col]
+                best = int(np.argmax(widths * heights))
+                width = best + 1
+                height = int(counts[best])
+
+                rectangles.append((col, row, width, height))
+
+                # Mark these cells as used
+                down[row:row + height, col:col + width] = 0
+                col += width
+
+    return rectangles
+
+
+def encode_mask_runs(mask: np.ndarray) -> List[Tuple[List[int], List[int]]]:
+    """
+    Run-length encode a binary mask row by row.
+
+    Args:
+        mask: 2D boolean array where True = inside shape
+
+    Returns:
+        One (starts, ends) pair per row. Each pair holds sorted column lists
+        describing the half-open runs [start, end) of True cells in that row.
+    """
+    rows, cols = mask.shape
+    runs = [([], []) for _ in range(rows)]
+    if rows == 0 or cols == 0:
+        return runs
+
+    for chunk_start in range(0, rows, RLE_CHUNK_ROWS):
+        chunk = np.asarray(mask[chunk_start:chunk_start + RLE_CHUNK_ROWS], dtype=bool)
+        chunk_rows = chunk.shape[0]
+
+        # Every value change along a row is a run boundary. Runs alternate, so
+        # within a row the even boundaries are starts and the odd ones ends.
+        padded = np.zeros((chunk_rows, cols + 2), dtype=bool)
+        padded[:, 1:-1] = chunk
+        change_rows, change_cols = np.nonzero(padded[:, 1:] != padded[:, :-1])
+        if change_rows.size == 0:
+            continue
+
+        # np.nonzero returns positions in row-major order, so each row's
+        # boundaries are a contiguous, already sorted slice
+        bounds = np.searchsorted(change_rows, np.arange(chunk_rows + 1)).tolist()
+        change_cols = change_cols.tolist()
+        for row in range(chunk_rows):
+            lo, hi = bounds[row], bounds[row + 1]
+            if lo != hi:
+                runs[chunk_start + row] = (change_cols[lo:hi:2], change_cols[lo + 1:hi:2])
+
+    return runs
+
+
+def decompose_runs(runs: List[Tuple[List[int], List[int]]]) -> List[Tuple[int, int, int, int]]:
+    """
+    Greedy rectangle decomposition working directly on row runs.
+
+    Produces exactly the same rectangles as the cell-by-cell scan engine.
+    Consecutive rows with identical runs are first grouped into bands. The
+    first uncovered cell is always the start of the first run of the current
+    band, and the height available for each width is found by walking down the
+    bands while the run containing the start column stays open. Every height
+    found that way ends on a band boundary, so placing a rectangle edits whole
+    bands and never has to split one. Only run boundaries are touched, so the
+    cost follows the number of runs and bands rather than the mask area.
+
+    Args:
+        runs: Row runs as returned by encode_mask_runs()
+
+    Returns:
+        List of rectangles as (x, y, width, height) tuples
+    """
+    rectangles = []
+
+    # Group identical consecutive rows into [first_row, row_count, starts, ends]
+    bands = []
+    for row, (starts, ends) in enumerate(runs):
+        if bands and bands[-1][2] == starts and bands[-1][3] == ends:
+            bands[-1][1] += 1
+        else:
+            bands.append([row, 1, list(starts), list(ends)])
+
+    for band_index, (row, row_count, starts, ends) in enumerate(bands):
+        while starts:
+            col = starts[0]
+
+            # Walk down while the start column stays covered. Every time the
+            # common run end shrinks, the previous end closes a (width, height)
+            # level; only the widest width of each level can be a best area.
+            levels = []
+            common_end = ends[0]
+            height = row_count
+            last_band = band_index
+            run_indices = [0]
+            for below_index in range(band_index + 1, len(bands)):
+                below_band = bands[below_index]
+                below_ends = below_band[3]
+                idx = bisect.bisect_right(below_band[2], col) - 1
+                if idx < 0 or below_ends[idx] <= col:
+                    break
+                if below_ends[idx] < common_end:
+                    levels.append((common_end - col, height, last_band))
+                    common_end = below_ends[idx]
+                run_indices.append(idx)
+                height += below_band[1]
+                last_band = below_index
+            levels.append((common_end - col, height, last_band))
+
+            # Largest area wins; on ties the narrowest rectangle wins, matching
+            # the scan engine's preference for the first width reaching it
+            width, height, last_band = max(levels, key=lambda level: (level[0] * level[1], -level[0]))
+            rectangles.append((col, row, width, height))
+
+            # Mark these cells as used by cutting [col, col + width) out of the
+            # run containing it in every covered band
+            end_col = col + width
+            for used_index in range(band_index, last_band + 1):
+                used_band = bands[used_index]
+                used_starts, used_ends = used_band[2], used_band[3]
+                idx = run_indices[used_index - band_index]
+                run_end = used_ends[idx]
+                if used_starts[idx] < col:
+                    used_ends[idx] = col
+                    if end_col < run_end:
+                        used_starts.insert(idx + 1, end_col)
+                        used_ends.insert(idx + 1, run_end)
+                elif end_col < run_end:
+                    used_starts[idx] = end_col
+                else:
+                    del used_starts[idx]
+                    del used_ends[idx]
+
+    return rectangles
+
+
+def rle_rectangle_decomposition(mask: np.ndarray) -> List[Tuple[int, int, int, int]]:
+    """
+    Decompose a binary mask into rectangles using run-length encoded rows.
+
+    Args:
+        mask: 2D boolean array where True = inside shape
+
+    Returns:
+        List of rectangles as (x, y, width, height) tuples
+    """
+    return decompose_runs(encode_mask_runs(mask))
+
+
+def scan_rectangle_decomposition(mask: np.ndarray) -> List[Tuple[int, int, int, int]]:
+    """
+    Decompose a binary mask into rectangles using a cell-by-cell greedy scan.
+
+    This is the original engine: it visits every cell and re-measures the
+    largest rectangle with find_largest_rectangle(). Kept for A/B timing.
 
     Args:
         mask: 2D boolean array where True = inside shape
@@ -481,387 +2316,3278 @@ def greedy_rectangle_decomposition(mask: np.ndarray) -> List[Tuple[int, int, int
     return rectangles
 
 
-def hex_to_hsl(hex_color: str) -> Tuple[float, float, float]:
+def greedy_rectangle_decomposition(mask: Union[np.ndarray, 'PackedMask'], engine: str = DEFAULT_DECOMPOSITION_ENGINE) -> List[Tuple[int, int, int, int]]:
     """
-    Convert hex color to HSL.
+    Decompose a binary mask into rectangles using a greedy algorithm.
+
+    The mask is scanned top-left to bottom-right and at each uncovered cell the
+    largest rectangle starting there is placed.
+
+    A PackedMask is always decomposed from its row runs, since every engine
+    returns the same rectangles and the runs never need the unpacked mask.
 
     Args:
-        hex_color: Hex color string (e.g., "#EAC645")
+        mask: 2D boolean array or PackedMask where True = inside shape
+        engine: Decomposition engine, one of DECOMPOSITION_ENGINES
 
     Returns:
-        Tuple of (hue, saturation, lightness) where hue is 0-360, s and l are 0-1
+        List of rectangles as (x, y, width, height) tuples
+
+    Raises:
+        ValueError: If engine is not a known decomposition engine
     """
-    hex_color = hex_color.lstrip('#')
-    r, g, b = tuple(int(hex_color[i:i+2], 16) / 255.0 for i in (0, 2, 4))
-    h, l, s = colorsys.rgb_to_hls(r, g, b)
-    return (h * 360, s, l)
+    if isinstance(mask, PackedMask) and engine in DECOMPOSITION_ENGINES:
+        return decompose_runs(mask.runs())
+    if engine == 'rle':
+        return rle_rectangle_decomposition(mask)
+    if engine == 'histogram':
+        return histogram_rectangle_decomposition(mask)
+    if engine == 'scan':
+        return scan_rectangle_decomposition(mask)
+    raise ValueError(f"Unknown decomposition engine: {engine} (expected one of: {', '.join(DECOMPOSITION_ENGINES)})")
+
+
+def find_good_chords(filled: np.ndarray) -> List[Tuple[int, int, int]]:
+    """
+    Find the chords joining two facing concave vertices along horizontal grid lines.
 
+    Grid line i runs between cell rows i - 1 and i. An edge of that line is
+    interior when the cells on both sides are filled; every maximal run of
+    interior edges ends at points that are not interior, and the run is a
+    chord when both of those points are concave (exactly 3 of their 4
+    surrounding cells filled).
 
-def hsl_to_hex(h: float, s: float, l: float) -> str:
+    Args:
+        filled: 2D boolean array of the region
+
+    Returns:
+        List of (line, start, end) chords from grid point start to grid point end
     """
-    Convert HSL to hex color.
+    rows, cols = filled.shape
+    chords = []
+    if rows < 2 or cols < 2:
+        return chords
+
+    interior = filled[:-1] & filled[1:]
+    padded = np.zeros((rows - 1, cols + 2), dtype=np.int8)
+    padded[:, 1:-1] = interior
+    steps = np.diff(padded, axis=1)
+    start_lines, start_points = np.nonzero(steps == 1)
+    _, end_points = np.nonzero(steps == -1)
+
+    for line_index, start, end in zip(start_lines.tolist(), start_points.tolist(), end_points.tolist()):
+        # A run ending on the array border ends on a convex boundary point
+        if start == 0 or end == cols:
+            continue
+        # Concave ends have exactly one filled cell beyond the run
+        if filled[line_index, start - 1] != filled[line_index + 1, start - 1] and \
+                filled[line_index, end] != filled[line_index + 1, end]:
+            chords.append((line_index + 1, start, end))
+
+    return chords
+
+
+def maximum_independent_chords(horizontal: List[Tuple[int, int, int]], vertical: List[Tuple[int, int, int]]) -> Tuple[List[int], List[int]]:
+    """
+    Select a maximum set of pairwise non-intersecting chords.
+
+    Horizontal and vertical chords form a bipartite intersection graph (chords
+    sharing an endpoint intersect too). A maximum matching is found with
+    Hopcroft-Karp and turned into a maximum independent set via Koenig's
+    theorem.
 
     Args:
-        h: Hue (0-360)
-        s: Saturation (0-1)
-        l: Lightness (0-1)
+        horizontal: Horizontal chords as (line, start, end)
+        vertical: Vertical chords as (line, start, end)
 
     Returns:
-        Hex color string (e.g., "#EAC645")
+        Tuple of (horizontal indices, vertical indices) of the selected chords
     """
-    r, g, b = colorsys.hls_to_rgb(h / 360.0, l, s)
-    return f"#{int(r * 255):02X}{int(g * 255):02X}{int(b * 255):02X}"
+    # Intersection graph: horizontal chord (y, x0, x1) meets vertical chord
+    # (x, y0, y1) when x0 <= x <= x1 and y0 <= y <= y1
+    horizontal_by_line = sorted(range(len(horizontal)), key=lambda k: horizontal[k][0])
+    horizontal_lines = [horizontal[k][0] for k in horizontal_by_line]
+    adjacency = [[] for _ in horizontal]
+    for v_index, (x, y0, y1) in enumerate(vertical):
+        lo = bisect.bisect_left(horizontal_lines, y0)
+        hi = bisect.bisect_right(horizontal_lines, y1)
+        for k in horizontal_by_line[lo:hi]:
+            _, x0, x1 = horizontal[k]
+            if x0 <= x <= x1:
+                adjacency[k].append(v_index)
+
+    match_h = [-1] * len(horizontal)
+    match_v = [-1] * len(vertical)
+
+    # Hopcroft-Karp: BFS layers from free horizontal chords, then augment
+    # along shortest alternating paths with an iterative DFS
+    while True:
+        layer = [-1] * len(horizontal)
+        queue = [h for h in range(len(horizontal)) if match_h[h] == -1]
+        for h in queue:
+            layer[h] = 0
+        found = False
+        head = 0
+        while head < len(queue):
+            h = queue[head]
+            head += 1
+            for v in adjacency[h]:
+                partner = match_v[v]
+                if partner == -1:
+                    found = True
+                elif layer[partner] == -1:
+                    layer[partner] = layer[h] + 1
+                    queue.append(partner)
+        if not found:
+            break
+
+        next_edge = [0] * len(horizontal)
+        for root in range(len(horizontal)):
+            if match_h[root] != -1:
+                continue
+            path = [root]
+            while path:
+                h = path[-1]
+                advanced = False
+                while next_edge[h] < len(adjacency[h]):
+                    v = adjacency[h][next_edge[h]]
+                    next_edge[h] += 1
+                    partner = match_v[v]
+                    if partner == -1:
+                        # Augment along the path
+                        for depth in range(len(path) - 1, -1, -1):
+                            path_h = path[depth]
+                            previous_v = match_h[path_h]
+                            match_h[path_h] = v
+                            match_v[v] = path_h
+                            v = previous_v
+                        path = []
+                        advanced = True
+                        break
+                    if layer[partner] == layer[h] + 1:
+                        path.append(partner)
+                        advanced = True
+                        break
+                if not advanced:
+                    layer[h] = -1
+                    path.pop()
+
+    # Koenig: alternating reachability from free horizontal chords
+    reached_h = [False] * len(horizontal)
+    reached_v = [False] * len(vertical)
+    stack = [h for h in range(len(horizontal)) if match_h[h] == -1]
+    for h in stack:
+        reached_h[h] = True
+    while stack:
+        h = stack.pop()
+        for v in adjacency[h]:
+            if not reached_v[v]:
+                reached_v[v] = True
+                partner = match_v[v]
+                if partner != -1 and not reached_h[partner]:
+                    reached_h[partner] = True
+                    stack.append(partner)
+
+    # The complement of the vertex cover (unreached H, reached V) is independent
+    selected_h = [h for h in range(len(horizontal)) if reached_h[h]]
+    selected_v = [v for v in range(len(vertical)) if not reached_v[v]]
+    return selected_h, selected_v
+
+
+def minimum_rectangle_partition(mask: np.ndarray) -> List[Tuple[int, int, int, int]]:
+    """
+    Partition a binary mask into the minimum number of rectangles.
 
+    Classical algorithm for rectilinear polygons with holes: draw a maximum set
+    of non-intersecting chords between facing concave vertices, then cut from
+    every concave vertex left unresolved straight down or up until reaching
+    the boundary or a drawn cut. The faces left are rectangles.
 
-def generate_random_color(base_color: str = "#EAC645") -> str:
+    Args:
+        mask: 2D boolean array where True = inside shape
+
+    Returns:
+        List of rectangles as (x, y, width, height) tuples
     """
-    Generate a random color with the same saturation and lightness as base_color,
-    but with a random hue.
+    filled = np.asarray(mask, dtype=bool)
+    rows, cols = filled.shape
+
+    horizontal = find_good_chords(filled)
+    vertical = find_good_chords(filled.T)
+    selected_h, selected_v = maximum_independent_chords(horizontal, vertical)
+
+    # Cut edges: h_cut[i, c] separates cells (i - 1, c) and (i, c);
+    # v_cut[r, j] separates cells (r, j - 1) and (r, j)
+    h_cut = np.zeros((rows + 1, cols), dtype=bool)
+    v_cut = np.zeros((rows, cols + 1), dtype=bool)
+    resolved = set()
+    for k in selected_h:
+        line, start, end = horizontal[k]
+        h_cut[line, start:end] = True
+        resolved.add((line, start))
+        resolved.add((line, end))
+    for k in selected_v:
+        line, start, end = vertical[k]
+        v_cut[start:end, line] = True
+        resolved.add((start, line))
+        resolved.add((end, line))
+
+    # Concave vertices: grid points with exactly 3 of their 4 cells filled
+    padded = np.pad(filled, 1).astype(np.int8)
+    around = padded[:-1, :-1] + padded[:-1, 1:] + padded[1:, :-1] + padded[1:, 1:]
+    for y, x in zip(*np.nonzero(around == 3)):
+        y, x = int(y), int(x)
+        if (y, x) in resolved:
+            continue
+        # Cut vertically into the region: downwards if both cells below are filled
+        step = 1 if (y < rows and filled[y, x - 1] and filled[y, x]) else -1
+        while True:
+            cell_row = y if step == 1 else y - 1
+            if not (0 <= cell_row < rows and filled[cell_row, x - 1] and filled[cell_row, x]):
+                break
+            v_cut[cell_row, x] = True
+            y += step
+            # Stop on a horizontal cut crossing or touching this point
+            if h_cut[y, x - 1] or h_cut[y, x]:
+                break
+
+    # Faces are rectangles now: read them off in top-left scan order
+    rectangles = []
+    used = np.zeros_like(filled)
+    for row, col in zip(*np.nonzero(filled)):
+        row, col = int(row), int(col)
+        if used[row, col]:
+            continue
+        width = 1
+        while col + width < cols and filled[row, col + width] and not used[row, col + width] and not v_cut[row, col + width]:
+            width += 1
+        height = 1
+        while row + height < rows and not h_cut[row + height, col:col + width].any() and \
+                filled[row + height, col:col + width].all() and not used[row + height, col:col + width].any() and \
+                not v_cut[row + height, col + 1:col + width].any():
+            height += 1
+        used[row:row + height, col:col + width] = True
+        rectangles.append((col, row, width, height))
+
+    return rectangles
+
+
+def load_render_cost_model(model_path: Optional[str] = None) -> Dict[str, float]:
+    """
+    Load render cost coefficients from a JSON calibration file.
+
+    The file holds an object with any of the keys of DEFAULT_RENDER_COST_MODEL,
+    e.g. {"plate": 1.2, "stud": 0.04}. Missing keys keep their default value.
 
     Args:
-        base_color: Base hex color to derive saturation and lightness from
+        model_path: Path to the calibration file, or None for the defaults
 
     Returns:
-        Random hex color string
+        Dictionary mapping cost term names to coefficients
+
+    Raises:
+        FileNotFoundError: If the calibration file doesn't exist
+        ValueError: If the file contains unknown keys or non-numeric values
     """
-    _, s, l = hex_to_hsl(base_color)
-    random_hue = random.uniform(0, 360)
-    return hsl_to_hex(random_hue, s, l)
+    model = dict(DEFAULT_RENDER_COST_MODEL)
+    if model_path is None:
+        return model
 
+    if not os.path.exists(model_path):
+        raise FileNotFoundError(f"Cost model file not found: {model_path}")
 
-def hex_to_openscad_rgb(hex_color: str) -> str:
+    with open(model_path, 'r') as f:
+        try:
+            values = json.load(f)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Cost model file is not valid JSON: {e}")
+
+    if not isinstance(values, dict):
+        raise ValueError("Cost model file must contain a JSON object")
+    unknown = [key for key in values if key not in model]
+    if unknown:
+        raise ValueError(f"Cost model file has unknown terms: {', '.join(unknown)} (expected: {', '.join(model)})")
+    for key, value in values.items():
+        if not isinstance(value, (int, float)) or isinstance(value, bool):
+            raise ValueError(f"Cost model term '{key}' must be a number")
+        model[key] = float(value)
+
+    return model
+
+
+def count_plate_seams(rectangles: List[Tuple[int, int, int, int]]) -> int:
     """
-    Convert hex color to OpenSCAD RGB format.
+    Count the plate-to-plate seam length of a set of non-overlapping rectangles.
+
+    Every rectangle edge is either on the outline of their union or shared
+    with a neighbour, so seams are half of the perimeters left after removing
+    the outline.
 
     Args:
-        hex_color: Hex color string (e.g., "#EAC645")
+        rectangles: List of (x, y, width, height) tuples in brick units
 
     Returns:
-        OpenSCAD color format string (e.g., "[0.918, 0.776, 0.271]")
+        Seam length in brick units
     """
-    hex_color = hex_color.lstrip('#')
-    r, g, b = tuple(int(hex_color[i:i+2], 16) / 255.0 for i in (0, 2, 4))
-    return f"[{r:.3f}, {g:.3f}, {b:.3f}]"
+    if not rectangles:
+        return 0
 
+    cols = max(x + w for x, _, w, _ in rectangles)
+    rows = max(y + h for _, y, _, h in rectangles)
+    covered = np.zeros((rows + 2, cols + 2), dtype=bool)
+    for x, y, w, h in rectangles:
+        covered[y + 1:y + 1 + h, x + 1:x + 1 + w] = True
 
-def generate_openscad_script(rectangles: List[Tuple[int, int, int, int]],
-                            output_path: str = "irregular_baseplate.scad",
-                            debug: bool = False,
-                            image_height: int = 0,
-                            interior_rectangles: Optional[List[Tuple[int, int, int, int]]] = None,
-                            border_rectangles: Optional[List[Tuple[float, float, float, float]]] = None,
-                            border_rectangles_top: Optional[List[Tuple[float, float, float, float]]] = None,
-                            border_thickness_mm: float = 0.0,
-                            border_height_adjust_mm: float = 0.0,
-                            unit_size: float = 8.0,
-                            config_path: str = "machineblocks/config/config-default.scad",
-                            is_frame_mode: bool = False,
-                            config: Optional[Dict[str, float]] = None,
-                            center: bool = False,
-                            image_width: int = 0) -> None:
+    outline = int(np.count_nonzero(covered[1:] != covered[:-1]) + np.count_nonzero(covered[:, 1:] != covered[:, :-1]))
+    perimeters = sum(2 * (w + h) for _, _, w, h in rectangles)
+    return (perimeters - outline) // 2
+
+
+def predict_render_cost(rectangles: List[Tuple[int, int, int, int]], cube_count: int = 0, model: Optional[Dict[str, float]] = None) -> Dict[str, float]:
     """
-    Generate an OpenSCAD script that renders the baseplates.
+    Predict the OpenSCAD render cost of a set of baseplates and cubes.
 
-    Coordinate System Note:
-    - Image coordinates: Y=0 at top, Y increases downward
-    - OpenSCAD coordinates: Y=0 at bottom, Y increases upward
-    - This function flips the Y-axis: translate_y = (image_height - y - height) * unit_size
-    - This ensures the rendered model matches the input image orientation
+    Args:
+        rectangles: Baseplate rectangles as (x, y, width, height) in brick units
+        cube_count: Number of cube() calls (interior, border and frame cubes)
+        model: Cost coefficients, see load_render_cost_model()
+
+    Returns:
+        Dictionary with the cost of every term and the 'total'
+    """
+    if model is None:
+        model = DEFAULT_RENDER_COST_MODEL
+
+    cost = {
+        'plate': model['plate'] * len(rectangles),
+        'stud': model['stud'] * sum(w * h for _, _, w, h in rectangles),
+        'seam': model['seam'] * count_plate_seams(rectangles),
+        'cube': model['cube'] * cube_count,
+    }
+    cost['total'] = sum(cost.values())
+    return cost
+
+
+def predict_stacked_render_cost(rectangles: List[Tuple[int, int, int, int]],
+                                level_rectangles: Optional[List[List[Tuple[int, int, int, int]]]],
+                                cube_count: int = 0, model: Optional[Dict[str, float]] = None) -> Dict[str, float]:
+    """
+    Predict the render cost of baseplates with stacked levels on top of them.
+
+    Seams only join plates of the same level, so every level is predicted on
+    its own and the terms are added up.
 
     Args:
-        rectangles: List of rectangles as (x, y, width, height) tuples (in image coordinates) for baseplates
-        output_path: Path to save the generated .scad file
-        debug: If True, use random colors for each baseplate
-        image_height: Height of the source image in pixels (for Y-axis flipping)
-        interior_rectangles: Optional list of rectangles for interior cubes (if using --edge mode)
-        border_rectangles: Optional list of rectangles for border cubes as (x_mm, y_mm, width_mm, height_mm) in millimeters
-        border_thickness_mm: Thickness of border in mm
-        border_height_adjust_mm: Height adjustment for border in mm
-        unit_size: Size of one brick unit in mm (calculated from config)
-        config_path: Path to OpenSCAD config file to include
-        config: Optional parsed config dictionary to check for optional variables
-        center: If True, center the entire model around X and Y axes
-        image_width: Width of the source image in pixels (for centering calculation)
+        rectangles: Baseplate rectangles of the bottom level in brick units
+        level_rectangles: Baseplate rectangles of the stacked levels (or None)
+        cube_count: Number of cube() calls (interior, border and frame cubes)
+        model: Cost coefficients, see load_render_cost_model()
+
+    Returns:
+        Dictionary with the cost of every term and the 'total'
+    """
+    cost = predict_render_cost(rectangles, cube_count, model)
+    for level in level_rectangles or []:
+        level_cost = predict_render_cost(level, 0, model)
+        cost = {term: value + level_cost[term] for term, value in cost.items()}
+    return cost
+
+
+def cost_greedy_decomposition(mask: np.ndarray, model: Optional[Dict[str, float]] = None) -> List[Tuple[int, int, int, int]]:
+    """
+    Greedy decomposition that picks the cheapest rectangle per covered cell.
+
+    Scans like the greedy decomposition, but at each uncovered cell it places
+    the rectangle with the lowest predicted cost per brick unit instead of
+    the largest one. A rectangle costs one plate plus its share of seams,
+    which is half its perimeter.
+
+    Args:
+        mask: 2D boolean array where True = inside shape
+        model: Cost coefficients, see load_render_cost_model()
+
+    Returns:
+        List of rectangles as (x, y, width, height) tuples
+    """
+    if model is None:
+        model = DEFAULT_RENDER_COST_MODEL
+
+    rectangles = []
+    rows, cols = mask.shape
+    if rows == 0 or cols == 0:
+        return rectangles
+
+    down = compute_down_runs(mask)
+
+    for row in range(rows):
+        row_runs = down[row]
+        filled = row_runs > 0
+        if not filled.any():
+            continue
+
+        edges = np.diff(np.concatenate(([False], filled, [False])).astype(np.int8))
+        run_starts = np.flatnonzero(edges == 1)
+        run_ends = np.flatnonzero(edges == -1)
+
+        for run_start, run_end in zip(run_starts.tolist(), run_ends.tolist()):
+            col = run_start
+            while col < run_end:
+                # Try every width at full height and at every taller level
+                heights = np.minimum.accumulate(row_runs[col:run_end])
+                widths = np.arange(1, run_end - col + 1)
+                per_cell = (model['plate'] + model['seam'] * (widths + heights)) / (widths * heights)
+                best = int(np.argmin(per_cell))
+                width = best + 1
+                height = int(heights[best])
+
+                rectangles.append((col, row, width, height))
+
+                # Mark these cells as used
+                down[row:row + height, col:col + width] = 0
+                col += width
+
+    return rectangles
+
+
+def decompose_mask(mask: Union[np.ndarray, 'PackedMask'], strategy: str = DEFAULT_DECOMPOSITION_STRATEGY, engine: str = DEFAULT_DECOMPOSITION_ENGINE, max_component_cells: int = DEFAULT_OPTIMAL_MAX_CELLS, cost_model: Optional[Dict[str, float]] = None,
+                   executor: Optional[Executor] = None, tiles: int = DEFAULT_TILES) -> List[Tuple[int, int, int, int]]:
+    """
+    Decompose a binary mask into rectangles with the given strategy.
+
+    Args:
+        mask: 2D boolean array where True = inside shape, or a PackedMask
+              (greedy strategy only)
+        strategy: Decomposition strategy, one of DECOMPOSITION_STRATEGIES
+        engine: Greedy decomposition engine, one of DECOMPOSITION_ENGINES
+        max_component_cells: With the 'optimal' strategy, connected components
+                             with more cells than this are decomposed greedily
+        cost_model: Cost coefficients used by the 'cost' strategy
+        executor: Optional executor the connected parts of the mask are
+                  decomposed on (see split_components()). The 'cost' strategy
+                  compares candidates over the whole mask, and packed masks are
+                  decomposed from their row runs; both always run here.
+        tiles: With more than 1, sweep greedy decompositions in this many
+               strips of rows (on the executor if given) and stitch them
+               together (see tiled_greedy_decomposition()); with the 'optimal'
+               strategy this applies to components decomposed greedily. The
+               result is the same as without tiles.
+
+    Returns:
+        List of rectangles as (x, y, width, height) tuples
+
+    Raises:
+        ValueError: If strategy is not a known decomposition strategy
+    """
+    if strategy in ('greedy', 'optimal') and isinstance(mask, np.ndarray):
+        if strategy == 'greedy' and tiles > 1:
+            return tiled_greedy_decomposition(mask, tiles, executor)
+        worker = functools.partial(decompose_component_batch, strategy=strategy, engine=engine,
+                                   max_component_cells=max_component_cells, cost_model=cost_model)
+        batches = split_components(mask) if executor is not None else []
+        if len(batches) > 1:
+            return run_component_batches(executor, worker, batches)
+    if strategy == 'greedy':
+        return greedy_rectangle_decomposition(mask, engine)
+    if strategy == 'cost':
+        # Pick the candidate with the lowest predicted render cost; on ties
+        # the earlier (simpler) candidate wins. The stud term only depends on
+        # the number of covered cells, which every candidate shares, so only
+        # the plate and seam terms are compared.
+        candidates = [
+            greedy_rectangle_decomposition(mask, engine),
+            decompose_mask(mask, 'optimal', engine, max_component_cells),
+            cost_greedy_decomposition(mask, cost_model),
+        ]
+
+        def layout_cost(rectangles):
+            cost = predict_render_cost(rectangles, model=cost_model)
+            return cost['plate'] + cost['seam']
+
+        return min(candidates, key=layout_cost)
+    if strategy != 'optimal':
+        raise ValueError(f"Unknown decomposition strategy: {strategy} (expected one of: {', '.join(DECOMPOSITION_STRATEGIES)})")
+
+    # Rectangles never cross between 4-connected components, so each one is
+    # partitioned on its own bounding box
+    labels, count = ndimage.label(mask)
+    rectangles = []
+    for label, bbox in enumerate(ndimage.find_objects(labels), start=1):
+        component = labels[bbox] == label
+        if np.count_nonzero(component) > max_component_cells:
+            component_rectangles = decompose_mask(component, 'greedy', engine, executor=executor, tiles=tiles)
+        else:
+            component_rectangles = minimum_rectangle_partition(component)
+        row_offset, col_offset = bbox[0].start, bbox[1].start
+        rectangles.extend((x + col_offset, y + row_offset, w, h) for (x, y, w, h) in component_rectangles)
+
+    # Keep the top-left scan order of the greedy strategy
+    rectangles.sort(key=lambda r: (r[1], r[0]))
+    return rectangles
+
+
+def update_mask_decomposition(previous_mask: np.ndarray, previous_rectangles: List[Tuple[int, int, int, int]], mask: np.ndarray,
+                              strategy: str = DEFAULT_DECOMPOSITION_STRATEGY, engine: str = DEFAULT_DECOMPOSITION_ENGINE,
+                              max_component_cells: int = DEFAULT_OPTIMAL_MAX_CELLS, cost_model: Optional[Dict[str, float]] = None,
+                              neighbourhood: int = INCREMENTAL_NEIGHBOURHOOD) -> List[Tuple[int, int, int, int]]:
+    """
+    Re-decompose only the part of a mask around cells that changed since a previous run.
+
+    Previous rectangles touching a changed cell or its neighbourhood are
+    dropped; the cells they covered plus any newly filled cells are
+    decomposed again with the given strategy, everything else is kept. The
+    kept rectangles lie on unchanged filled cells, so together with the new
+    ones they still cover the mask exactly. Including the neighbourhood lets
+    the freed region merge with nearby cells into larger rectangles.
+
+    Args:
+        previous_mask: Mask the previous rectangles were computed for
+        previous_rectangles: Previous decomposition of previous_mask
+        mask: 2D boolean array where True = inside shape
+        strategy: Decomposition strategy, one of DECOMPOSITION_STRATEGIES
+        engine: Greedy decomposition engine, one of DECOMPOSITION_ENGINES
+        max_component_cells: See decompose_mask()
+        cost_model: Cost coefficients used by the 'cost' strategy
+        neighbourhood: Chessboard radius around changed cells whose
+                       rectangles are dropped as well
+
+    Returns:
+        List of rectangles as (x, y, width, height) tuples
+    """
+    if previous_mask.shape != mask.shape:
+        return decompose_mask(mask, strategy, engine, max_component_cells, cost_model)
+
+    changed = previous_mask != mask
+    if not changed.any():
+        return list(previous_rectangles)
+    dirty = dilate_chessboard(chessboard_distance_to(changed), neighbourhood, mask.shape)
+
+    # Summed-area table answers "does this rectangle touch a dirty cell" in O(1)
+    dirty_sums = np.zeros((mask.shape[0] + 1, mask.shape[1] + 1), dtype=np.int64)
+    dirty_sums[1:, 1:] = dirty.cumsum(axis=0).cumsum(axis=1)
+
+    kept = []
+    covered = np.zeros_like(mask, dtype=bool)
+    for (x, y, w, h) in previous_rectangles:
+        if dirty_sums[y + h, x + w] - dirty_sums[y, x + w] - dirty_sums[y + h, x] + dirty_sums[y, x] == 0:
+            kept.append((x, y, w, h))
+            covered[y:y + h, x:x + w] = True
+
+    rectangles = kept + decompose_mask(mask & ~covered, strategy, engine, max_component_cells, cost_model)
+    rectangles.sort(key=lambda r: (r[1], r[0]))
+    return rectangles
+
+
+def hex_to_hsl(hex_color: str) -> Tuple[float, float, float]:
+    """
+    Convert hex color to HSL.
+
+    Args:
+        hex_color: Hex color string (e.g., "#EAC645")
+
+    Returns:
+        Tuple of (hue, saturation, lightness) where hue is 0-360, s and l are 0-1
+    """
+    hex_color = hex_color.lstrip('#')
+    r, g, b = tuple(int(hex_color[i:i+2], 16) / 255.0 for i in (0, 2, 4))
+    h, l, s = colorsys.rgb_to_hls(r, g, b)
+    return (h * 360, s, l)
+
+
+def hsl_to_hex(h: float, s: float, l: float) -> str:
+    """
+    Convert HSL to hex color.
+
+    Args:
+        h: Hue (0-360)
+        s: Saturation (0-1)
+        l: Lightness (0-1)
+
+    Returns:
+        Hex color string (e.g., "#EAC645")
+    """
+    r, g, b = colorsys.hls_to_rgb(h / 360.0, l, s)
+    return f"#{int(r * 255):02X}{int(g * 255):02X}{int(b * 255):02X}"
+
+
+def generate_random_color(base_color: str = "#EAC645") -> str:
+    """
+    Generate a random color with the same saturation and lightness as base_color,
+    but with a random hue.
+
+    Args:
+        base_color: Base hex color to derive saturation and lightness from
+
+    Returns:
+        Random hex color string
+    """
+    _, s, l = hex_to_hsl(base_color)
+    random_hue = random.uniform(0, 360)
+    return hsl_to_hex(random_hue, s, l)
+
+
+def hex_to_openscad_rgb(hex_color: str) -> str:
+    """
+    Convert hex color to OpenSCAD RGB format.
+
+    Args:
+        hex_color: Hex color string (e.g., "#EAC645")
+
+    Returns:
+        OpenSCAD color format string (e.g., "[0.918, 0.776, 0.271]")
+    """
+    hex_color = hex_color.lstrip('#')
+    r, g, b = tuple(int(hex_color[i:i+2], 16) / 255.0 for i in (0, 2, 4))
+    return f"[{r:.3f}, {g:.3f}, {b:.3f}]"
+
+
+def new_section_stats() -> Dict[str, object]:
+    """
+    Create an empty statistics accumulator for one script section.
+
+    Returns:
+        Dictionary with 'count', 'area', 'sizes' (size label -> count) and
+        'loops' (traced outline loops)
+    """
+    return {'count': 0, 'area': 0, 'sizes': {}, 'loops': 0}
+
+
+def record_section_stats(stats: Optional[Dict[str, object]], width: float, height: float, size_key: str) -> None:
+    """
+    Count one emitted rectangle in a section statistics accumulator.
+
+    Args:
+        stats: Accumulator from new_section_stats(), or None to skip
+        width: Rectangle width
+        height: Rectangle height
+        size_key: Label the rectangle is counted under in the size histogram
+    """
+    if stats is None:
+        return
+    stats['count'] += 1
+    stats['area'] += width * height
+    stats['sizes'][size_key] = stats['sizes'].get(size_key, 0) + 1
+
+
+def machineblock_call_lines(size: str, config: Optional[Dict[str, float]], indent: str = "    ") -> Iterator[str]:
+    """
+    Emit the machineblock() call used for every baseplate.
+
+    Args:
+        size: OpenSCAD expression for the size parameter (e.g. "[4, 2, 1]")
+        config: Optional parsed config dictionary to check for optional variables
+        indent: Indentation of the call
+
+    Yields:
+        Script lines
+    """
+    yield f"{indent}machineblock("
+    yield f"{indent}    size = {size},"
+    for line in MACHINEBLOCK_ARGUMENT_LINES:
+        # Only include studHeight if it exists in the config
+        if line.startswith("studHeight") and not (config and 'studHeight' in config):
+            continue
+        yield f"{indent}    {line}"
+    yield f"{indent});"
+
+
+def placement_loop_lines(variable: str, placements: List[str], body: str) -> Iterator[str]:
+    """
+    Emit a for() loop applying one statement to every entry of a placement list.
+
+    Args:
+        variable: Loop variable name
+        placements: OpenSCAD vector literals, one per placement
+        body: Statement evaluated for every placement
+
+    Yields:
+        Script lines
+    """
+    yield f"for ({variable} = ["
+    for placement in placements[:-1]:
+        yield f"    {placement},"
+    yield f"    {placements[-1]}"
+    yield f"]) {body}"
+
+
+def baseplate_module_lines(config: Optional[Dict[str, float]] = None) -> Iterator[str]:
+    """
+    Emit the baseplate(size) module used by the compact baseplate section.
+
+    Args:
+        config: Optional parsed config dictionary to check for optional variables
+
+    Yields:
+        Script lines
+    """
+    yield "// Baseplate of the given [width, height] in brick units"
+    yield "module baseplate(size) {"
+    yield from machineblock_call_lines("[size[0], size[1], 1]", config)
+    yield "}"
+    yield ""
+
+
+def baseplate_script_lines(rectangles: List[Tuple[int, int, int, int]],
+                           image_height: int,
+                           unit_size: float,
+                           debug: bool = False,
+                           config: Optional[Dict[str, float]] = None,
+                           has_interior: bool = False,
+                           compact: bool = False,
+                           stats: Optional[Dict[str, object]] = None) -> Iterator[str]:
+    """
+    Emit the baseplate section of the OpenSCAD script.
+
+    In compact mode the plates are grouped by size and placed by one for()
+    loop per size, calling the baseplate() module from
+    baseplate_module_lines() instead of repeating the machineblock() call.
+
+    Args:
+        rectangles: List of rectangles as (x, y, width, height) tuples (in image coordinates)
+        image_height: Height of the source image in pixels (for Y-axis flipping)
+        unit_size: Size of one brick unit in mm
+        debug: If True, use random colors for each baseplate
+        config: Optional parsed config dictionary to check for optional variables
+        has_interior: True if the plates only form the edge of an --edge layout
+        compact: If True, emit placement loops instead of one call per plate
+        stats: Optional accumulator from new_section_stats(), filled while emitting
+
+    Yields:
+        Script lines
+    """
+    yield "// Edge baseplates" if has_interior else "// Generate all baseplates"
+
+    if compact:
+        # Group placements by size, keeping the order in which sizes first appear
+        placements = {}
+        for (x, y, width, height) in rectangles:
+            translate_x = x * unit_size
+            translate_y = (image_height - y - height) * unit_size
+            placement = f"{translate_x}, {translate_y}"
+            if debug:
+                placement += f", {hex_to_openscad_rgb(generate_random_color())}"
+            placements.setdefault((width, height), []).append(f"[{placement}]")
+            record_section_stats(stats, width, height, f"{width}x{height}")
+
+        for (width, height), size_placements in placements.items():
+            body = f"translate([p[0], p[1], 0]) baseplate([{width}, {height}]);"
+            if debug:
+                body = f"color(p[2]) {body}"
+            yield f"\n// {width}x{height} baseplates ({len(size_placements)})"
+            yield from placement_loop_lines("p", size_placements, body)
+        return
+
+    for i, (x, y, width, height) in enumerate(rectangles):
+        # Calculate the translation position
+        # Each unit in the grid corresponds to 8mm
+        # NOTE: Y-axis needs to be flipped because image Y=0 is at top, but OpenSCAD Y=0 is at bottom
+        translate_x = x * unit_size
+        translate_y = (image_height - y - height) * unit_size
+        record_section_stats(stats, width, height, f"{width}x{height}")
+
+        yield f"\n// Baseplate {i + 1}: {width}x{height} at position ({x}, {y})"
+
+        # Wrap with color() if in debug mode
+        if debug:
+            hex_color = generate_random_color()
+            openscad_color = hex_to_openscad_rgb(hex_color)
+            yield f"color({openscad_color}) {{"
+
+        yield f"translate([{translate_x}, {translate_y}, 0]) {{"
+        yield from machineblock_call_lines(f"[{width}, {height}, 1]", config)
+        yield "}"
+
+        # Close color() wrapper if in debug mode
+        if debug:
+            yield "}"
+
+
+def interior_script_lines(interior_rectangles: List[Tuple[int, int, int, int]],
+                          image_height: int,
+                          unit_size: float,
+                          debug: bool = False,
+                          compact: bool = False,
+                          stats: Optional[Dict[str, object]] = None) -> Iterator[str]:
+    """
+    Emit the interior cube section of the OpenSCAD script.
+
+    Args:
+        interior_rectangles: List of rectangles for interior cubes (in image coordinates)
+        image_height: Height of the source image in pixels (for Y-axis flipping)
+        unit_size: Size of one brick unit in mm
+        debug: If True, use random colors for each cube
+        compact: If True, emit one for() loop over a list of cubes
+        stats: Optional accumulator from new_section_stats(), filled while emitting
+
+    Yields:
+        Script lines
+    """
+    yield "\n// Interior fill (cubes)"
+
+    if compact:
+        cubes = []
+        for (x, y, width, height) in interior_rectangles:
+            translate_x = x * unit_size
+            translate_y = (image_height - y - height) * unit_size
+            cube = f"{translate_x}, {translate_y}, {width}, {height}"
+            if debug:
+                cube += f", {hex_to_openscad_rgb(generate_random_color())}"
+            cubes.append(f"[{cube}]")
+            record_section_stats(stats, width, height, f"{width}x{height}")
+
+        body = ("translate([c[0], c[1], 0]) cube([c[2] * unitGrid[0] * unitMbu * scale, "
+                "c[3] * unitGrid[0] * unitMbu * scale, 1 * unitGrid[1] * unitMbu * scale]);")
+        if debug:
+            body = f"color(c[4]) {body}"
+        yield from placement_loop_lines("c", cubes, body)
+        return
+
+    for i, (x, y, width, height) in enumerate(interior_rectangles):
+        # Calculate the translation position (same as baseplates)
+        translate_x = x * unit_size
+        translate_y = (image_height - y - height) * unit_size
+        record_section_stats(stats, width, height, f"{width}x{height}")
+
+        yield f"\n// Interior cube {i + 1}: {width}x{height} at position ({x}, {y})"
+
+        # Wrap with color() if in debug mode
+        if debug:
+            hex_color = generate_random_color()
+            openscad_color = hex_to_openscad_rgb(hex_color)
+            yield f"color({openscad_color}) {{"
+
+        yield f"translate([{translate_x}, {translate_y}, 0]) {{"
+        yield "    cube(["
+        yield f"        {width} * unitGrid[0] * unitMbu * scale,"
+        yield f"        {height} * unitGrid[0] * unitMbu * scale,"
+        yield "        1 * unitGrid[1] * unitMbu * scale"
+        yield "    ]);"
+        yield "}"
+
+        # Close color() wrapper if in debug mode
+        if debug:
+            yield "}"
+
+
+def border_script_lines(border_rectangles: List[Tuple[float, float, float, float]],
+                        image_height: int,
+                        unit_size: float,
+                        top_layer: bool,
+                        border_thickness_mm: float = 0.0,
+                        border_height_adjust_mm: float = 0.0,
+                        is_frame_mode: bool = False,
+                        two_layers: bool = False,
+                        debug: bool = False,
+                        compact: bool = False,
+                        stats: Optional[Dict[str, object]] = None,
+                        outline: bool = False) -> Iterator[str]:
+    """
+    Emit one layer of the border/frame cube section of the OpenSCAD script.
+
+    With outline set, the layer is traced into polygon loops (outer edges
+    and holes) and emitted as a single linear_extrude() instead of one
+    cube() per rectangle.
+
+    Args:
+        border_rectangles: Border/frame rectangles as (x_mm, y_mm, width_mm, height_mm) in millimeters
+        image_height: Height of the source image in pixels (for Y-axis flipping)
+        unit_size: Size of one brick unit in mm
+        top_layer: True for the inset top layer, False for the base layer
+        border_thickness_mm: Thickness of border in mm
+        border_height_adjust_mm: Height adjustment for border in mm
+        is_frame_mode: True for a frame, False for a border
+        two_layers: True if an inset top layer is stacked on the base layer
+        debug: If True, use random colors for each cube
+        compact: If True, emit one for() loop over a list of cubes
+        stats: Optional accumulator from new_section_stats(), filled while emitting
+        outline: If True, emit the layer as one extruded polygon
+
+    Yields:
+        Script lines
+    """
+    mode_label = "Frame" if is_frame_mode else "Border"
+
+    if top_layer:
+        yield f"\n// {mode_label} top layer (inset for clearance)"
+        layer_label = "top"
+        z = "(1 * unitGrid[1] * unitMbu * scale)"
+        height_expr = f"{border_height_adjust_mm}"
+        height_comment = "height adjustment"
+    else:
+        thickness_label = f"padding: {border_thickness_mm}mm" if is_frame_mode else f"thickness: {border_thickness_mm}mm"
+        yield f"\n// {mode_label} ({'outline' if outline else 'cubes'}) - positioned and sized in millimeters"
+        if two_layers:
+            yield f"// {mode_label} {thickness_label}, Two-layer design:"
+            yield f"//   Base layer: baseplate height (flush with baseplates)"
+            yield f"//   Top layer: {border_height_adjust_mm}mm tall (inset for clearance)"
+        else:
+            yield f"// {mode_label} {thickness_label}, Height adjustment: {border_height_adjust_mm}mm"
+        yield f"\n// {mode_label} base layer"
+        layer_label = "base"
+        z = "0"
+        if two_layers:
+            height_expr = "(1 * unitGrid[1] * unitMbu * scale)"
+            height_comment = "baseplate height without studs"
+        else:
+            height_expr = f"(1 * unitGrid[1] * unitMbu * scale) + {border_height_adjust_mm}"
+            height_comment = "baseplate height without studs + adjustment"
+
+    if outline:
+        for (_, _, width_mm, height_mm) in border_rectangles:
+            record_section_stats(stats, width_mm, height_mm, f"{width_mm:.2f}x{height_mm:.2f}mm")
+        loops = trace_region_outlines(border_rectangles)
+        if stats is not None:
+            stats['loops'] += len(loops)
+
+        # Flip Y for OpenSCAD; the loops are filled with the even-odd rule,
+        # so their orientation does not matter
+        points = []
+        paths = []
+        for loop in loops:
+            paths.append(", ".join(str(len(points) + i) for i in range(len(loop))))
+            points.extend(f"[{x_mm:.4f}, {(image_height * unit_size) - y_mm:.4f}]" for (x_mm, y_mm) in loop)
+
+        color = f"color({hex_to_openscad_rgb(generate_random_color())}) " if debug else ""
+        yield f"{color}translate([0, 0, {z}]) linear_extrude(height = {height_expr})  // {height_comment}"
+        yield "polygon("
+        yield "    points = ["
+        for i, point in enumerate(points):
+            yield f"        {point}{',' if i < len(points) - 1 else ''}"
+        yield "    ],"
+        yield "    paths = ["
+        for i, path in enumerate(paths):
+            yield f"        [{path}]{',' if i < len(paths) - 1 else ''}"
+        yield "    ]"
+        yield ");"
+        return
+
+    if compact:
+        cubes = []
+        for (x_mm, y_mm, width_mm, height_mm) in border_rectangles:
+            translate_x = x_mm
+            translate_y = (image_height * unit_size) - y_mm - height_mm
+            cube = f"{translate_x:.4f}, {translate_y:.4f}, {width_mm:.4f}, {height_mm:.4f}"
+            if debug:
+                cube += f", {hex_to_openscad_rgb(generate_random_color())}"
+            cubes.append(f"[{cube}]")
+            record_section_stats(stats, width_mm, height_mm, f"{width_mm:.2f}x{height_mm:.2f}mm")
+
+        body = f"translate([c[0], c[1], {z}]) cube([c[2], c[3], {height_expr}]);  // {height_comment}"
+        if debug:
+            body = f"color(c[4]) {body}"
+        yield from placement_loop_lines("c", cubes, body)
+        return
+
+    for i, (x_mm, y_mm, width_mm, height_mm) in enumerate(border_rectangles):
+        # Border/frame rectangles are already in mm, but Y needs flipping for OpenSCAD
+        # Convert image-space Y (where 0 is top) to OpenSCAD Y (where 0 is bottom)
+        translate_x = x_mm
+        translate_y = (image_height * unit_size) - y_mm - height_mm
+        record_section_stats(stats, width_mm, height_mm, f"{width_mm:.2f}x{height_mm:.2f}mm")
+
+        yield f"\n// {mode_label} {layer_label} cube {i + 1}: {width_mm:.2f}mm x {height_mm:.2f}mm at position ({x_mm:.2f}mm, {y_mm:.2f}mm)"
+
+        # Wrap with color() if in debug mode
+        if debug:
+            hex_color = generate_random_color()
+            openscad_color = hex_to_openscad_rgb(hex_color)
+            yield f"color({openscad_color}) {{"
+
+        yield f"translate([{translate_x:.4f}, {translate_y:.4f}, {z}]) {{"
+        yield "    cube(["
+        yield f"        {width_mm:.4f},  // width in mm"
+        yield f"        {height_mm:.4f},  // height in mm"
+        yield f"        {height_expr}  // {height_comment}"
+        yield "    ]);"
+        yield "}"
+
+        # Close color() wrapper if in debug mode
+        if debug:
+            yield "}"
+
+
+def collect_cube_boxes(interior_rectangles: Optional[List[Tuple[int, int, int, int]]],
+                       border_rectangles: Optional[List[Tuple[float, float, float, float]]],
+                       border_rectangles_top: Optional[List[Tuple[float, float, float, float]]],
+                       image_height: int,
+                       unit_size: float,
+                       unit_height: float,
+                       border_height_adjust_mm: float = 0.0,
+                       interior_stats: Optional[Dict[str, object]] = None,
+                       border_stats: Optional[Dict[str, object]] = None) -> np.ndarray:
+    """
+    List the boxes the interior and border/frame cube sections would place.
+
+    Coordinates are in OpenSCAD space (Y flipped) and match the cube() calls
+    written by interior_script_lines() and border_script_lines().
+
+    Args:
+        interior_rectangles: Optional rectangles for interior cubes (in image coordinates)
+        border_rectangles: Optional border/frame base layer rectangles in millimeters
+        border_rectangles_top: Optional border/frame top layer rectangles in millimeters
+        image_height: Height of the source image in pixels (for Y-axis flipping)
+        unit_size: Size of one brick unit in mm
+        unit_height: Height of a baseplate without studs in mm
+        border_height_adjust_mm: Height adjustment for border in mm
+        interior_stats: Optional accumulator from new_section_stats() for interior cubes
+        border_stats: Optional accumulator from new_section_stats() for the border base layer
+
+    Returns:
+        Float array of shape (N, 6) with (x0, y0, z0, x1, y1, z1) in mm
+    """
+    boxes = []
+    for (x, y, width, height) in interior_rectangles or []:
+        translate_x = x * unit_size
+        translate_y = (image_height - y - height) * unit_size
+        boxes.append((translate_x, translate_y, 0.0, translate_x + width * unit_size, translate_y + height * unit_size, unit_height))
+        record_section_stats(interior_stats, width, height, f"{width}x{height}")
+
+    two_layers = border_height_adjust_mm > 0 and bool(border_rectangles_top)
+    base_height = unit_height if two_layers else unit_height + border_height_adjust_mm
+    for (x_mm, y_mm, width_mm, height_mm) in border_rectangles or []:
+        translate_y = (image_height * unit_size) - y_mm - height_mm
+        boxes.append((x_mm, translate_y, 0.0, x_mm + width_mm, translate_y + height_mm, base_height))
+        record_section_stats(border_stats, width_mm, height_mm, f"{width_mm:.2f}x{height_mm:.2f}mm")
+    for (x_mm, y_mm, width_mm, height_mm) in border_rectangles_top or []:
+        translate_y = (image_height * unit_size) - y_mm - height_mm
+        boxes.append((x_mm, translate_y, unit_height, x_mm + width_mm, translate_y + height_mm, unit_height + border_height_adjust_mm))
+
+    return np.array(boxes, dtype=np.float64).reshape(-1, 6)
+
+
+def mesh_boxes(boxes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Build one closed 2-manifold triangle mesh for the union of axis-aligned boxes.
+
+    The boxes are painted onto the 3D grid of their distinct x, y and z
+    coordinates. A grid face is kept only where it separates a filled cell
+    from an empty one, so faces shared by touching boxes disappear. The kept
+    faces of every plane are merged into rectangles with the greedy
+    decomposition. Any rectangle corner lying on another rectangle's edge is
+    inserted into that edge's outline (the rectangle is then fanned around
+    its centre), so faces meet vertex to vertex without T-junctions and the
+    surface is watertight. Where boxes touch only along an edge, each box
+    gets its own midpoint vertex on that edge, so every edge is shared by
+    exactly two faces with opposite orientation; vertices where the surface
+    is still pinched are then split with split_pinched_vertices().
+
+    Args:
+        boxes: Float array (N, 6) of (x0, y0, z0, x1, y1, z1) boxes
+
+    Returns:
+        Tuple of (vertices, triangles): float array (V, 3) of vertex positions
+        and integer array (T, 3) of vertex indices, counter-clockwise when
+        seen from outside
+    """
+    if len(boxes) == 0:
+        return np.zeros((0, 3)), np.zeros((0, 3), dtype=np.int64)
+
+    # Round away floating point noise so nearly equal edges share a grid line
+    boxes = np.round(boxes, MESH_COORDINATE_DECIMALS)
+    axes = [np.unique(np.concatenate([boxes[:, a], boxes[:, a + 3]])) for a in range(3)]
+    lo = np.stack([np.searchsorted(axes[a], boxes[:, a]) for a in range(3)], axis=1)
+    hi = np.stack([np.searchsorted(axes[a], boxes[:, a + 3]) for a in range(3)], axis=1)
+
+    # 3D difference array over the grid cells (indexed x, y, z), then prefix sums
+    shape = tuple(len(axis) for axis in axes)
+    coverage = np.zeros(shape, dtype=np.int32)
+    for corner in range(8):
+        index = tuple(np.where((corner >> a) & 1, hi[:, a], lo[:, a]) for a in range(3))
+        np.add.at(coverage, index, (-1) ** bin(corner).count('1'))
+    # Cells padded with an empty layer on every side
+    filled = np.zeros(tuple(n + 1 for n in shape), dtype=bool)
+    filled[1:-1, 1:-1, 1:-1] = coverage.cumsum(0).cumsum(1).cumsum(2)[:-1, :-1, :-1] > 0
+
+    # Merge the boundary faces of every plane into rectangles. Each one is
+    # stored as (axis, plane, outward, lower corner, upper corner) in grid
+    # point indices.
+    rectangles = []
+    for a in range(3):
+        rest = [axis for axis in range(3) if axis != a]
+        moved = np.moveaxis(filled, a, 0)
+        # Boundary between cell k-1 and cell k along axis a lies on grid line k
+        ahead, behind = moved[1:], moved[:-1]
+        for outward, faces in ((1, behind & ~ahead), (-1, ahead & ~behind)):
+            for plane in np.nonzero(faces.any(axis=(1, 2)))[0]:
+                for (col, row, width, height) in greedy_rectangle_decomposition(faces[plane]):
+                    lower = [0, 0, 0]
+                    upper = [0, 0, 0]
+                    lower[a] = upper[a] = int(plane)
+                    # Padded cell indices are one above the grid line they start on
+                    lower[rest[0]], upper[rest[0]] = row - 1, row - 1 + height
+                    lower[rest[1]], upper[rest[1]] = col - 1, col - 1 + width
+                    rectangles.append((a, outward, lower, upper))
+
+    # Every rectangle corner, grouped by the grid line it lies on in each
+    # direction, to find corners lying inside other rectangles' edges
+    corners_on_line = {}
+    for (a, _, lower, upper) in rectangles:
+        b, c = (a + 1) % 3, (a + 2) % 3
+        for point_b in (lower[b], upper[b]):
+            for point_c in (lower[c], upper[c]):
+                point = [0, 0, 0]
+                point[a], point[b], point[c] = lower[a], point_b, point_c
+                for e in range(3):
+                    key = (e,) + tuple(point[k] for k in range(3) if k != e)
+                    corners_on_line.setdefault(key, set()).add(point[e])
+    corners_on_line = {key: sorted(points) for key, points in corners_on_line.items()}
+
+    def edge_points(start: List[int], end: List[int]) -> List[Tuple[int, int, int]]:
+        # Corners strictly inside the edge from start to end, in walking order
+        e = next(k for k in range(3) if start[k] != end[k])
+        line = corners_on_line.get((e,) + tuple(start[k] for k in range(3) if k != e), [])
+        first, last = sorted((start[e], end[e]))
+        inside = line[bisect.bisect_right(line, first):bisect.bisect_left(line, last)]
+        if start[e] > end[e]:
+            inside = inside[::-1]
+        points = []
+        for value in inside:
+            point = list(start)
+            point[e] = value
+            points.append(tuple(point))
+        return points
+
+    # Grid edges the four cells around which are filled diagonally, per axis
+    # e and indexed by (start along e, point along the other two axes)
+    diagonal_edges = []
+    for e in range(3):
+        cross = np.moveaxis(filled, e, 0)[1:-1]
+        diagonal_edges.append((cross[:, :-1, :-1] == cross[:, 1:, 1:]) & (cross[:, :-1, 1:] == cross[:, 1:, :-1])
+                              & (cross[:, :-1, :-1] != cross[:, :-1, 1:]))
+
+    vertex_ids = {}
+    positions = []
+    triangles = []
+
+    def vertex(point: Tuple[int, int, int]) -> int:
+        if point not in vertex_ids:
+            vertex_ids[point] = len(positions)
+            positions.append([axes[k][point[k]] for k in range(3)])
+        return vertex_ids[point]
+
+    def diagonal_contact(start: Tuple[int, int, int], end: Tuple[int, int, int]) -> bool:
+        # Whether the cells around the edge from start to end are filled
+        # diagonally, so that two boxes touch along it and four faces use it
+        e = next(k for k in range(3) if start[k] != end[k])
+        return bool(diagonal_edges[e][(min(start[e], end[e]),) + tuple(start[k] for k in range(3) if k != e)])
+
+    def midpoint(start: Tuple[int, int, int], end: Tuple[int, int, int], cell: Tuple[int, int, int]) -> int:
+        # Vertex halfway along a diagonal contact edge, one per box touching
+        # it (cell holds the offsets, 0 or 1, of the filled cell the face
+        # bounds), so the two faces of each box share an edge of their own
+        e = next(k for k in range(3) if start[k] != end[k])
+        key = (min(start, end), max(start, end)) + tuple(cell[k] for k in range(3) if k != e)
+        if key not in vertex_ids:
+            vertex_ids[key] = len(positions)
+            positions.append([(axes[k][start[k]] + axes[k][end[k]]) / 2 for k in range(3)])
+        return vertex_ids[key]
+
+    for (a, outward, lower, upper) in rectangles:
+        b, c = (a + 1) % 3, (a + 2) % 3
+        # Corners counter-clockwise when seen from +a
+        corners = []
+        for (use_b, use_c) in ((lower, lower), (upper, lower), (upper, upper), (lower, upper)):
+            point = [0, 0, 0]
+            point[a], point[b], point[c] = lower[a], use_b[b], use_c[c]
+            corners.append(point)
+        outline = []
+        for i in range(4):
+            outline.append(tuple(corners[i]))
+            outline.extend(edge_points(corners[i], corners[(i + 1) % 4]))
+        if outward < 0:
+            outline.reverse()
+        ids = []
+        for i, point in enumerate(outline):
+            ids.append(vertex(point))
+            following = outline[(i + 1) % len(outline)]
+            if diagonal_contact(point, following):
+                # The filled cell behind the face: on the solid side along a,
+                # inside the rectangle along b and c (grid point p lies
+                # between padded cells p and p + 1)
+                cell = [0, 0, 0]
+                cell[a] = 0 if outward > 0 else 1
+                for k in (b, c):
+                    cell[k] = 1 if point[k] < upper[k] else 0
+                ids.append(midpoint(point, following, tuple(cell)))
+
+        if len(ids) == 4:
+            triangles.append((ids[0], ids[1], ids[2]))
+            triangles.append((ids[0], ids[2], ids[3]))
+        else:
+            # Fan around the centre so points along the edges never form
+            # degenerate triangles
+            centre = len(positions)
+            positions.append([(axes[k][lower[k]] + axes[k][upper[k]]) / 2 for k in range(3)])
+            for i in range(len(ids)):
+                triangles.append((centre, ids[i], ids[(i + 1) % len(ids)]))
+
+    return split_pinched_vertices(np.array(positions, dtype=np.float64), np.array(triangles, dtype=np.int64))
+
+
+def split_pinched_vertices(vertices: np.ndarray, triangles: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Give every fan of triangles around a vertex its own copy of the vertex.
+
+    In a closed mesh whose edges each belong to two oppositely oriented
+    triangles, the triangles around a vertex form one or more fans, each
+    closing on itself. More than one fan means the surface is pinched there,
+    as where two boxes touch at a single corner. Each further fan gets a new
+    vertex at the same position, which makes the mesh 2-manifold.
+
+    Args:
+        vertices: Float array (V, 3) of vertex positions
+        triangles: Integer array (T, 3) of vertex indices
+
+    Returns:
+        Tuple of (vertices, triangles) with the copies appended to vertices
+    """
+    # Corner i of triangle (v, a, b) sits at v. It is followed around v by
+    # the corner whose triangle starts with the edge v -> b, so following
+    # every corner once traces out the fans.
+    count = len(vertices)
+    at = triangles.ravel()
+    after = np.roll(triangles, -1, axis=1).ravel()
+    before = np.roll(triangles, 1, axis=1).ravel()
+    keys = at * count + after
+    order = np.argsort(keys)
+    following = order[np.searchsorted(keys, at * count + before, sorter=order)]
+    corners = len(at)
+    _, fans = connected_components(
+        sparse.coo_matrix((np.ones(corners, dtype=np.int8), (np.arange(corners), following)), shape=(corners, corners)),
+        directed=True, connection='weak')
+
+    # The first fan of every vertex keeps its index, every further one gets a copy
+    fan_vertex = np.zeros(fans.max() + 1, dtype=np.int64)
+    fan_vertex[fans] = at
+    keep = np.zeros(len(fan_vertex), dtype=bool)
+    keep[np.unique(fan_vertex, return_index=True)[1]] = True
+    extra = np.nonzero(~keep)[0]
+    fan_index = fan_vertex.copy()
+    fan_index[extra] = count + np.arange(len(extra))
+
+    vertices = np.concatenate([vertices, vertices[fan_vertex[extra]]])
+    triangles = fan_index[fans].reshape(triangles.shape)
+    return vertices, triangles
+
+
+def write_binary_stl(path: str, vertices: np.ndarray, triangles: np.ndarray) -> None:
+    """
+    Write a triangle mesh as binary STL.
+
+    Args:
+        path: Output file path
+        vertices: Float array (V, 3) of vertex positions
+        triangles: Integer array (T, 3) of counter-clockwise vertex indices
+    """
+    corners = vertices[triangles]
+    normals = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+    lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+    normals = normals / np.where(lengths > 0, lengths, 1)
+
+    records = np.zeros(len(triangles), dtype=[('normal', '<f4', 3), ('corners', '<f4', (3, 3)), ('attribute', '<u2')])
+    records['normal'] = normals
+    records['corners'] = corners
+    with open(path, 'wb') as f:
+        f.write(b'Generated irregular baseplate cubes'.ljust(80, b' '))
+        f.write(np.uint32(len(triangles)).tobytes())
+        f.write(records.tobytes())
+
+
+def write_3mf(path: str, vertices: np.ndarray, triangles: np.ndarray) -> None:
+    """
+    Write a triangle mesh as a single-object 3MF package.
+
+    Args:
+        path: Output file path
+        vertices: Float array (V, 3) of vertex positions in mm
+        triangles: Integer array (T, 3) of counter-clockwise vertex indices
+    """
+    vertex_xml = '\n'.join(f'<vertex x="{x:.6g}" y="{y:.6g}" z="{z:.6g}"/>' for (x, y, z) in vertices.tolist())
+    triangle_xml = '\n'.join(f'<triangle v1="{v1}" v2="{v2}" v3="{v3}"/>' for (v1, v2, v3) in triangles.tolist())
+    model = (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<model unit="millimeter" xml:lang="en-US" xmlns="http://schemas.microsoft.com/3dmanufacturing/core/2015/02">\n'
+        '<resources>\n<object id="1" type="model">\n<mesh>\n'
+        f'<vertices>\n{vertex_xml}\n</vertices>\n'
+        f'<triangles>\n{triangle_xml}\n</triangles>\n'
+        '</mesh>\n</object>\n</resources>\n'
+        '<build>\n<item objectid="1"/>\n</build>\n'
+        '</model>\n'
+    )
+    content_types = (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">\n'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>\n'
+        '<Default Extension="model" ContentType="application/vnd.ms-package.3dmanufacturing-3dmodel+xml"/>\n'
+        '</Types>\n'
+    )
+    relationships = (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">\n'
+        '<Relationship Target="/3D/3dmodel.model" Id="rel0" Type="http://schemas.microsoft.com/3dmanufacturing/2013/01/3dmodel"/>\n'
+        '</Relationships>\n'
+    )
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as package:
+        package.writestr('[Content_Types].xml', content_types)
+        package.writestr('_rels/.rels', relationships)
+        package.writestr('3D/3dmodel.model', model)
+
+
+def write_cube_mesh(path: str, vertices: np.ndarray, triangles: np.ndarray, mesh_format: str) -> None:
+    """
+    Write a triangle mesh in one of CUBE_MESH_FORMATS.
+
+    Args:
+        path: Output file path
+        vertices: Float array (V, 3) of vertex positions
+        triangles: Integer array (T, 3) of counter-clockwise vertex indices
+        mesh_format: 'stl' or '3mf'
+
+    Raises:
+        ValueError: If mesh_format is not a known mesh format
+    """
+    if mesh_format == 'stl':
+        write_binary_stl(path, vertices, triangles)
+    elif mesh_format == '3mf':
+        write_3mf(path, vertices, triangles)
+    else:
+        raise ValueError(f"Unknown mesh format: {mesh_format} (expected one of: {', '.join(CUBE_MESH_FORMATS)})")
+
+
+def write_script_lines(handle: Optional[TextIO], lines: Iterator[str]) -> Tuple[int, int]:
+    """
+    Write script lines to a text handle, separated by newlines.
+
+    Args:
+        handle: Writable text handle, or None to only count
+        lines: Script lines to write; a line may hold several text lines
+
+    Returns:
+        Tuple of (line_count, byte_count) of the written text
+    """
+    line_count = 0
+    byte_count = 0
+    for line in lines:
+        if line_count:
+            line = "\n" + line
+        if handle is not None:
+            handle.write(line)
+        line_count += line.count("\n") + (0 if line_count else 1)
+        byte_count += len(line.encode('utf-8'))
+    return line_count, byte_count
+
+
+@contextlib.contextmanager
+def open_script_output(output: Union[str, TextIO]) -> Iterator[TextIO]:
+    """
+    Open the destination of a generated script for buffered writing.
+
+    Args:
+        output: File path, STDOUT_PATH for standard output, or an open text handle
+                (left open after writing)
+
+    Yields:
+        Writable text handle
+    """
+    if output == STDOUT_PATH:
+        output = sys.stdout
+    if not isinstance(output, str):
+        yield output
+        output.flush()
+    else:
+        with open(output, 'w', buffering=SCRIPT_WRITE_BUFFER_SIZE) as f:
+            yield f
+
+
+def split_into_shards(layers: Tuple[Optional[list], ...], count: int, unit_size: float = 8.0,
+                      cost_model: Optional[Dict[str, float]] = None) -> Tuple[List[Tuple[Optional[list], ...]], List[float]]:
+    """
+    Split plates and cubes into spatial shards of similar predicted render cost.
+
+    Every plate costs the render cost model's plate term plus its stud term,
+    every cube the cube term. The items are split by recursive coordinate
+    bisection: each step cuts along the longer side of the current group,
+    at the point where the cost is divided in proportion to the number of
+    shards on either side, so shards stay compact.
+
+    Args:
+        layers: Tuple of (plates, interior cubes, border base cubes, border
+                top cubes); plates and interior cubes in brick units, border
+                cubes in mm; any but the plates may be None
+        count: Number of shards (reduced to the number of items if larger)
+        unit_size: Size of one brick unit in mm
+        cost_model: Render cost coefficients (DEFAULT_RENDER_COST_MODEL if None)
+
+    Returns:
+        Tuple of (shards, costs): for each shard a tuple of layers in the
+        same form as the input, keeping the input order within each layer,
+        and the predicted cost of each shard
+    """
+    model = cost_model if cost_model is not None else DEFAULT_RENDER_COST_MODEL
+    scales = (unit_size, unit_size, 1.0, 1.0)
+
+    layer_of = []
+    index_in_layer = []
+    centres = []
+    costs = []
+    for layer_index, layer in enumerate(layers):
+        for item_index, (x, y, w, h) in enumerate(layer or []):
+            scale = scales[layer_index]
+            layer_of.append(layer_index)
+            index_in_layer.append(item_index)
+            centres.append(((x + w / 2) * scale, (y + h / 2) * scale))
+            costs.append(model['plate'] + model['stud'] * w * h if layer_index == 0 else model['cube'])
+    centres = np.array(centres, dtype=np.float64).reshape(-1, 2)
+    costs = np.array(costs, dtype=np.float64)
+
+    count = max(1, min(count, len(costs)))
+    labels = np.zeros(len(costs), dtype=np.int64)
+
+    def bisect_items(items: np.ndarray, first_label: int, shard_count: int) -> None:
+        if shard_count == 1:
+            labels[items] = first_label
+            return
+        axis = int(np.argmax(np.ptp(centres[items], axis=0)))
+        order = items[np.argsort(centres[items, axis], kind='stable')]
+        left_count = shard_count // 2
+        cumulative = np.cumsum(costs[order])
+        cut = int(np.searchsorted(cumulative, cumulative[-1] * left_count / shard_count)) + 1
+        # Leave at least one item for every shard on either side
+        cut = min(max(cut, left_count), len(order) - (shard_count - left_count))
+        bisect_items(order[:cut], first_label, left_count)
+        bisect_items(order[cut:], first_label + left_count, shard_count - left_count)
+
+    if len(costs):
+        bisect_items(np.arange(len(costs)), 0, count)
+
+    shards = []
+    for label in range(count):
+        members = np.nonzero(labels == label)[0]
+        shard = [[] if layer is not None else None for layer in layers]
+        for member in members:
+            shard[layer_of[member]].append(layers[layer_of[member]][index_in_layer[member]])
+        shards.append(tuple(shard))
+    shard_costs = [float(costs[labels == label].sum()) for label in range(count)]
+    return shards, shard_costs
+
+
+def shard_assembly_lines(mesh_names: List[str]) -> Iterator[str]:
+    """
+    Emit the assembly script that combines the rendered shard meshes.
+
+    Args:
+        mesh_names: Mesh file of every shard, relative to the assembly script
+
+    Yields:
+        Script lines
+    """
+    yield "/**"
+    yield " * Generated Irregular Baseplate - shard assembly"
+    yield " * Render every <name>.shard-NN.scad to the <name>.shard-NN.stl imported"
+    yield f" * below first; the shards are listed in the {SHARD_MANIFEST_SUFFIX} manifest"
+    yield " */"
+    yield ""
+    for mesh_name in mesh_names:
+        yield f"import(\"{mesh_name}\");"
+
+
+def generate_openscad_script(rectangles: List[Tuple[int, int, int, int]],
+                            output_path: Union[str, TextIO] = "irregular_baseplate.scad",
+                            debug: bool = False,
+                            image_height: int = 0,
+                            interior_rectangles: Optional[List[Tuple[int, int, int, int]]] = None,
+                            border_rectangles: Optional[List[Tuple[float, float, float, float]]] = None,
+                            border_rectangles_top: Optional[List[Tuple[float, float, float, float]]] = None,
+                            border_thickness_mm: float = 0.0,
+                            border_height_adjust_mm: float = 0.0,
+                            unit_size: float = 8.0,
+                            config_path: str = "machineblocks/config/config-default.scad",
+                            is_frame_mode: bool = False,
+                            config: Optional[Dict[str, float]] = None,
+                            center: bool = False,
+                            image_width: int = 0,
+                            cost_model: Optional[Dict[str, float]] = None,
+                            compact: bool = False,
+                            cube_mesh_path: Optional[str] = None,
+                            shards: int = 1,
+                            border_style: str = DEFAULT_BORDER_STYLE,
+                            level_rectangles: Optional[List[List[Tuple[int, int, int, int]]]] = None,
+                            profile: Optional[Dict[str, object]] = None,
+                            log: Callable[..., None] = print) -> None:
+    """
+    Generate an OpenSCAD script that renders the baseplates.
+
+    Coordinate System Note:
+    - Image coordinates: Y=0 at top, Y increases downward
+    - OpenSCAD coordinates: Y=0 at bottom, Y increases upward
+    - This function flips the Y-axis: translate_y = (image_height - y - height) * unit_size
+    - This ensures the rendered model matches the input image orientation
+
+    Args:
+        rectangles: List of rectangles as (x, y, width, height) tuples (in image coordinates) for baseplates
+        output_path: Path to save the generated .scad file, STDOUT_PATH to write
+                     to standard output, or an open text handle
+        debug: If True, use random colors for each baseplate
+        image_height: Height of the source image in pixels (for Y-axis flipping)
+        interior_rectangles: Optional list of rectangles for interior cubes (if using --edge mode)
+        border_rectangles: Optional list of rectangles for border cubes as (x_mm, y_mm, width_mm, height_mm) in millimeters
+        border_thickness_mm: Thickness of border in mm
+        border_height_adjust_mm: Height adjustment for border in mm
+        unit_size: Size of one brick unit in mm (calculated from config)
+        config_path: Path to OpenSCAD config file to include
+        config: Optional parsed config dictionary to check for optional variables
+        center: If True, center the entire model around X and Y axes
+        image_width: Width of the source image in pixels (for centering calculation)
+        cost_model: Optional render cost coefficients for the predicted cost statistics
+        compact: If True, place baseplates through one baseplate(size) module
+                 and for() loops per size, and emit cubes as data-driven loops
+        cube_mesh_path: If given, interior and border/frame cubes are merged into
+                        one mesh written to this .stl or .3mf file, and the
+                        script import()s it instead of placing the cubes
+        shards: If greater than 1, split plates and cubes into this many
+                spatial shards of similar predicted render cost, each written
+                to its own <output>.shard-NN.scad. The output file then
+                import()s the shard meshes, and <output>.shards.json lists them.
+        border_style: 'cubes' to place one cube per border/frame rectangle, or
+                      'outline' to extrude each layer from its traced polygon
+                      outline. Outlined layers stay in the script when the
+                      other cubes are merged into a mesh.
+        level_rectangles: Optional baseplate rectangles of stacked levels,
+                          bottom to top. Each level is placed one plate height
+                          above the one below it, starting on top of the baseplates.
+        profile: Optional profile from new_profile() to record the mesh,
+                 script generation and write stages in
+        log: Function the progress and statistics are printed with
+             (discard_log to stay silent)
+
+    Raises:
+        ValueError: If cube_mesh_path is given without a config or with an
+                    unknown file extension, if shards are requested for
+                    stdout output or together with cube_mesh_path or stacked
+                    levels, or if stacked levels are given without a config
+    """
+    if level_rectangles and config is None:
+        raise ValueError("A parsed config is needed to compute the height of the stacked levels")
+
+    # Calculate centering offset if needed
+    center_x = 0.0
+    center_y = 0.0
+    if center:
+        # Calculate the center offset based on image dimensions
+        # Account for border/frame if present
+        if border_rectangles:
+            # Find the bounding box of all border rectangles
+            all_rects = border_rectangles[:]
+            if border_rectangles_top:
+                all_rects.extend(border_rectangles_top)
+
+            min_x = min(x for x, _, _, _ in all_rects)
+            max_x = max(x + w for x, _, w, _ in all_rects)
+            min_y = min(y for _, y, _, _ in all_rects)
+            max_y = max(y + h for _, y, _, h in all_rects)
+
+            # Calculate center offset (in OpenSCAD coordinates, Y is already flipped in rectangles)
+            total_width_mm = max_x - min_x
+            total_height_mm = max_y - min_y
+            center_x = -(min_x + total_width_mm / 2)
+            center_y = -(image_height * unit_size - min_y - total_height_mm / 2)
+        else:
+            # Center based on image dimensions
+            center_x = -(image_width * unit_size / 2)
+            center_y = -(image_height * unit_size / 2)
+
+    two_layers = border_height_adjust_mm > 0 and bool(border_rectangles_top)
+    outline = border_style == 'outline'
+    plate_height = config['unitGrid'][1] * config['unitMbu'] * config['scale'] if level_rectangles else 0.0
+    plate_stats = new_section_stats()
+    interior_stats = new_section_stats()
+    border_stats = new_section_stats()
+
+    # Merge the cube-only regions into one mesh if requested
+    cube_mesh_import = None
+    mesh_border = not outline
+    if cube_mesh_path is not None and (interior_rectangles or (mesh_border and border_rectangles)):
+        if config is None:
+            raise ValueError("A parsed config is needed to compute the cube height of the mesh")
+        mesh_format = os.path.splitext(cube_mesh_path)[1].lstrip('.').lower()
+        unit_height = config['unitGrid'][1] * config['unitMbu'] * config['scale']
+        with profile_stage(profile, 'mesh') as record:
+            boxes = collect_cube_boxes(interior_rectangles, border_rectangles if mesh_border else None,
+                                       border_rectangles_top if mesh_border else None, image_height, unit_size,
+                                       unit_height, border_height_adjust_mm, interior_stats, border_stats)
+            vertices, triangles = mesh_boxes(boxes)
+            write_cube_mesh(cube_mesh_path, vertices, triangles, mesh_format)
+            record['cubes'] = len(boxes)
+            record['triangles'] = len(triangles)
+        log(f"Cube mesh written: {cube_mesh_path} ({len(boxes)} cubes merged into {len(triangles)} triangles)")
+
+        # import() resolves relative paths against the script's directory
+        if isinstance(output_path, str) and output_path != STDOUT_PATH:
+            cube_mesh_import = os.path.relpath(cube_mesh_path, os.path.dirname(os.path.abspath(output_path)))
+        else:
+            cube_mesh_import = os.path.abspath(cube_mesh_path)
+        cube_mesh_import = cube_mesh_import.replace(os.sep, '/')
+
+    def script_lines(compact_script: bool, layers: Tuple[Optional[list], ...],
+                     plate_stats: Optional[Dict[str, object]] = None,
+                     interior_stats: Optional[Dict[str, object]] = None,
+                     border_stats: Optional[Dict[str, object]] = None) -> Iterator[str]:
+        plates, interior, border, border_top = layers
+        # Header
+        yield from [
+            "/**",
+            " * Generated Irregular Baseplate",
+            " * Auto-generated from PNG image",
+            " */",
+            "",
+            "// Imports",
+            "use <machineblocks/lib/block.scad>;",
+            f"include <{config_path}>;",
+            "",
+        ]
+        if compact_script:
+            yield from baseplate_module_lines(config)
+
+        # Centering
+        if center:
+            yield f"// Model centered at origin"
+            yield f"translate([{center_x:.4f}, {center_y:.4f}, 0]) {{"
+            yield ""
+
+        yield from baseplate_script_lines(plates, image_height, unit_size, debug, config, bool(interior_rectangles), compact_script, plate_stats)
+
+        # Stacked levels, each one plate height above the one below
+        for index, level in enumerate(level_rectangles or [], start=1):
+            yield f"\n// Level {index + 1}: {len(level)} baseplates stacked at {index} plate height(s)"
+            yield f"translate([0, 0, {index * plate_height}]) {{"
+            yield from baseplate_script_lines(level, image_height, unit_size, debug, config, False, compact_script, plate_stats)
+            yield "}"
+
+        if cube_mesh_import is not None:
+            # Interior (and cube-style border) cubes come from the merged mesh
+            yield f"\n// {'Interior and border/frame' if mesh_border else 'Interior'} cubes, merged into one mesh"
+            yield f"import(\"{cube_mesh_import}\");"
+        elif interior:
+            # Generate interior cubes if provided
+            yield from interior_script_lines(interior, image_height, unit_size, debug, compact_script, interior_stats)
+
+        if cube_mesh_import is None or not mesh_border:
+            # Generate border/frame cubes if provided (these are in mm coordinates already)
+            if border:
+                yield from border_script_lines(border, image_height, unit_size, False, border_thickness_mm,
+                                               border_height_adjust_mm, is_frame_mode, two_layers, debug, compact_script,
+                                               border_stats, outline)
+
+            # Generate top layer for border/frame if provided (with clearance)
+            if border_top:
+                yield from border_script_lines(border_top, image_height, unit_size, True, border_thickness_mm,
+                                               border_height_adjust_mm, is_frame_mode, two_layers, debug, compact_script,
+                                               None, outline)
+
+        # Close centering translate if enabled
+        if center:
+            yield ""
+            yield "} // End centering translate"
+
+    layers = (rectangles, interior_rectangles, border_rectangles, border_rectangles_top)
+    # Scripts the size of the output is made up of, and the lines and bytes
+    # written around them (the shard assembly)
+    script_layers = [layers]
+    extra_lines = 0
+    extra_size = 0
+    output_name = output_path if isinstance(output_path, str) and output_path != STDOUT_PATH else "<stdout>"
+    if shards > 1:
+        # Every shard is a complete script with the same header and
+        # coordinates; the output file becomes the assembly of their meshes
+        if output_name == "<stdout>":
+            raise ValueError("Sharded output needs an output file path to name the shard files after")
+        if cube_mesh_import is not None:
+            raise ValueError("Sharded output cannot be combined with a merged cube mesh")
+        if level_rectangles:
+            raise ValueError("Sharded output cannot be combined with stacked levels")
+        base_path = os.path.splitext(output_path)[0]
+        with profile_stage(profile, 'script') as record:
+            shard_layers, shard_costs = split_into_shards(layers, shards, unit_size, cost_model)
+            manifest_shards = []
+            line_count = 0
+            script_size = 0
+            for index, (shard, shard_cost) in enumerate(zip(shard_layers, shard_costs), start=1):
+                shard_path = f"{base_path}.shard-{index:02d}.scad"
+                with open_script_output(shard_path) as f:
+                    shard_lines, shard_size = write_script_lines(f, script_lines(compact, shard, plate_stats, interior_stats, border_stats))
+                line_count += shard_lines
+                script_size += shard_size
+                manifest_shards.append({
+                    'scad': os.path.basename(shard_path),
+                    'mesh': os.path.basename(os.path.splitext(shard_path)[0] + SHARD_MESH_EXTENSION),
+                    'plates': len(shard[0]),
+                    'interior_cubes': len(shard[1] or []),
+                    'border_cubes': len(shard[2] or []) + len(shard[3] or []),
+                    'predicted_cost': round(shard_cost, 4),
+                })
+
+            with open_script_output(output_path) as f:
+                extra_lines, extra_size = write_script_lines(f, shard_assembly_lines([entry['mesh'] for entry in manifest_shards]))
+            line_count += extra_lines
+            script_size += extra_size
+            script_layers = shard_layers
+            record.update(shards=len(manifest_shards), lines=line_count, bytes=script_size)
+
+        manifest_path = f"{base_path}{SHARD_MANIFEST_SUFFIX}"
+        with open(manifest_path, 'w') as f:
+            json.dump({'assembly': os.path.basename(output_path), 'shards': manifest_shards}, f, indent=2)
+
+        log(f"OpenSCAD shard assembly generated: {output_name}")
+        log(f"Shards: {len(manifest_shards)} scripts, listed in {manifest_path}")
+        for entry in manifest_shards:
+            log(f"  {entry['scad']}: {entry['plates']} plates, {entry['interior_cubes'] + entry['border_cubes']} cubes, "
+                f"predicted cost {entry['predicted_cost']:.2f}")
+    else:
+        # Stream the script to the output; statistics are gathered on the way.
+        # Flushing and closing the output is measured as its own stage.
+        with contextlib.ExitStack() as output:
+            with profile_stage(profile, 'script') as record:
+                f = output.enter_context(open_script_output(output_path))
+                line_count, script_size = write_script_lines(f, script_lines(compact, layers, plate_stats, interior_stats, border_stats))
+                record.update(lines=line_count, bytes=script_size)
+            with profile_stage(profile, 'write'):
+                output.close()
+        log(f"OpenSCAD script generated: {output_name}")
+
+    log(f"Script size: {line_count} lines, {script_size / 1024:.1f} KB")
+    if compact and profile is not None:
+        # Compare with the same script(s) written without compact mode. This
+        # renders the script a second time, so it is only done when profiling.
+        with profile_stage(profile, 'compact comparison') as record:
+            verbose_line_count, verbose_size = extra_lines, extra_size
+            for script_layer in script_layers:
+                lines, size = write_script_lines(None, script_lines(False, script_layer))
+                verbose_line_count += lines
+                verbose_size += size
+            record.update(lines=verbose_line_count, bytes=verbose_size)
+        log(f"Without compact mode: {verbose_line_count} lines, {verbose_size / 1024:.1f} KB "
+            f"({verbose_size / max(script_size, 1):.1f}x larger)")
+    log(f"Total baseplates: {plate_stats['count']}")
+    if level_rectangles:
+        log(f"Stacked levels: {len(level_rectangles)} ({', '.join(str(len(level)) for level in level_rectangles)} baseplates, bottom to top)")
+
+    # Print statistics for baseplates
+    log(f"Total brick units covered by baseplates: {plate_stats['area']}")
+    log("\nBaseplate sizes used:")
+    for size, count in sorted(plate_stats['sizes'].items(), key=lambda x: x[1], reverse=True):
+        log(f"  {size}: {count} plates")
+
+    # Predicted OpenSCAD render cost of everything in the script
+    cube_count = sum(len(r) for r in (interior_rectangles, border_rectangles, border_rectangles_top) if r)
+    cost = predict_stacked_render_cost(rectangles, level_rectangles, cube_count, cost_model)
+    log(f"\nPredicted render cost: {cost['total']:.2f} "
+        f"(plates: {cost['plate']:.2f}, studs: {cost['stud']:.2f}, seams: {cost['seam']:.2f}, cubes: {cost['cube']:.2f})")
+
+    # Print statistics for interior cubes if present
+    if interior_rectangles:
+        log(f"\nTotal interior cubes: {interior_stats['count']}")
+        log(f"Total brick units covered by interior: {interior_stats['area']}")
+        log("\nInterior cube sizes used:")
+        for size, count in sorted(interior_stats['sizes'].items(), key=lambda x: x[1], reverse=True):
+            log(f"  {size}: {count} cubes")
+
+    # Print statistics for border/frame cubes if present
+    if border_rectangles:
+        mode_label = "frame" if is_frame_mode else "border"
+        thickness_label = "padding" if is_frame_mode else "thickness"
+
+        if outline:
+            log(f"\nTotal {mode_label} outline loops: {border_stats['loops']} (traced from {border_stats['count']} rectangles)")
+        else:
+            log(f"\nTotal {mode_label} cubes: {border_stats['count']}")
+        log(f"{mode_label.capitalize()} {thickness_label}: {border_thickness_mm}mm, Height adjustment: {border_height_adjust_mm}mm")
+        log(f"Total area covered by {mode_label}: {border_stats['area']:.2f} mm²")
+        piece_label = "rectangle" if outline else "cube"
+        log(f"\n{mode_label.capitalize()} {piece_label} sizes used (in mm):")
+        for size, count in sorted(border_stats['sizes'].items(), key=lambda x: x[1], reverse=True):
+            log(f"  {size}: {count} {piece_label}s")
+
+
+def decompose_baseplate(binary_mask: np.ndarray, args: argparse.Namespace, config: Dict[str, float], unit_size: float, cost_model: Optional[Dict[str, float]] = None,
+                        previous: Optional[Tuple[np.ndarray, Dict[str, Optional[list]]]] = None,
+                        profile: Optional[Dict[str, object]] = None,
+                        log: Callable[..., None] = print) -> Dict[str, Optional[list]]:
+    """
+    Decompose a shape mask into baseplates, interior cubes and border cubes.
+
+    Args:
+        binary_mask: 2D boolean array where True = inside shape
+        args: Parsed command line options (edge, border, frame, decompose, ...)
+        config: Parsed OpenSCAD config dictionary
+        unit_size: Size of one brick unit in mm
+        cost_model: Optional render cost coefficients
+        previous: Optional (mask, result) of an earlier run with the same
+                  options; only the parts around changed cells are recomputed
+        profile: Optional profile from new_profile() to record the edge split,
+                 decomposition and border/frame stages in
+        log: Function the progress is printed with (discard_log to stay silent)
+
+    Returns:
+        Dictionary with 'rectangles', 'interior_rectangles', 'border_rectangles'
+        and 'border_rectangles_top' (the last three may be None)
+    """
+    # Step 2: Decompose into rectangles
+    log("\nDecomposing shape into rectangles...")
+
+    previous_mask, previous_result = previous if previous is not None else (None, {})
+
+    # With --jobs the connected parts of every layer are decomposed in a
+    # pool of worker processes shared by all layers
+    with contextlib.ExitStack() as stack:
+        executor = None
+        if args.jobs > 1:
+            log(f"Decomposing connected parts in {args.jobs} worker processes")
+            executor = stack.enter_context(ProcessPoolExecutor(max_workers=args.jobs))
+        return decompose_layers(binary_mask, args, config, unit_size, cost_model, previous_mask, previous_result, profile, log, executor)
+
+
+def decompose_layers(binary_mask: np.ndarray, args: argparse.Namespace, config: Dict[str, float], unit_size: float,
+                     cost_model: Optional[Dict[str, float]], previous_mask: Optional[np.ndarray],
+                     previous_result: Dict[str, Optional[list]], profile: Optional[Dict[str, object]],
+                     log: Callable[..., None], executor: Optional[Executor]) -> Dict[str, Optional[list]]:
+    """Body of decompose_baseplate(), run with the worker pool of --jobs (or None)."""
+    interior_rectangles = None
+    border_rectangles = None
+
+    def decompose(mask: np.ndarray, previous_layer_mask: Optional[np.ndarray], name: str,
+                  strategy: str = args.decompose) -> List[Tuple[int, int, int, int]]:
+        if previous_layer_mask is not None and previous_result.get(name) is not None:
+            return update_mask_decomposition(previous_layer_mask, previous_result[name], mask, strategy, args.engine, args.optimalMaxCells, cost_model)
+        return decompose_mask(mask, strategy, args.engine, args.optimalMaxCells, cost_model, executor, args.tiles)
+
+    def previous_layer(name: str) -> Optional[Tuple[np.ndarray, list]]:
+        if previous_mask is not None and previous_result.get(name) is not None:
+            return previous_mask, previous_result[name]
+        return None
+
+    plate_mask = binary_mask
+    if args.edge is not None:
+        # Edge mode: separate edge and interior
+        log(f"Edge mode enabled: edge thickness = {args.edge} brick units")
+        with profile_stage(profile, 'edge split') as record:
+            edge_mask, interior_mask = extract_edge_and_interior(binary_mask, args.edge)
+            previous_edge_mask, previous_interior_mask = (None, None)
+            if previous_mask is not None:
+                previous_edge_mask, previous_interior_mask = extract_edge_and_interior(previous_mask, args.edge)
+            record['edge_cells'] = int(np.count_nonzero(edge_mask))
+            record['interior_cells'] = int(np.count_nonzero(interior_mask))
+
+        log(f"Edge pixels: {np.sum(edge_mask)}")
+        log(f"Interior pixels: {np.sum(interior_mask)}")
+
+        # Decompose edge into baseplates
+        plate_mask = edge_mask
+        with profile_stage(profile, 'decompose') as record:
+            rectangles = decompose(edge_mask, previous_edge_mask, 'rectangles')
+            record['rectangles'] = len(rectangles)
+
+        # Decompose interior into cubes. Cubes have no studs or seams, so
+        # their predicted cost is the cube term alone and the fewest cubes
+        # (the optimal partition) are the cheapest under --decompose=cost.
+        interior_strategy = 'optimal' if args.decompose == 'cost' else args.decompose
+        with profile_stage(profile, 'decompose interior') as record:
+            interior_rectangles = decompose(interior_mask, previous_interior_mask, 'interior_rectangles', interior_strategy)
+            record['rectangles'] = len(interior_rectangles)
+    else:
+        # Normal mode: all baseplates
+        with profile_stage(profile, 'decompose') as record:
+            rectangles = decompose(binary_mask, previous_mask, 'rectangles')
+            record['rectangles'] = len(rectangles)
+
+    if args.decompose != 'greedy':
+        greedy_rectangles = decompose_mask(plate_mask, 'greedy', args.engine, executor=executor)
+        reduction = len(greedy_rectangles) - len(rectangles)
+        log(f"{args.decompose.capitalize()} decomposition: {len(rectangles)} baseplates (greedy: {len(greedy_rectangles)}, {reduction} fewer)")
+        if args.decompose == 'cost':
+            greedy_cost = predict_render_cost(greedy_rectangles, model=cost_model)['total']
+            chosen_cost = predict_render_cost(rectangles, model=cost_model)['total']
+            log(f"Predicted baseplate render cost: {chosen_cost:.2f} (greedy: {greedy_cost:.2f})")
+
+    # Step 2b: Generate border or frame if requested
+    border_rectangles_top = None
+    if args.border is not None:
+        # Get base side adjustment for clearance calculation
+        inset_mm = border_inset_mm(args, config)
+
+        if args.frame:
+            # Frame mode: filled rectangular border enclosing entire shape
+            log(f"\nFrame mode enabled: padding = {args.border}mm")
+            with profile_stage(profile, 'frame base') as record:
+                border_rectangles = extract_frame_rectangles_mm(binary_mask, args.border, unit_size, inset_mm=0.0, engine=args.engine, geometry=args.borderGeometry, previous=previous_layer('border_rectangles'), stats=record, executor=executor, tiles=args.tiles)
+                record['rectangles'] = len(border_rectangles)
+            log(f"Generated {len(border_rectangles)} frame rectangles (base layer)")
+
+            # Generate top layer with inset if borderHeightAdjust > 0
+            if args.borderHeightAdjust > 0:
+                log(f"Generating top layer with {inset_mm}mm inset for clearance")
+                with profile_stage(profile, 'frame top') as record:
+                    border_rectangles_top = extract_frame_rectangles_mm(binary_mask, args.border, unit_size, inset_mm=inset_mm, engine=args.engine, geometry=args.borderGeometry, previous=previous_layer('border_rectangles_top'), stats=record, executor=executor, tiles=args.tiles)
+                    record['rectangles'] = len(border_rectangles_top)
+                log(f"Generated {len(border_rectangles_top)} frame rectangles (top layer)")
+        else:
+            # Normal border mode: border around shape edges
+            log(f"\nBorder mode enabled: border thickness = {args.border}mm")
+            with profile_stage(profile, 'border base') as record:
+                border_rectangles = extract_border_rectangles_mm(binary_mask, args.border, unit_size, inset_mm=0.0, engine=args.engine, geometry=args.borderGeometry, previous=previous_layer('border_rectangles'), stats=record, executor=executor, tiles=args.tiles)
+                record['rectangles'] = len(border_rectangles)
+            log(f"Generated {len(border_rectangles)} border rectangles (base layer)")
+
+            # Generate top layer with inset if borderHeightAdjust > 0
+            if args.borderHeightAdjust > 0:
+                log(f"Generating top layer with {inset_mm}mm inset for clearance")
+                with profile_stage(profile, 'border top') as record:
+                    border_rectangles_top = extract_border_rectangles_mm(binary_mask, args.border, unit_size, inset_mm=inset_mm, engine=args.engine, geometry=args.borderGeometry, previous=previous_layer('border_rectangles_top'), stats=record, executor=executor, tiles=args.tiles)
+                    record['rectangles'] = len(border_rectangles_top)
+                log(f"Generated {len(border_rectangles_top)} border rectangles (top layer)")
+
+    result = {
+        'rectangles': rectangles,
+        'interior_rectangles': interior_rectangles,
+        'border_rectangles': border_rectangles,
+        'border_rectangles_top': border_rectangles_top,
+    }
+
+    # Step 2c: Merge rectangles that share a complete edge
+    if args.merge:
+        with profile_stage(profile, 'merge') as record:
+            removed = merge_decomposition(result)
+            record.update(removed)
+        labels = {'rectangles': 'baseplates', 'interior_rectangles': 'interior cubes',
+                  'border_rectangles': 'border base cubes', 'border_rectangles_top': 'border top cubes'}
+        log(f"\nMerged rectangles: {sum(removed.values())} removed "
+            f"({', '.join(f'{labels[name]}: {count}' for name, count in removed.items())})")
+
+    return result
+
+
+def merge_decomposition(result: Dict[str, Optional[list]]) -> Dict[str, int]:
+    """
+    Merge the rectangles of every layer of a decomposition result in place.
+
+    Baseplates and interior cubes are merged on whole brick units, border and
+    frame cubes on the MERGE_QUANTUM_MM grid.
+
+    Args:
+        result: Result of decompose_baseplate()
+
+    Returns:
+        Dictionary mapping each present layer name to the number of rectangles removed
+    """
+    removed = {}
+    for name, quantum in (('rectangles', 1), ('interior_rectangles', 1),
+                          ('border_rectangles', MERGE_QUANTUM_MM), ('border_rectangles_top', MERGE_QUANTUM_MM)):
+        if result[name] is None:
+            continue
+        merged = merge_rectangles(result[name], quantum)
+        removed[name] = len(result[name]) - len(merged)
+        result[name] = merged
+    return removed
+
+
+def decompose_levels(gray: np.ndarray, thresholds: List[int], args: argparse.Namespace,
+                     cost_model: Optional[Dict[str, float]] = None,
+                     log: Callable[..., None] = print) -> List[Tuple[int, np.ndarray, List[Tuple[int, int, int, int]]]]:
+    """
+    Decompose the nested masks of several thresholds in one incremental pass.
+
+    The mask of a higher threshold contains the mask of every lower one, so
+    the levels are decomposed from the lowest threshold up, each starting
+    from the rectangles of the level inside it: only rectangles next to the
+    newly added cells are dropped and decomposed again with them (see
+    update_mask_decomposition()).
+
+    Args:
+        gray: 2D array of gray levels; cells below a threshold are inside its level
+        thresholds: Thresholds of the levels, in increasing order
+        args: Parsed command line options (decompose, engine, optimalMaxCells, merge)
+        cost_model: Optional render cost coefficients
+        log: Function the progress is printed with (discard_log to stay silent)
+
+    Returns:
+        List of (threshold, mask, rectangles) per level, lowest threshold first
+    """
+    levels = []
+    for threshold in thresholds:
+        mask = gray < threshold
+        if not levels:
+            rectangles = decompose_mask(mask, args.decompose, args.engine, args.optimalMaxCells, cost_model)
+            reuse_note = ""
+        else:
+            inner_threshold, inner_mask, inner_rectangles = levels[-1]
+            rectangles = update_mask_decomposition(inner_mask, inner_rectangles, mask, args.decompose, args.engine,
+                                                   args.optimalMaxCells, cost_model)
+            reused = len(set(inner_rectangles).intersection(rectangles))
+            reuse_note = f" ({reused} reused from threshold {inner_threshold})"
+        if args.merge:
+            rectangles = merge_rectangles(rectangles)
+        log(f"Level threshold {threshold}: {int(np.count_nonzero(mask))} pixels, {len(rectangles)} baseplates{reuse_note}")
+        levels.append((threshold, mask, rectangles))
+    return levels
+
+
+def decompose_level_stack(gray: np.ndarray, args: argparse.Namespace, cost_model: Optional[Dict[str, float]] = None,
+                          log: Callable[..., None] = print) -> Tuple[np.ndarray, List[Tuple[int, List[Tuple[int, int, int, int]]]], Optional[Tuple[np.ndarray, Dict[str, Optional[list]]]]]:
+    """
+    Split a --levels run into the bottom level and the levels stacked on it.
+
+    The highest threshold gives the largest mask, which becomes the bottom
+    level and goes through decompose_baseplate() with the edge, border and
+    frame options. The lower thresholds are the stacked levels, darker
+    pixels stacking higher.
+
+    Args:
+        gray: 2D array of gray levels
+        args: Parsed command line options with levels in increasing order
+        cost_model: Optional render cost coefficients
+        log: Function the progress is printed with (discard_log to stay silent)
+
+    Returns:
+        Tuple of (bottom level mask, (threshold, rectangles) of the stacked
+        levels bottom to top, previous layout for decompose_baseplate()).
+        The previous layout lets the bottom level reuse the plates of the
+        level above it; it is None in edge mode, where the bottom level is
+        split into edge and interior.
+    """
+    inner_levels = decompose_levels(gray, args.levels[:-1], args, cost_model, log)
+    binary_mask = gray < args.levels[-1]
+    _, inner_mask, inner_rectangles = inner_levels[-1]
+    previous = (inner_mask, {'rectangles': inner_rectangles}) if args.edge is None else None
+    stacked = [(threshold, rectangles) for threshold, _, rectangles in reversed(inner_levels)]
+    return binary_mask, stacked, previous
+
+
+def threshold_sweep(gray: np.ndarray, args: argparse.Namespace,
+                    cost_model: Optional[Dict[str, float]] = None) -> List[Tuple[int, int, int]]:
+    """
+    Count the baseplates of the shape at every threshold from 0 to 255.
+
+    The mask only changes at thresholds just above a gray level that occurs
+    in the image, so only those are decomposed; the pixel counts of all
+    thresholds come from one histogram. Each mask is decomposed on its own,
+    so the counts match separate runs with -t: chaining 255 incremental
+    updates would let the kept rectangles fragment the later levels.
+
+    Args:
+        gray: 2D uint8 array of gray levels
+        args: Parsed command line options (decompose, engine, optimalMaxCells, merge)
+        cost_model: Optional render cost coefficients
+
+    Returns:
+        List of (threshold, inside cells, baseplates) for thresholds 0 to 255
+    """
+    histogram = np.zeros(256, dtype=np.int64)
+    for strip in mask_strips(gray.shape[0]):
+        histogram += np.bincount(np.asarray(gray[strip], dtype=np.uint8).ravel(), minlength=256)
+    inside_cells = np.concatenate([[0], np.cumsum(histogram)[:-1]])
+
+    changes = [threshold for threshold in range(1, 256) if histogram[threshold - 1]]
+    plates = {}
+    for threshold in changes:
+        rectangles = decompose_mask(gray < threshold, args.decompose, args.engine, args.optimalMaxCells, cost_model)
+        plates[threshold] = len(merge_rectangles(rectangles) if args.merge else rectangles)
+    counts = []
+    count = 0
+    for threshold in range(256):
+        count = plates.get(threshold, count)
+        counts.append((threshold, int(inside_cells[threshold]), count))
+    return counts
+
+
+def border_inset_mm(args: argparse.Namespace, config: Dict[str, float]) -> float:
+    """
+    Inset of the border/frame top layer in mm (0 when there is no top layer).
+
+    Args:
+        args: Parsed command line options
+        config: Parsed OpenSCAD config dictionary
+
+    Returns:
+        Inset amount in mm
+    """
+    # Inset amount is the negative of base side adjustment (to expand cutout)
+    return -config.get('baseSideAdjustment', -0.1) if args.borderHeightAdjust > 0 else 0.0
+
+
+def decomposition_options(args: argparse.Namespace, config: Dict[str, float], unit_size: float, cost_model: Optional[Dict[str, float]] = None) -> Dict[str, object]:
+    """
+    Collect every option that changes how a mask is decomposed.
+
+    Args:
+        args: Parsed command line options
+        config: Parsed OpenSCAD config dictionary
+        unit_size: Size of one brick unit in mm
+        cost_model: Optional render cost coefficients
+
+    Returns:
+        JSON-serialisable dictionary of the options
+    """
+    return {
+        'edge': args.edge,
+        'border': args.border,
+        'frame': args.frame,
+        'top_layer': args.border is not None and args.borderHeightAdjust > 0,
+        'inset': border_inset_mm(args, config),
+        'unit_size': unit_size,
+        'resolution': BORDER_RESOLUTION_MM,
+        'decompose': args.decompose,
+        'optimal_max_cells': args.optimalMaxCells if args.decompose != 'greedy' else None,
+        'cost_model': cost_model if args.decompose == 'cost' else None,
+        'merge': args.merge,
+        'levels': args.levels,
+    }
+
+
+def compute_cache_key(binary_mask: np.ndarray, args: argparse.Namespace, config: Dict[str, float], unit_size: float,
+                      cost_model: Optional[Dict[str, float]] = None, gray: Optional[np.ndarray] = None) -> str:
+    """
+    Hash a thresholded mask and every option that changes its decomposition.
+
+    Cosmetic options such as --debug, --center or the output path are left
+    out, so changing them reuses the cached rectangles. With --levels the
+    bottom level starts from the layout of the levels stacked on it, so the
+    mask of every inner level is hashed as well.
+
+    Args:
+        binary_mask: 2D boolean array where True = inside shape
+        args: Parsed command line options
+        config: Parsed OpenSCAD config dictionary
+        unit_size: Size of one brick unit in mm
+        cost_model: Optional render cost coefficients
+        gray: Gray levels the masks were thresholded from, required with --levels
+
+    Returns:
+        Hex digest identifying the decomposition result
+
+    Raises:
+        ValueError: If --levels is set but no gray levels are given
+    """
+    params = {
+        'version': CACHE_FORMAT_VERSION,
+        'shape': list(binary_mask.shape),
+        **decomposition_options(args, config, unit_size, cost_model),
+    }
+    digest = hashlib.sha256()
+    digest.update(json.dumps(params, sort_keys=True).encode('utf-8'))
+    # Hash the packed bits strip by strip; strips of a multiple of 8 rows pack
+    # to the same bytes as the whole mask
+    for strip in mask_strips(binary_mask.shape[0]):
+        digest.update(np.packbits(np.asarray(binary_mask[strip], dtype=bool), axis=None).tobytes())
+    if args.levels:
+        if gray is None:
+            raise ValueError("The gray levels are needed to hash the masks of stacked levels")
+        for threshold in args.levels[:-1]:
+            for strip in mask_strips(gray.shape[0]):
+                digest.update(np.packbits(gray[strip] < threshold, axis=None).tobytes())
+    return digest.hexdigest()
+
+
+def load_cached_decomposition(cache_dir: str, key: str) -> Optional[Dict[str, Optional[list]]]:
+    """
+    Read a cached decomposition result and mark it as recently used.
+
+    Args:
+        cache_dir: Cache directory
+        key: Cache key from compute_cache_key()
+
+    Returns:
+        The result as returned by decompose_baseplate(), or None on a miss
+    """
+    path = os.path.join(cache_dir, f"{key}.json")
+    try:
+        with open(path, 'r') as f:
+            stored = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    # The file's mtime is its last-use time for LRU eviction
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+    return {
+        name: [tuple(rect) for rect in rects] if rects is not None else None
+        for name, rects in stored.items()
+    }
+
+
+def store_cached_decomposition(cache_dir: str, key: str, result: Dict[str, Optional[list]], max_bytes: int) -> None:
+    """
+    Write a decomposition result to the cache, evicting least recently used entries.
+
+    Args:
+        cache_dir: Cache directory (created if needed)
+        key: Cache key from compute_cache_key()
+        result: Result as returned by decompose_baseplate()
+        max_bytes: Total size the cache directory may occupy
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, f"{key}.json")
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(result, f)
+    os.replace(temp_path, path)
+
+    entries = []
+    for name in os.listdir(cache_dir):
+        if not name.endswith('.json'):
+            continue
+        try:
+            stat = os.stat(os.path.join(cache_dir, name))
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, name))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, name in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(os.path.join(cache_dir, name))
+        except OSError:
+            continue
+        total -= size
+
+
+def layout_sidecar_path(output_path: str) -> str:
+    """
+    Path of the incremental layout sidecar kept next to an output file.
+
+    Args:
+        output_path: Path of the generated .scad file
+
+    Returns:
+        Sidecar path, e.g. shape.layout.json for shape.scad
+    """
+    return os.path.splitext(output_path)[0] + LAYOUT_SIDECAR_SUFFIX
+
+
+def load_layout_sidecar(path: str, options: Dict[str, object]) -> Optional[Tuple[np.ndarray, Dict[str, Optional[list]]]]:
+    """
+    Read the mask and decomposition of a previous run from a layout sidecar.
+
+    Args:
+        path: Sidecar path from layout_sidecar_path()
+        options: Decomposition options of this run from decomposition_options()
+
+    Returns:
+        Tuple of (mask, result), or None if there is no usable sidecar or it
+        was written with different options
+    """
+    try:
+        with open(path, 'r') as f:
+            stored = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if stored.get('version') != CACHE_FORMAT_VERSION or stored.get('options') != json.loads(json.dumps(options)):
+        return None
+
+    rows, cols = stored['shape']
+    packed = np.frombuffer(base64.b64decode(stored['mask']), dtype=np.uint8)
+    mask = np.unpackbits(packed, count=rows * cols).astype(bool).reshape(rows, cols)
+    result = {
+        name: [tuple(rect) for rect in rects] if rects is not None else None
+        for name, rects in stored['result'].items()
+    }
+    return mask, result
+
+
+def store_layout_sidecar(path: str, binary_mask: np.ndarray, options: Dict[str, object], result: Dict[str, Optional[list]]) -> None:
+    """
+    Write the mask and decomposition of this run to a layout sidecar.
+
+    Args:
+        path: Sidecar path from layout_sidecar_path()
+        binary_mask: 2D boolean array where True = inside shape
+        options: Decomposition options from decomposition_options()
+        result: Result as returned by decompose_baseplate()
+    """
+    stored = {
+        'version': CACHE_FORMAT_VERSION,
+        'options': options,
+        'shape': list(binary_mask.shape),
+        'mask': base64.b64encode(np.packbits(np.asarray(binary_mask, dtype=bool), axis=None).tobytes()).decode('ascii'),
+        'result': result,
+    }
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(stored, f)
+    os.replace(temp_path, path)
+
+
+def recomputed_area_fractions(previous_result: Dict[str, Optional[list]], result: Dict[str, Optional[list]]) -> Dict[str, float]:
+    """
+    Share of each layer's area covered by rectangles that were not reused.
+
+    Args:
+        previous_result: Result of the previous run
+        result: Result of the incremental run
+
+    Returns:
+        Dictionary mapping each non-empty layer name to a fraction in [0, 1]
+    """
+    fractions = {}
+    for name, rects in result.items():
+        if not rects:
+            continue
+        reused = set(previous_result.get(name) or [])
+        total = sum(w * h for (_, _, w, h) in rects)
+        recomputed = sum(w * h for (x, y, w, h) in rects if (x, y, w, h) not in reused)
+        fractions[name] = recomputed / total if total else 0.0
+    return fractions
+
+
+def store_profile(profile: Dict[str, object], path: str, image_path: str) -> Optional[str]:
+    """
+    Write a pipeline profile as JSON, and the cProfile statistics of its
+    slowest stage if they were collected.
+
+    Args:
+        profile: Profile from new_profile() after the run
+        path: Path of the JSON file; the statistics go next to it with
+              PROFILE_STATS_SUFFIX instead of PROFILE_SIDECAR_SUFFIX
+        image_path: Input image the profile belongs to
+
+    Returns:
+        Path of the cProfile statistics file, or None if none was written
+    """
+    stages = profile['stages']
+    stats_path = None
+    slowest_name = max(stages, key=lambda record: record['wall_s'])['stage'] if stages else None
+    if profile['slowest'] is not None:
+        stats_path = path[:-len(PROFILE_SIDECAR_SUFFIX)] + PROFILE_STATS_SUFFIX
+        profile['slowest'][2].dump_stats(stats_path)
+
+    with open(path, 'w') as f:
+        json.dump({
+            'image': image_path,
+            'total_wall_s': round(sum(record['wall_s'] for record in stages), 6),
+            'total_cpu_s': round(sum(record['cpu_s'] for record in stages), 6),
+            'peak_mb': max((record.get('peak_mb', 0.0) for record in stages), default=0.0),
+            'slowest_stage': slowest_name,
+            'cprofile_stats': os.path.basename(stats_path) if stats_path else None,
+            'stages': stages,
+        }, f, indent=2)
+    return stats_path
+
+
+def print_profile_table(profile: Dict[str, object]) -> None:
+    """
+    Print the stages of a pipeline profile as a table.
+
+    Args:
+        profile: Profile from new_profile() after the run
+    """
+    stages = profile['stages']
+    total_wall = sum(record['wall_s'] for record in stages)
+    print(f"\n{'Stage':<20} {'Wall (s)':>9} {'CPU (s)':>9} {'Peak (MB)':>10}  Details")
+    for record in stages:
+        details = ", ".join(f"{key}={value}" for key, value in record.items()
+                            if key not in ('stage', 'wall_s', 'cpu_s', 'peak_mb'))
+        print(f"{record['stage']:<20} {record['wall_s']:>9.4f} {record['cpu_s']:>9.4f} {record.get('peak_mb', 0.0):>10.2f}  {details}")
+    print(f"{'total':<20} {total_wall:>9.4f} {sum(record['cpu_s'] for record in stages):>9.4f}")
+
+
+def discard_log(*args, **kwargs) -> None:
+    """Log function that drops every message, for silent library use."""
+
+
+def image_to_mask(image: Union[np.ndarray, Image.Image, str, io.IOBase], threshold: int = 128, stream_png: bool = False) -> np.ndarray:
+    """
+    Convert an image into a binary shape mask.
+
+    Args:
+        image: Boolean array (used as is), 2D grayscale or 3D RGB(A) uint8
+               array, PIL image, or path or binary file object of an image file
+        threshold: Grayscale threshold (0-255). Pixels darker than this are "inside"
+        stream_png: Decode non-interlaced PNG files with read_png_gray_strips()
+
+    Returns:
+        2D numpy array of booleans (True = inside shape, False = outside)
+
+    Raises:
+        ValueError: If an array is neither 2D nor a 3D color image
+    """
+    if isinstance(image, np.ndarray):
+        if image.ndim == 2:
+            return image if image.dtype == bool else image < threshold
+        if image.ndim != 3:
+            raise ValueError(f"Expected a 2D mask or grayscale image or a 3D color image, got shape {image.shape}")
+        image = Image.fromarray(image)
+    if isinstance(image, Image.Image):
+        if image.mode != 'L':
+            image = image.convert('L')
+        return np.array(image) < threshold
+    return load_and_threshold_image(image, threshold, stream_png=stream_png)
+
+
+def image_to_grayscale(image: Union[np.ndarray, Image.Image, str, io.IOBase], stream_png: bool = False) -> np.ndarray:
+    """
+    Convert an image into 8-bit gray levels for multi-level thresholding.
+
+    Args:
+        image: 2D grayscale or 3D RGB(A) array, PIL image, or path or binary
+               file object of an image file or numeric .npy array
+        stream_png: Decode non-interlaced PNG files with read_png_gray_strips()
+
+    Returns:
+        2D uint8 array of gray levels (0 = black)
+
+    Raises:
+        ValueError: If the image is a boolean mask, or an array is neither 2D nor a 3D color image
+    """
+    if isinstance(image, np.ndarray):
+        if image.dtype == bool:
+            raise ValueError("A boolean mask has no gray levels")
+        if image.ndim == 2:
+            return image if image.dtype == np.uint8 else np.clip(image, 0, 255).astype(np.uint8)
+        if image.ndim != 3:
+            raise ValueError(f"Expected a 2D grayscale image or a 3D color image, got shape {image.shape}")
+        image = Image.fromarray(image)
+    if isinstance(image, Image.Image):
+        return np.array(image if image.mode == 'L' else image.convert('L'))
+    return load_grayscale_image(image, stream_png)
+
+
+@dataclass
+class BaseplatePlan:
+    """
+    Decomposed layout of one shape, rendered to an OpenSCAD script on request.
+
+    Baseplate and interior rectangles are (x, y, width, height) in brick
+    units, border/frame rectangles (x_mm, y_mm, width_mm, height_mm) in
+    millimeters, both in image coordinates (Y=0 at the top). With --levels,
+    levels holds the (threshold, rectangles) of the baseplate levels stacked
+    on top of the baseplates, bottom to top.
+    """
+    mask: np.ndarray
+    rectangles: List[Tuple[int, int, int, int]]
+    interior_rectangles: Optional[List[Tuple[int, int, int, int]]]
+    border_rectangles: Optional[List[Tuple[float, float, float, float]]]
+    border_rectangles_top: Optional[List[Tuple[float, float, float, float]]]
+    unit_size: float
+    config: Dict[str, float]
+    args: argparse.Namespace
+    cost_model: Dict[str, float]
+    stats: Dict[str, object] = field(default_factory=dict)
+    levels: List[Tuple[int, List[Tuple[int, int, int, int]]]] = field(default_factory=list)
+
+    @classmethod
+    def from_decomposition(cls, mask: np.ndarray, result: Dict[str, Optional[list]], args: argparse.Namespace,
+                           config: Dict[str, float], unit_size: float, cost_model: Dict[str, float],
+                           levels: Optional[List[Tuple[int, List[Tuple[int, int, int, int]]]]] = None) -> 'BaseplatePlan':
+        """
+        Build a plan from a decompose_baseplate() result and fill in its statistics.
+
+        Args:
+            mask: 2D boolean array the result was decomposed from
+            result: Dictionary returned by decompose_baseplate()
+            args: Options the result was decomposed with
+            config: Parsed OpenSCAD config dictionary
+            unit_size: Size of one brick unit in mm
+            cost_model: Render cost coefficients
+            levels: Optional (threshold, rectangles) of stacked levels, bottom to top
+
+        Returns:
+            New plan
+        """
+        plan = cls(mask, result['rectangles'], result['interior_rectangles'], result['border_rectangles'],
+                   result['border_rectangles_top'], unit_size, config, args, cost_model, levels=levels or [])
+        level_rectangles = [rectangles for _, rectangles in plan.levels]
+        cube_count = sum(len(r) for r in (plan.interior_rectangles, plan.border_rectangles, plan.border_rectangles_top) if r)
+        plan.stats = {
+            'image_width': int(mask.shape[1]),
+            'image_height': int(mask.shape[0]),
+            'inside_cells': int(np.count_nonzero(mask)),
+            'plates': len(plan.rectangles) + sum(len(rectangles) for rectangles in level_rectangles),
+            'level_plates': [len(rectangles) for rectangles in level_rectangles],
+            'interior_cubes': len(plan.interior_rectangles) if plan.interior_rectangles else 0,
+            'border_cubes': sum(len(r) for r in (plan.border_rectangles, plan.border_rectangles_top) if r),
+            'predicted_cost': predict_stacked_render_cost(plan.rectangles, level_rectangles, cube_count, cost_model),
+        }
+        return plan
+
+    def decomposition(self) -> Dict[str, Optional[list]]:
+        """
+        The rectangles of the plan in the layout of a decompose_baseplate() result.
+
+        Returns:
+            Dictionary with 'rectangles', 'interior_rectangles',
+            'border_rectangles' and 'border_rectangles_top'
+        """
+        return {
+            'rectangles': self.rectangles,
+            'interior_rectangles': self.interior_rectangles,
+            'border_rectangles': self.border_rectangles,
+            'border_rectangles_top': self.border_rectangles_top,
+        }
+
+    def render(self, output: Optional[Union[str, TextIO]] = None, cube_mesh_path: Optional[str] = None,
+               log: Callable[..., None] = discard_log, profile: Optional[Dict[str, object]] = None) -> Optional[str]:
+        """
+        Render the plan as an OpenSCAD script, with the script options
+        (compact, center, debug, borderStyle, meshCubes, shards) of the plan.
+
+        Args:
+            output: None to return the script as a string, or a file path,
+                    STDOUT_PATH or an open text handle to write it to
+            cube_mesh_path: Mesh file of the cubes with meshCubes; derived from
+                            the output path if not given
+            log: Function the statistics are printed with
+            profile: Optional profile from new_profile() to record the stages in
+
+        Returns:
+            The script if output is None, otherwise None
+
+        Raises:
+            ValueError: If meshCubes or shards are set without an output file path
+        """
+        if self.args.meshCubes is not None and cube_mesh_path is None:
+            if not isinstance(output, str) or output == STDOUT_PATH:
+                raise ValueError("meshCubes needs an output file path or cube_mesh_path to write the mesh to")
+            cube_mesh_path = f"{os.path.splitext(output)[0]}.cubes.{self.args.meshCubes}"
+
+        script = io.StringIO() if output is None else output
+        generate_openscad_script(
+            self.rectangles,
+            script,
+            debug=self.args.debug,
+            image_height=self.mask.shape[0],
+            interior_rectangles=self.interior_rectangles,
+            border_rectangles=self.border_rectangles,
+            border_rectangles_top=self.border_rectangles_top,
+            border_thickness_mm=self.args.border if self.args.border is not None else 0.0,
+            border_height_adjust_mm=self.args.borderHeightAdjust,
+            unit_size=self.unit_size,
+            config_path=self.args.config,
+            is_frame_mode=self.args.frame,
+            config=self.config,
+            center=self.args.center,
+            image_width=self.mask.shape[1],
+            cost_model=self.cost_model,
+            compact=self.args.compact,
+            cube_mesh_path=cube_mesh_path,
+            shards=self.args.shards,
+            border_style=self.args.borderStyle,
+            level_rectangles=[rectangles for _, rectangles in self.levels],
+            profile=profile,
+            log=log
+        )
+        return script.getvalue() if output is None else None
+
+
+def plan_baseplate(image: Union[np.ndarray, Image.Image, str, io.IOBase],
+                   config: Union[str, Dict[str, float]] = 'machineblocks/config/config-default.scad',
+                   include_path: Optional[str] = None,
+                   previous: Optional[BaseplatePlan] = None,
+                   **options) -> BaseplatePlan:
+    """
+    Decompose a shape into baseplates and cubes without printing or writing files.
+
+    Example:
+        plan = plan_baseplate(mask, 'configs/config-nano.scad', border=3, compact=True)
+        scad = plan.render()
+
+    Args:
+        image: Shape as accepted by image_to_mask() (boolean mask, array, PIL
+               image, or image file path/object)
+        config: Path of an OpenSCAD config file (parsed once per path and
+                modification time) or an already parsed config dictionary
+        include_path: Config path written to the script's include line when
+                      config is a dictionary (default: the default config path)
+        previous: Optional earlier plan; if it was made with the same
+                  decomposition options, only the parts around changed cells
+                  are decomposed again
+        **options: Command line options by their option name, e.g. edge=2,
+                   border=3.0, borderHeightAdjust=1.5, frame=True,
+                   decompose='optimal', compact=True, threshold=100
+
+    Returns:
+        BaseplatePlan with the rectangles, unit size and statistics
+
+    Raises:
+        ValueError: If an option is unknown or invalid, or the config is
+                    missing required values
+        FileNotFoundError: If a config or image file does not exist
+    """
+    # Options go through the command line parser, so they are converted and
+    # checked exactly like on the command line
+    argv = []
+    for name, value in options.items():
+        if name in CLI_ONLY_OPTIONS:
+            raise ValueError(f"Unknown option: {name}")
+        if value is True:
+            argv.append(f"--{name}")
+        elif value is not None and value is not False:
+            argv.append(f"--{name}={value}")
+    parser = build_argument_parser(JobArgumentParser)
+    args = parser.parse_args(argv)
+    validate_arguments(parser, args)
+
+    if isinstance(config, dict):
+        missing = [name for name in ('unitMbu', 'unitGrid', 'scale') if name not in config]
+        if missing:
+            raise ValueError(f"Config is missing required values: {', '.join(missing)}")
+        if include_path is not None:
+            args.config = include_path
+        config_dict = config
+        config_loader = lambda config_path: config_dict
+    else:
+        args.config = config
+        config_loader = load_config_memoised
+    config, unit_size, cost_model = load_run_config(parser, args, config_loader, log=discard_log)
+
+    levels = None
+    previous_layout = None
+    if args.levels:
+        mask, levels, previous_layout = decompose_level_stack(image_to_grayscale(image, args.streamPng), args, cost_model, log=discard_log)
+    else:
+        mask = image_to_mask(image, args.threshold, args.streamPng)
+    if previous is not None and decomposition_options(previous.args, previous.config, previous.unit_size, previous.cost_model) == \
+            decomposition_options(args, config, unit_size, cost_model):
+        previous_layout = (previous.mask, previous.decomposition())
+    result = decompose_baseplate(mask, args, config, unit_size, cost_model, previous_layout, log=discard_log)
+    return BaseplatePlan.from_decomposition(mask, result, args, config, unit_size, cost_model, levels)
+
+
+def generate_baseplate(image_path: str, output_path: Union[str, TextIO], args: argparse.Namespace, config: Dict[str, float], unit_size: float, cost_model: Optional[Dict[str, float]] = None) -> Dict[str, int]:
+    """
+    Run the full pipeline for one image and write its OpenSCAD script.
+
+    Args:
+        image_path: Path to the input PNG image
+        output_path: Path to save the generated .scad file, or an open text handle
+        args: Parsed command line options (threshold, edge, border, ...)
+        config: Parsed OpenSCAD config dictionary
+        unit_size: Size of one brick unit in mm
+        cost_model: Optional render cost coefficients
+
+    Returns:
+        Dictionary with the number of baseplates, interior cubes and border
+        cubes, whether the decomposition came from the cache and whether it
+        was an incremental update of a previous layout
+    """
+    # With --profile every stage is measured; tracemalloc is started here
+    # unless it is already tracing
+    profile = None
+    started_tracing = False
+    if args.profile or args.profileStats:
+        profile = new_profile(cprofile=args.profileStats)
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            started_tracing = True
+
+    # Step 1: Load and threshold the image. With --levels the gray levels are
+    # kept, and the stacked levels are decomposed from them in one pass.
+    print(f"Loading image: {image_path}")
+    levels = None
+    level_previous = None
+    if args.levels:
+        with profile_stage(profile, 'load') as record:
+            gray = load_grayscale_image(image_path, args.streamPng)
+            record['image'] = f"{gray.shape[1]}x{gray.shape[0]}"
+        print(f"Stacking {len(args.levels)} levels at thresholds {', '.join(str(t) for t in args.levels)}")
+        with profile_stage(profile, 'levels') as record:
+            binary_mask, levels, level_previous = decompose_level_stack(gray, args, cost_model)
+            record['levels'] = len(args.levels)
+            record['rectangles'] = sum(len(rectangles) for _, rectangles in levels)
+    else:
+        gray = None
+        binary_mask = load_and_threshold_image(image_path, args.threshold, profile, args.streamPng)
+    print(f"Image size: {binary_mask.shape[1]}x{binary_mask.shape[0]} pixels")
+    print(f"Pixels inside shape: {np.sum(binary_mask)}")
+
+    # In incremental mode, start from the previous run's layout if its
+    # options match
+    sidecar_path = None
+    previous = None
+    if args.incremental:
+        sidecar_path = layout_sidecar_path(output_path)
+        options = decomposition_options(args, config, unit_size, cost_model)
+        previous = load_layout_sidecar(sidecar_path, options)
+
+    # Step 2: Decompose into rectangles, reusing a cached result if possible.
+    # Incremental updates depend on the previous layout, not only on the
+    # mask, so they bypass the cache.
+    cache_key = None
+    result = None
+    if not args.no_cache and previous is None:
+        with profile_stage(profile, 'cache lookup') as record:
+            cache_key = compute_cache_key(binary_mask, args, config, unit_size, cost_model, gray)
+            result = load_cached_decomposition(args.cacheDir, cache_key)
+            record['hit'] = result is not None
+    del gray
+
+    cache_hit = result is not None
+    if cache_hit:
+        print(f"\nUsing cached decomposition ({cache_key[:12]})")
+    else:
+        result = decompose_baseplate(binary_mask, args, config, unit_size, cost_model,
+                                     previous if previous is not None else level_previous, profile)
+        if previous is not None:
+            fractions = recomputed_area_fractions(previous[1], result)
+            changed_cells = int(np.count_nonzero(previous[0] != binary_mask)) if previous[0].shape == binary_mask.shape else binary_mask.size
+            print(f"\nIncremental update: {changed_cells} changed cells")
+            labels = {
+                'rectangles': 'baseplate',
+                'interior_rectangles': 'interior cube',
+                'border_rectangles': 'border',
+                'border_rectangles_top': 'border top layer',
+            }
+            for name, fraction in fractions.items():
+                print(f"  Recomputed {fraction * 100:.1f}% of {labels[name]} area")
+        if cache_key is not None:
+            try:
+                store_cached_decomposition(args.cacheDir, cache_key, result, int(args.cacheSize * 1024 * 1024))
+            except OSError as e:
+                print(f"Warning: could not write decomposition cache: {e}", file=sys.stderr)
+
+    if sidecar_path is not None:
+        try:
+            store_layout_sidecar(sidecar_path, binary_mask, options, result)
+        except OSError as e:
+            print(f"Warning: could not write layout sidecar: {e}", file=sys.stderr)
+
+    plan = BaseplatePlan.from_decomposition(binary_mask, result, args, config, unit_size, cost_model, levels)
+
+    # Cube-only regions can go to a mesh file next to the script
+    cube_mesh_path = None
+    if args.meshCubes is not None:
+        base_path = output_path if isinstance(output_path, str) else image_path
+        cube_mesh_path = f"{os.path.splitext(base_path)[0]}.cubes.{args.meshCubes}"
+
+    # Step 3: Generate OpenSCAD script
+    print("\nGenerating OpenSCAD script...")
+    if args.debug:
+        print("Debug mode enabled: Using random colors for each baseplate")
+    plan.render(output_path, cube_mesh_path, log=print, profile=profile)
+
+    if profile is not None:
+        if started_tracing:
+            tracemalloc.stop()
+        print_profile_table(profile)
+        base_path = output_path if isinstance(output_path, str) and output_path != STDOUT_PATH else image_path
+        profile_path = f"{os.path.splitext(base_path)[0]}{PROFILE_SIDECAR_SUFFIX}"
+        try:
+            stats_path = store_profile(profile, profile_path, image_path)
+            print(f"Profile written: {profile_path}")
+            if stats_path is not None:
+                print(f"cProfile statistics of the slowest stage ({profile['slowest'][1]}) written: {stats_path}")
+        except OSError as e:
+            print(f"Warning: could not write profile: {e}", file=sys.stderr)
+
+    return {
+        'plates': plan.stats['plates'],
+        'interior_cubes': plan.stats['interior_cubes'],
+        'border_cubes': plan.stats['border_cubes'],
+        'cache_hit': cache_hit,
+        'incremental': previous is not None,
+    }
+
+
+def run_threshold_sweep(image_path: str, args: argparse.Namespace, cost_model: Optional[Dict[str, float]] = None) -> List[Tuple[int, int, int]]:
+    """
+    Print the number of baseplates at every threshold from 0 to 255.
+
+    Thresholds with the same mask are printed as one range.
+
+    Args:
+        image_path: Path to the input image or numeric .npy array
+        args: Parsed command line options (decompose, engine, ...)
+        cost_model: Optional render cost coefficients
+
+    Returns:
+        List of (threshold, inside cells, baseplates) from threshold_sweep()
+    """
+    print(f"Loading image: {image_path}")
+    gray = load_grayscale_image(image_path, args.streamPng)
+    print(f"Image size: {gray.shape[1]}x{gray.shape[0]} pixels")
+    start = time.perf_counter()
+    counts = threshold_sweep(gray, args, cost_model)
+    elapsed = time.perf_counter() - start
+
+    print(f"\nBaseplates per threshold ({args.decompose} decomposition):")
+    print(f"{'threshold':>11}  {'pixels':>10}  {'plates':>8}")
+    start_threshold = 0
+    for index, (threshold, inside_cells, plates) in enumerate(counts):
+        if index + 1 < len(counts) and counts[index + 1][1] == inside_cells:
+            continue
+        label = str(threshold) if threshold == start_threshold else f"{start_threshold}-{threshold}"
+        print(f"{label:>11}  {inside_cells:>10}  {plates:>8}")
+        start_threshold = threshold + 1
+    print(f"\nSwept {len(counts)} thresholds in {elapsed:.2f}s")
+    return counts
+
+
+# Shared state of batch worker processes, set once per worker by
+# init_batch_worker() so the parsed config is not re-sent with every image
+batch_worker_state = {}
+
+
+def find_batch_images(pattern: str) -> List[str]:
+    """
+    Expand a batch input into a sorted list of image paths.
+
+    Args:
+        pattern: Directory (all PNG files and raw masks in it are used, with
+                 extensions matched case-insensitively) or glob pattern
+
+    Returns:
+        Sorted list of image paths
+    """
+    if os.path.isdir(pattern):
+        extensions = ('.png',) + RAW_MASK_EXTENSIONS
+        return sorted(path for path in (os.path.join(pattern, name) for name in os.listdir(pattern))
+                      if os.path.splitext(path)[1].lower() in extensions and os.path.isfile(path))
+    return sorted(path for path in glob.glob(pattern) if os.path.isfile(path))
+
+
+def init_batch_worker(args: argparse.Namespace, config: Dict[str, float], unit_size: float, cost_model: Dict[str, float]) -> None:
+    """Store the options and parsed config shared by every job of a batch worker."""
+    batch_worker_state.update(args=args, config=config, unit_size=unit_size, cost_model=cost_model)
+
+
+def run_batch_job(image_path: str) -> Tuple[str, str, Optional[Dict[str, int]], Optional[str]]:
+    """
+    Generate the OpenSCAD script for one image of a batch.
+
+    Progress output is silenced and any failure is returned instead of raised,
+    so one broken image does not stop the batch.
+
+    Args:
+        image_path: Path to the input PNG image
+
+    Returns:
+        Tuple of (image_path, output_path, stats or None, error message or None)
+    """
+    output_path = f"{os.path.splitext(image_path)[0]}.scad"
+    state = batch_worker_state
+    try:
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            stats = generate_baseplate(image_path, output_path, state['args'], state['config'], state['unit_size'], state['cost_model'])
+        return (image_path, output_path, stats, None)
+    except Exception as e:
+        return (image_path, output_path, None, f"{type(e).__name__}: {e}")
+
+
+def run_batch_pool(images: List[str], workers: int, initargs: tuple,
+                   record: Callable[[Tuple[str, str, Optional[Dict[str, int]], Optional[str]]], None]) -> List[str]:
+    """
+    Run batch jobs for images in one worker pool and record every finished job.
+
+    A job whose future raises (e.g. its result could not be pickled) is
+    recorded as failed. If a worker process dies, the pool is broken and every
+    job that did not finish is returned instead of recorded.
+
+    Args:
+        images: Image paths to process
+        workers: Number of worker processes
+        initargs: Arguments passed to init_batch_worker() in every worker
+        record: Called with the (image_path, output_path, stats, error) tuple of each finished job
+
+    Returns:
+        Image paths left unfinished by a broken pool, in input order
     """
+    unfinished = set()
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_batch_worker, initargs=initargs) as pool:
+        futures = {}
+        for image_path in images:
+            try:
+                futures[pool.submit(run_batch_job, image_path)] = image_path
+            except BrokenProcessPool:
+                unfinished.add(image_path)
+        for future in as_completed(futures):
+            image_path = futures[future]
+            try:
+                result = future.result()
+            except BrokenProcessPool:
+                unfinished.add(image_path)
+                continue
+            except Exception as e:
+                result = (image_path, f"{os.path.splitext(image_path)[0]}.scad", None, f"{type(e).__name__}: {e}")
+            record(result)
+    return [image_path for image_path in images if image_path in unfinished]
 
-    script_lines = [
-        "/**",
-        " * Generated Irregular Baseplate",
-        " * Auto-generated from PNG image",
-        " */",
-        "",
-        "// Imports",
-        "use <machineblocks/lib/block.scad>;",
-        f"include <{config_path}>;",
-        "",
-    ]
 
-    # Calculate centering offset if needed
-    center_x = 0.0
-    center_y = 0.0
-    if center:
-        # Calculate the center offset based on image dimensions
-        # Account for border/frame if present
-        if border_rectangles:
-            # Find the bounding box of all border rectangles
-            all_rects = border_rectangles[:]
-            if border_rectangles_top:
-                all_rects.extend(border_rectangles_top)
+def run_batch(args: argparse.Namespace, config: Dict[str, float], unit_size: float, cost_model: Dict[str, float]) -> None:
+    """
+    Process every image matched by args.image in a pool of worker processes.
 
-            min_x = min(x for x, _, _, _ in all_rects)
-            max_x = max(x + w for x, _, w, _ in all_rects)
-            min_y = min(y for _, y, _, _ in all_rects)
-            max_y = max(y + h for _, y, _, h in all_rects)
+    Each image is written next to its source exactly as the single-image mode
+    would write it. A throughput summary is printed at the end.
 
-            # Calculate center offset (in OpenSCAD coordinates, Y is already flipped in rectangles)
-            total_width_mm = max_x - min_x
-            total_height_mm = max_y - min_y
-            center_x = -(min_x + total_width_mm / 2)
-            center_y = -(image_height * unit_size - min_y - total_height_mm / 2)
+    If a worker process dies (e.g. killed for running out of memory), the
+    images that did not finish are retried one at a time in a fresh
+    single-worker pool each, so only the image that kills its worker again is
+    reported as failed.
+
+    Args:
+        args: Parsed command line options, args.image is the directory or glob
+        config: Parsed OpenSCAD config dictionary
+        unit_size: Size of one brick unit in mm
+        cost_model: Render cost coefficients
+    """
+    images = find_batch_images(args.image)
+    if not images:
+        print(f"Error: No images found for batch input '{args.image}'.", file=sys.stderr)
+        sys.exit(1)
+
+    workers = args.workers or os.cpu_count() or 1
+    print(f"\nBatch mode: {len(images)} images, {workers} workers")
+
+    start = time.perf_counter()
+    totals = {'failed': 0, 'plates': 0, 'cache_hits': 0}
+
+    def record(result: Tuple[str, str, Optional[Dict[str, int]], Optional[str]]) -> None:
+        image_path, output_path, stats, error = result
+        if error is not None:
+            totals['failed'] += 1
+            print(f"  [failed] {image_path}: {error}", file=sys.stderr)
         else:
-            # Center based on image dimensions
-            center_x = -(image_width * unit_size / 2)
-            center_y = -(image_height * unit_size / 2)
+            totals['plates'] += stats['plates']
+            totals['cache_hits'] += stats['cache_hit']
+            print(f"  [ok] {image_path} -> {output_path} ({stats['plates']} baseplates)")
+
+    initargs = (args, config, unit_size, cost_model)
+    unfinished = run_batch_pool(images, workers, initargs, record)
+    if unfinished:
+        print(f"  A worker process died, retrying {len(unfinished)} unfinished images one at a time", file=sys.stderr)
+        for image_path in unfinished:
+            if run_batch_pool([image_path], 1, initargs, record):
+                record((image_path, f"{os.path.splitext(image_path)[0]}.scad", None, "worker process died"))
+    elapsed = time.perf_counter() - start
+
+    failed = totals['failed']
+    print(f"\nBatch finished: {len(images) - failed} succeeded, {failed} failed in {elapsed:.2f}s")
+    print(f"Throughput: {len(images) / elapsed:.2f} images/s")
+    print(f"Total baseplates: {totals['plates']}")
+    if not args.no_cache:
+        print(f"Decomposition cache: {totals['cache_hits']} hits, {len(images) - failed - totals['cache_hits']} misses")
+
+    if failed:
+        sys.exit(1)
 
-        script_lines.append(f"// Model centered at origin")
-        script_lines.append(f"translate([{center_x:.4f}, {center_y:.4f}, 0]) {{")
-        script_lines.append("")
 
-    if interior_rectangles:
-        script_lines.append("// Edge baseplates")
-    else:
-        script_lines.append("// Generate all baseplates")
+class JobArgumentParser(argparse.ArgumentParser):
+    """Argument parser for server jobs: option errors raise ValueError instead of exiting."""
 
-    for i, (x, y, width, height) in enumerate(rectangles):
-        # Calculate the translation position
-        # Each unit in the grid corresponds to 8mm
-        # NOTE: Y-axis needs to be flipped because image Y=0 is at top, but OpenSCAD Y=0 is at bottom
-        translate_x = x * unit_size
-        translate_y = (image_height - y - height) * unit_size
+    def error(self, message: str):
+        raise ValueError(message)
 
-        script_lines.append(f"\n// Baseplate {i + 1}: {width}x{height} at position ({x}, {y})")
 
-        # Wrap with color() if in debug mode
-        if debug:
-            hex_color = generate_random_color()
-            openscad_color = hex_to_openscad_rgb(hex_color)
-            script_lines.append(f"color({openscad_color}) {{")
-
-        script_lines.append(f"translate([{translate_x}, {translate_y}, 0]) {{")
-        script_lines.append("    machineblock(")
-        script_lines.append(f"        size = [{width}, {height}, 1],")
-        script_lines.append("        baseCutoutType = \"none\",")
-        script_lines.append("        studs = true,")
-        script_lines.append("        studType = \"solid\",")
-        script_lines.append("        studIcon = \"none\",")
-        script_lines.append("        pillars = false,")
-        script_lines.append("        ")
-        script_lines.append("        // Config parameters")
-        script_lines.append("        unitMbu = unitMbu,")
-        script_lines.append("        unitGrid = unitGrid,")
-        script_lines.append("        scale = scale,")
-        script_lines.append("        baseHeightAdjustment = baseHeightAdjustment,")
-        script_lines.append("        baseSideAdjustment = 0,  // Set to 0 to eliminate gaps between baseplates")
-        script_lines.append("        baseWallThicknessAdjustment = baseWallThicknessAdjustment,")
-        script_lines.append("        baseClampThickness = baseClampThickness,")
-        script_lines.append("        tubeXDiameterAdjustment = tubeXDiameterAdjustment,")
-        script_lines.append("        tubeYDiameterAdjustment = tubeYDiameterAdjustment,")
-        script_lines.append("        tubeZDiameterAdjustment = tubeZDiameterAdjustment,")
-        script_lines.append("        holeXDiameterAdjustment = holeXDiameterAdjustment,")
-        script_lines.append("        holeYDiameterAdjustment = holeYDiameterAdjustment,")
-        script_lines.append("        holeZDiameterAdjustment = holeZDiameterAdjustment,")
-        script_lines.append("        pinDiameterAdjustment = pinDiameterAdjustment,")
-        script_lines.append("        studDiameterAdjustment = studDiameterAdjustment,")
-        # Only include studHeight if it exists in the config
-        if config and 'studHeight' in config:
-            script_lines.append("        studHeight = studHeight,")
-        script_lines.append("        studCutoutAdjustment = studCutoutAdjustment,")
-        script_lines.append("        previewRender = previewRender,")
-        script_lines.append("        previewQuality = previewQuality,")
-        script_lines.append("        baseRoundingResolution = roundingResolution,")
-        script_lines.append("        holeRoundingResolution = roundingResolution,")
-        script_lines.append("        studRoundingResolution = roundingResolution,")
-        script_lines.append("        pillarRoundingResolution = roundingResolution")
-        script_lines.append("    );")
-        script_lines.append("}")
+# Parsed configs of a server worker process by (absolute path, mtime), so a
+# config file is only parsed again after it changed
+server_config_memo = {}
 
-        # Close color() wrapper if in debug mode
-        if debug:
-            script_lines.append("}")
+# Settings of a server worker process, set once by init_server_worker()
+server_worker_settings = {}
 
-    # Generate interior cubes if provided
-    if interior_rectangles:
-        script_lines.append("\n// Interior fill (cubes)")
-        for i, (x, y, width, height) in enumerate(interior_rectangles):
-            # Calculate the translation position (same as baseplates)
-            translate_x = x * unit_size
-            translate_y = (image_height - y - height) * unit_size
 
-            script_lines.append(f"\n// Interior cube {i + 1}: {width}x{height} at position ({x}, {y})")
+def init_server_worker(root: str, cache_dir: str, cache_size: float) -> None:
+    """
+    Prepare a server worker process: jobs run inside root and use the server's cache.
 
-            # Wrap with color() if in debug mode
-            if debug:
-                hex_color = generate_random_color()
-                openscad_color = hex_to_openscad_rgb(hex_color)
-                script_lines.append(f"color({openscad_color}) {{")
-
-            script_lines.append(f"translate([{translate_x}, {translate_y}, 0]) {{")
-            script_lines.append("    cube([")
-            script_lines.append(f"        {width} * unitGrid[0] * unitMbu * scale,")
-            script_lines.append(f"        {height} * unitGrid[0] * unitMbu * scale,")
-            script_lines.append("        1 * unitGrid[1] * unitMbu * scale")
-            script_lines.append("    ]);")
-            script_lines.append("}")
-
-            # Close color() wrapper if in debug mode
-            if debug:
-                script_lines.append("}")
+    Args:
+        root: Directory job paths are resolved against and confined to
+        cache_dir: Decomposition cache directory of the server
+        cache_size: Decomposition cache size of the server in MB
+    """
+    os.chdir(root)
+    server_worker_settings.update(root=os.path.realpath(root), cache_dir=cache_dir, cache_size=cache_size)
 
-    # Generate border/frame cubes if provided (these are in mm coordinates already)
-    if border_rectangles:
-        mode_label = "Frame" if is_frame_mode else "Border"
-        thickness_label = f"padding: {border_thickness_mm}mm" if is_frame_mode else f"thickness: {border_thickness_mm}mm"
 
-        script_lines.append(f"\n// {mode_label} (cubes) - positioned and sized in millimeters")
-        if border_height_adjust_mm > 0 and border_rectangles_top:
-            script_lines.append(f"// {mode_label} {thickness_label}, Two-layer design:")
-            script_lines.append(f"//   Base layer: baseplate height (flush with baseplates)")
-            script_lines.append(f"//   Top layer: {border_height_adjust_mm}mm tall (inset for clearance)")
-        else:
-            script_lines.append(f"// {mode_label} {thickness_label}, Height adjustment: {border_height_adjust_mm}mm")
+def check_job_path(path: str, option: str) -> None:
+    """
+    Reject a job path that could reach outside the server root.
 
-        # Generate base layer
-        script_lines.append(f"\n// {mode_label} base layer")
-        for i, (x_mm, y_mm, width_mm, height_mm) in enumerate(border_rectangles):
-            # Border/frame rectangles are already in mm, but Y needs flipping for OpenSCAD
-            # Convert image-space Y (where 0 is top) to OpenSCAD Y (where 0 is bottom)
-            translate_x = x_mm
-            translate_y = (image_height * unit_size) - y_mm - height_mm
+    Args:
+        path: Path as given by the job, relative to the server root
+        option: Option the path was given with, for the error message
 
-            script_lines.append(f"\n// {mode_label} base cube {i + 1}: {width_mm:.2f}mm x {height_mm:.2f}mm at position ({x_mm:.2f}mm, {y_mm:.2f}mm)")
+    Raises:
+        ValueError: If the path is absolute, contains a '..' segment or
+                    resolves (through symbolic links) outside the server root
+    """
+    root = server_worker_settings.get('root', os.path.realpath(os.getcwd()))
+    if os.path.isabs(path) or os.path.splitdrive(path)[0] or '..' in re.split(r'[\\/]', path):
+        raise ValueError(f"{option} must be a path inside the server root without '..' segments, got {path!r}")
+    if os.path.commonpath([root, os.path.realpath(path)]) != root:
+        raise ValueError(f"{option} resolves outside the server root: {path!r}")
 
-            # Wrap with color() if in debug mode
-            if debug:
-                hex_color = generate_random_color()
-                openscad_color = hex_to_openscad_rgb(hex_color)
-                script_lines.append(f"color({openscad_color}) {{")
-
-            script_lines.append(f"translate([{translate_x:.4f}, {translate_y:.4f}, 0]) {{")
-            script_lines.append("    cube([")
-            script_lines.append(f"        {width_mm:.4f},  // width in mm")
-            script_lines.append(f"        {height_mm:.4f},  // height in mm")
-            if border_height_adjust_mm > 0 and border_rectangles_top:
-                script_lines.append(f"        (1 * unitGrid[1] * unitMbu * scale)  // baseplate height without studs")
-            else:
-                script_lines.append(f"        (1 * unitGrid[1] * unitMbu * scale) + {border_height_adjust_mm}  // baseplate height without studs + adjustment")
-            script_lines.append("    ]);")
-            script_lines.append("}")
 
-            # Close color() wrapper if in debug mode
-            if debug:
-                script_lines.append("}")
+def load_config_memoised(config_path: str) -> Dict[str, float]:
+    """
+    Parse an OpenSCAD config file, reusing the result while the file is unchanged.
 
-    # Generate top layer for border/frame if provided (with clearance)
-    if border_rectangles_top:
-        mode_label = "Frame" if is_frame_mode else "Border"
+    Args:
+        config_path: Path to the .scad config file
 
-        script_lines.append(f"\n// {mode_label} top layer (inset for clearance)")
-        for i, (x_mm, y_mm, width_mm, height_mm) in enumerate(border_rectangles_top):
-            translate_x = x_mm
-            translate_y = (image_height * unit_size) - y_mm - height_mm
+    Returns:
+        Parsed config dictionary (shared, do not modify)
 
-            script_lines.append(f"\n// {mode_label} top cube {i + 1}: {width_mm:.2f}mm x {height_mm:.2f}mm at position ({x_mm:.2f}mm, {y_mm:.2f}mm)")
+    Raises:
+        FileNotFoundError: If config file doesn't exist
+        ValueError: If required variables are missing
+    """
+    if not os.path.exists(config_path):
+        raise FileNotFoundError(f"Config file not found: {config_path}")
+    key = (os.path.abspath(config_path), os.path.getmtime(config_path))
+    if key not in server_config_memo:
+        server_config_memo[key] = parse_openscad_config(config_path)
+    return server_config_memo[key]
 
-            # Wrap with color() if in debug mode
-            if debug:
-                hex_color = generate_random_color()
-                openscad_color = hex_to_openscad_rgb(hex_color)
-                script_lines.append(f"color({openscad_color}) {{")
-
-            script_lines.append(f"translate([{translate_x:.4f}, {translate_y:.4f}, (1 * unitGrid[1] * unitMbu * scale)]) {{")
-            script_lines.append("    cube([")
-            script_lines.append(f"        {width_mm:.4f},  // width in mm")
-            script_lines.append(f"        {height_mm:.4f},  // height in mm")
-            script_lines.append(f"        {border_height_adjust_mm}  // height adjustment")
-            script_lines.append("    ]);")
-            script_lines.append("}")
-
-            # Close color() wrapper if in debug mode
-            if debug:
-                script_lines.append("}")
 
-    # Close centering translate if enabled
-    if center:
-        script_lines.append("")
-        script_lines.append("} // End centering translate")
+def run_server_job(job: Dict[str, object]) -> Tuple[int, Dict[str, object]]:
+    """
+    Run one server job in a worker process.
 
-    # Write the script to file
-    with open(output_path, 'w') as f:
-        f.write('\n'.join(script_lines))
+    A job is a JSON object with 'args' (command line options as main() takes
+    them, optionally including the image path) and either 'image' (path) or
+    'image_base64' (PNG bytes). Without -o the script is returned in the
+    response instead of being written to a file. The image, output, config
+    and cost model paths must lie inside the server root (see
+    check_job_path()), and the decomposition cache is the server's.
 
-    print(f"OpenSCAD script generated: {output_path}")
-    print(f"Total baseplates: {len(rectangles)}")
+    Args:
+        job: Decoded job request
 
-    # Print statistics for baseplates
-    total_area = sum(w * h for _, _, w, h in rectangles)
-    sizes = {}
-    for _, _, w, h in rectangles:
-        size_key = f"{w}x{h}"
-        sizes[size_key] = sizes.get(size_key, 0) + 1
+    Returns:
+        Tuple of (HTTP status, response dictionary with 'ok', 'stats', 'log'
+        and 'scad' or 'output', or 'ok' and 'error')
+    """
+    log = io.StringIO()
+    try:
+        job_args = job.get('args', [])
+        if not isinstance(job_args, list):
+            raise ValueError("'args' must be a list of command line options")
+        parser = build_argument_parser(JobArgumentParser)
+        # The cache belongs to the server; None tells an explicit option apart
+        parser.set_defaults(cacheDir=None, cacheSize=None)
+        args = parser.parse_args([str(arg) for arg in job_args])
+        if args.cacheDir is not None or args.cacheSize is not None:
+            raise ValueError("--cacheDir and --cacheSize are chosen by the server and cannot be used in server jobs")
+        args.cacheDir = server_worker_settings.get('cache_dir', DEFAULT_CACHE_DIR)
+        args.cacheSize = server_worker_settings.get('cache_size', DEFAULT_CACHE_SIZE_MB)
+        if 'image' in job:
+            args.image = str(job['image'])
+        image = args.image
+        if 'image_base64' in job:
+            image = io.BytesIO(base64.b64decode(job['image_base64'], validate=True))
+        validate_arguments(parser, args)
+        if args.batch or args.serve or args.sweep or args.jobs > 1 or args.output == STDOUT_PATH:
+            raise ValueError("--batch, --serve, --sweep, --jobs and -o - cannot be used in server jobs")
+        # Every file a job reads or writes lies inside the server root
+        if 'image_base64' not in job:
+            check_job_path(args.image, 'image')
+        for option, path in (('-o/--output', args.output), ('--config', args.config), ('--costModel', args.costModel)):
+            if path is not None:
+                check_job_path(path, option)
+        writes_sidecars = args.incremental or args.profile or args.profileStats or args.meshCubes is not None or args.shards > 1
+        if args.output is None and writes_sidecars:
+            raise ValueError("--incremental, --profile, --meshCubes and --shards write files next to the output and need -o")
+
+        with contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+            config, unit_size, cost_model = load_run_config(parser, args, load_config_memoised)
+            script = args.output if args.output is not None else io.StringIO()
+            stats = generate_baseplate(image, script, args, config, unit_size, cost_model)
+    except ValueError as e:
+        return 400, {'ok': False, 'error': str(e), 'log': log.getvalue()}
+    except FileNotFoundError as e:
+        return 404, {'ok': False, 'error': str(e), 'log': log.getvalue()}
+    except Exception as e:
+        return 500, {'ok': False, 'error': f"{type(e).__name__}: {e}", 'log': log.getvalue()}
 
-    print(f"Total brick units covered by baseplates: {total_area}")
-    print("\nBaseplate sizes used:")
-    for size, count in sorted(sizes.items(), key=lambda x: x[1], reverse=True):
-        print(f"  {size}: {count} plates")
+    response = {'ok': True, 'stats': stats, 'log': log.getvalue()}
+    if args.output is None:
+        response['scad'] = script.getvalue()
+    else:
+        response['output'] = args.output
+    return 200, response
 
-    # Print statistics for interior cubes if present
-    if interior_rectangles:
-        print(f"\nTotal interior cubes: {len(interior_rectangles)}")
-        interior_area = sum(w * h for _, _, w, h in interior_rectangles)
-        interior_sizes = {}
-        for _, _, w, h in interior_rectangles:
-            size_key = f"{w}x{h}"
-            interior_sizes[size_key] = interior_sizes.get(size_key, 0) + 1
-
-        print(f"Total brick units covered by interior: {interior_area}")
-        print("\nInterior cube sizes used:")
-        for size, count in sorted(interior_sizes.items(), key=lambda x: x[1], reverse=True):
-            print(f"  {size}: {count} cubes")
 
-    # Print statistics for border/frame cubes if present
-    if border_rectangles:
-        mode_label = "frame" if is_frame_mode else "border"
-        thickness_label = "padding" if is_frame_mode else "thickness"
+class ServerJobHandler(BaseHTTPRequestHandler):
+    """
+    HTTP handler of server mode.
+
+    POST /jobs runs a job (see run_server_job) and answers with its result;
+    GET /status reports the worker and queue usage. The server object carries
+    the worker pool ('pool'), the job slots ('slots') and the counters.
+    """
 
-        print(f"\nTotal {mode_label} cubes: {len(border_rectangles)}")
-        border_area_mm2 = sum(w * h for _, _, w, h in border_rectangles)
-        border_sizes = {}
-        for _, _, w, h in border_rectangles:
-            size_key = f"{w:.2f}x{h:.2f}mm"
-            border_sizes[size_key] = border_sizes.get(size_key, 0) + 1
+    def send_json(self, status: int, payload: Dict[str, object]) -> None:
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path != '/status':
+            self.send_json(404, {'ok': False, 'error': f"Unknown path: {self.path}"})
+            return
+        self.send_json(200, {'ok': True, 'workers': self.server.workers, 'queue_size': self.server.queue_size,
+                             'active_jobs': self.server.active_jobs, 'completed_jobs': self.server.completed_jobs})
+
+    def do_POST(self):
+        if self.path != '/jobs':
+            self.send_json(404, {'ok': False, 'error': f"Unknown path: {self.path}"})
+            return
+        length = int(self.headers.get('Content-Length') or 0)
+        if length <= 0 or length > MAX_JOB_REQUEST_BYTES:
+            self.send_json(413 if length > 0 else 400, {'ok': False, 'error': f"Job request must be 1 to {MAX_JOB_REQUEST_BYTES} bytes"})
+            return
+        try:
+            job = json.loads(self.rfile.read(length))
+            if not isinstance(job, dict):
+                raise ValueError("job must be a JSON object")
+        except ValueError as e:
+            self.send_json(400, {'ok': False, 'error': f"Invalid job: {e}"})
+            return
+
+        # Running plus waiting jobs are bounded; beyond that the client retries
+        if not self.server.slots.acquire(blocking=False):
+            self.send_json(503, {'ok': False, 'error': "Server busy: job queue is full"})
+            return
+        try:
+            with self.server.lock:
+                self.server.active_jobs += 1
+            status, response = self.server.pool.submit(run_server_job, job).result()
+        except Exception as e:
+            status, response = 500, {'ok': False, 'error': f"{type(e).__name__}: {e}"}
+        finally:
+            with self.server.lock:
+                self.server.active_jobs -= 1
+                self.server.completed_jobs += 1
+            self.server.slots.release()
+        self.send_json(status, response)
+
+    def log_message(self, format: str, *args) -> None:
+        # Unix socket clients have no address; log the request line only
+        print(f"[{self.log_date_time_string()}] {format % args}", file=sys.stderr)
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """HTTP server on a Unix socket, one thread per connection."""
+
+    daemon_threads = True
+
+
+def is_loopback_host(host: str) -> bool:
+    """
+    Check whether a listen host only accepts connections from this machine.
+
+    Args:
+        host: Host name or IP address ('' means 127.0.0.1)
 
-        print(f"{mode_label.capitalize()} {thickness_label}: {border_thickness_mm}mm, Height adjustment: {border_height_adjust_mm}mm")
-        print(f"Total area covered by {mode_label}: {border_area_mm2:.2f} mm²")
-        print(f"\n{mode_label.capitalize()} cube sizes used (in mm):")
-        for size, count in sorted(border_sizes.items(), key=lambda x: x[1], reverse=True):
-            print(f"  {size}: {count} cubes")
+    Returns:
+        True if every address the host resolves to is a loopback address
+    """
+    if not host:
+        return True
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, None)}
+    except socket.gaierror:
+        return False
+    return bool(addresses) and all(ipaddress.ip_address(address.split('%')[0]).is_loopback for address in addresses)
 
 
-def main():
-    """Main entry point for the script."""
-    parser = argparse.ArgumentParser(
+def run_server(args: argparse.Namespace) -> None:
+    """
+    Serve jobs until interrupted.
+
+    Connections are handled by threads; jobs run in a pool of worker
+    processes that are started once, so every job finds numpy, scipy, PIL
+    and the parsed configs already loaded. The workers run inside the
+    server root, and a TCP address beyond loopback is refused unless
+    --allowRemote is given.
+
+    Args:
+        args: Parsed command line options (listen, workers, queueSize,
+              serveRoot, allowRemote, cacheDir, cacheSize)
+    """
+    workers = args.workers or os.cpu_count() or 1
+    unix_path = args.listen[len(UNIX_SOCKET_PREFIX):] if args.listen.startswith(UNIX_SOCKET_PREFIX) else None
+    if unix_path is None:
+        host = args.listen.rpartition(':')[0]
+        if not is_loopback_host(host) and not args.allowRemote:
+            print(f"Error: '{args.listen}' accepts connections from other machines, which can then read and write "
+                  f"files in {args.serveRoot}; pass --allowRemote to serve on it anyway", file=sys.stderr)
+            sys.exit(1)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_server_worker,
+                             initargs=(args.serveRoot, args.cacheDir, args.cacheSize)) as pool:
+        # Start the workers before any server thread exists
+        pool.submit(int).result()
+
+        if unix_path is not None:
+            if os.path.exists(unix_path):
+                # Only replace a stale socket, never another file
+                if not stat.S_ISSOCK(os.stat(unix_path).st_mode):
+                    print(f"Error: '{unix_path}' exists and is not a socket", file=sys.stderr)
+                    sys.exit(1)
+                os.unlink(unix_path)
+            server = ThreadingUnixHTTPServer(unix_path, ServerJobHandler)
+        else:
+            host, _, port = args.listen.rpartition(':')
+            try:
+                server = ThreadingHTTPServer((host or '127.0.0.1', int(port)), ServerJobHandler)
+            except ValueError:
+                print(f"Error: Invalid listen address '{args.listen}' (expected HOST:PORT, PORT or {UNIX_SOCKET_PREFIX}PATH)", file=sys.stderr)
+                sys.exit(1)
+
+        server.pool = pool
+        server.workers = workers
+        server.queue_size = args.queueSize
+        server.slots = threading.BoundedSemaphore(workers + args.queueSize)
+        server.lock = threading.Lock()
+        server.active_jobs = 0
+        server.completed_jobs = 0
+
+        # Stop on SIGTERM like on Ctrl+C, so a Unix socket is removed
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+        print(f"Serving on {args.listen} with {workers} workers and a queue of {args.queueSize} jobs, "
+              f"files in {os.path.realpath(args.serveRoot)} (Ctrl+C to stop)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            print("\nShutting down")
+        finally:
+            server.server_close()
+            if unix_path is not None and os.path.exists(unix_path):
+                os.unlink(unix_path)
+
+
+def build_argument_parser(parser_class: type = argparse.ArgumentParser) -> argparse.ArgumentParser:
+    """
+    Build the command line parser of the script.
+
+    Args:
+        parser_class: ArgumentParser (sub)class to instantiate; server jobs use
+                      JobArgumentParser so option errors do not exit
+
+    Returns:
+        Parser with every option of the script
+    """
+    parser = parser_class(
         description='Generate OpenSCAD script for irregular-shaped baseplates from PNG images.'
     )
     parser.add_argument(
         'image',
         nargs='?',
         default='image.png',
-        help='Path to input PNG image (default: image.png)'
+        help='Path to input PNG image, or raw .npy or binary .pbm mask (default: image.png). With --batch: a directory or glob pattern of images.'
     )
     parser.add_argument(
         '-o', '--output',
         default=None,
-        help='Path to output OpenSCAD file (default: derived from input image name, e.g., image.png -> image.scad)'
+        help='Path to output OpenSCAD file, or - for stdout (default: derived from input image name, e.g., image.png -> image.scad)'
     )
     parser.add_argument(
         '-t', '--threshold',
@@ -869,6 +5595,22 @@ def main():
         default=128,
         help='Grayscale threshold (0-255). Pixels darker than this are "inside" (default: 128)'
     )
+    parser.add_argument(
+        '--streamPng',
+        action='store_true',
+        help='Decode non-interlaced PNGs 1024 rows at a time with the built-in decoder instead of PIL. Several times slower than PIL and, for color images, not leaner; prefer a raw .npy or .pbm mask for very large shapes.'
+    )
+    parser.add_argument(
+        '--levels',
+        default=None,
+        metavar='THRESHOLDS',
+        help='Comma-separated grayscale thresholds (e.g. 64,128,192) of nested levels stacked in one script, replacing -t: the highest threshold gives the bottom level with the edge/border/frame options, and each lower one a baseplate level stacked one plate height higher, so darker pixels stack higher. The levels are decomposed in one pass, each reusing the baseplates of the level inside it.'
+    )
+    parser.add_argument(
+        '--sweep',
+        action='store_true',
+        help='Print the number of baseplates at every threshold from 0 to 255 instead of writing a script'
+    )
     parser.add_argument(
         '--debug',
         action='store_true',
@@ -913,24 +5655,209 @@ def main():
         action='store_true',
         help='Center the generated model around X and Y axes (origin will be at the center of the model)'
     )
+    parser.add_argument(
+        '--compact',
+        action='store_true',
+        help='Write a compact script: one baseplate module placed by a loop per plate size, and cubes as data-driven loops. With --profile the size of the default script is printed for comparison'
+    )
+    parser.add_argument(
+        '--shards',
+        type=int,
+        default=1,
+        metavar='N',
+        help='Split the model into N spatial shards of similar predicted render cost, each in its own <output>.shard-NN.scad; the output file assembles their rendered .stl meshes and <output>.shards.json lists them'
+    )
+    parser.add_argument(
+        '--meshCubes',
+        choices=CUBE_MESH_FORMATS,
+        default=None,
+        help='Merge interior and border/frame cubes into one mesh file (<output>.cubes.stl or .3mf) that the script imports, instead of placing every cube in OpenSCAD'
+    )
+    parser.add_argument(
+        '--borderStyle',
+        choices=BORDER_STYLES,
+        default=DEFAULT_BORDER_STYLE,
+        help=f'How border/frame layers are written (default: {DEFAULT_BORDER_STYLE}). "outline" traces each layer into polygon loops and extrudes them with one linear_extrude() instead of placing one cube per rectangle; with --meshCubes only the interior cubes are merged.'
+    )
 
-    args = parser.parse_args()
+    parser.add_argument(
+        '--engine',
+        choices=DECOMPOSITION_ENGINES,
+        default=DEFAULT_DECOMPOSITION_ENGINE,
+        help=f'Rectangle decomposition engine (default: {DEFAULT_DECOMPOSITION_ENGINE}). All engines produce identical output; "scan" is the original cell-by-cell implementation kept for timing comparisons.'
+    )
+    parser.add_argument(
+        '--borderGeometry',
+        choices=BORDER_GEOMETRIES,
+        default=DEFAULT_BORDER_GEOMETRY,
+        help=f'Border/frame geometry engine (default: {DEFAULT_BORDER_GEOMETRY}). "exact" works on the compressed grid of distinct shape edges, "raster" on a full 0.1mm mask and "packed" on the same mask stored as packed bits (about 8x less memory than "raster"). All produce identical output.'
+    )
+    parser.add_argument(
+        '--decompose',
+        choices=DECOMPOSITION_STRATEGIES,
+        default=DEFAULT_DECOMPOSITION_STRATEGY,
+        help=f'Baseplate decomposition strategy (default: {DEFAULT_DECOMPOSITION_STRATEGY}). "optimal" computes the minimum number of rectangles for each connected part of the shape, "cost" picks the decomposition with the lowest predicted OpenSCAD render cost (interior cubes in edge mode then use "optimal", the fewest cubes).'
+    )
+    parser.add_argument(
+        '--costModel',
+        default=None,
+        metavar='CALIBRATION_JSON',
+        help='JSON file with render cost coefficients (plate, stud, seam, cube) used by --decompose=cost and the predicted render cost statistics'
+    )
+    parser.add_argument(
+        '--optimalMaxCells',
+        type=int,
+        default=DEFAULT_OPTIMAL_MAX_CELLS,
+        metavar='CELLS',
+        help=f'With --decompose=optimal, connected parts with more cells than this fall back to the greedy decomposition (default: {DEFAULT_OPTIMAL_MAX_CELLS})'
+    )
+    parser.add_argument(
+        '--merge',
+        action='store_true',
+        help='Merge baseplates, interior cubes and border/frame cubes that share a complete edge into larger ones, repeatedly in both directions, and report how many were removed'
+    )
 
-    # Derive output filename from input image if not specified
-    if args.output is None:
-        # Replace extension with .scad
-        base_name = os.path.splitext(args.image)[0]
-        args.output = f"{base_name}.scad"
+    parser.add_argument(
+        '--batch',
+        action='store_true',
+        help='Batch mode: process every PNG in the directory (or matching the glob pattern) given as image, in parallel. Each output is written next to its image.'
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=None,
+        metavar='N',
+        help='Number of worker processes in batch and serve mode (default: number of CPUs)'
+    )
+    parser.add_argument(
+        '--jobs',
+        type=int,
+        default=DEFAULT_JOBS,
+        metavar='N',
+        help=f'Decompose the connected parts of the shape and of the border/frame in N worker processes (default: {DEFAULT_JOBS}). The result is the same for every N.'
+    )
+    parser.add_argument(
+        '--tiles',
+        type=int,
+        default=DEFAULT_TILES,
+        metavar='K',
+        help=f'Cut the greedy decompositions of the shape and the border/frame into K strips of rows that are swept independently (in parallel with --jobs) and stitched together by a seam pass (default: {DEFAULT_TILES}, no tiling). Meant for one huge connected shape; the result is the same for every K, and it is currently not faster than no tiling.'
+    )
 
-    # Parse OpenSCAD config file
-    try:
-        config = parse_openscad_config(args.config)
-        unit_size = calculate_unit_size(config)
-        print(f"Using config: {args.config}")
-        print(f"  unitMbu = {config['unitMbu']}, unitGrid = {config['unitGrid']}, scale = {config['scale']}")
-        print(f"  Calculated unit size: {unit_size}mm")
-    except (FileNotFoundError, ValueError) as e:
-        parser.error(f"Config error: {e}")
+    parser.add_argument(
+        '--serve',
+        action='store_true',
+        help='Server mode: keep the interpreter warm and run jobs (an image plus the usual options) sent as JSON over localhost HTTP or a Unix socket. See docs/USAGE.md for the job format.'
+    )
+    parser.add_argument(
+        '--listen',
+        default=DEFAULT_SERVER_ADDRESS,
+        metavar='ADDRESS',
+        help=f'Address of --serve: HOST:PORT, PORT, or unix:PATH for a Unix socket (default: {DEFAULT_SERVER_ADDRESS})'
+    )
+    parser.add_argument(
+        '--queueSize',
+        type=int,
+        default=DEFAULT_SERVER_QUEUE_SIZE,
+        metavar='N',
+        help=f'With --serve, number of jobs that may wait for a free worker; further jobs are rejected as busy (default: {DEFAULT_SERVER_QUEUE_SIZE})'
+    )
+    parser.add_argument(
+        '--serveRoot',
+        default=DEFAULT_SERVER_ROOT,
+        metavar='DIR',
+        help='With --serve, directory the image, -o, --config and --costModel paths of jobs are relative to; jobs cannot use absolute paths, \'..\' or links leading outside it (default: current directory)'
+    )
+    parser.add_argument(
+        '--allowRemote',
+        action='store_true',
+        help='With --serve, allow a --listen address that accepts connections from other machines. Anyone who can connect can read and write files in --serveRoot.'
+    )
+
+    parser.add_argument(
+        '--incremental',
+        action='store_true',
+        help=f'Keep the mask and rectangles in a {LAYOUT_SIDECAR_SUFFIX} file next to the output and, on the next run, only recompute the rectangles around changed pixels'
+    )
+
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help=f'Measure wall time, CPU time and peak memory (tracemalloc) of every pipeline stage, print them as a table and write them to a {PROFILE_SIDECAR_SUFFIX} file next to the output'
+    )
+    parser.add_argument(
+        '--profileStats',
+        action='store_true',
+        help=f'Like --profile, and also run every stage under cProfile and write the statistics of the slowest stage to a {PROFILE_STATS_SUFFIX} file (readable with python -m pstats)'
+    )
+
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Do not read or write the on-disk decomposition cache'
+    )
+    parser.add_argument(
+        '--cacheDir',
+        default=DEFAULT_CACHE_DIR,
+        metavar='DIR',
+        help=f'Directory of the decomposition cache (default: {DEFAULT_CACHE_DIR})'
+    )
+    parser.add_argument(
+        '--cacheSize',
+        type=float,
+        default=DEFAULT_CACHE_SIZE_MB,
+        metavar='MB',
+        help=f'Maximum size of the decomposition cache in MB; least recently used entries are evicted (default: {DEFAULT_CACHE_SIZE_MB})'
+    )
+
+    return parser
+
+
+def validate_arguments(parser: argparse.ArgumentParser, args: argparse.Namespace) -> None:
+    """
+    Check option combinations that do not depend on the config file.
+
+    Args:
+        parser: Parser the options came from; errors are reported through it
+        args: Parsed command line options
+    """
+    if args.batch and args.output is not None:
+        parser.error("-o/--output cannot be used with --batch (outputs are written next to each image)")
+    if args.workers is not None and args.workers < 1:
+        parser.error("--workers value must be >= 1")
+    if args.jobs < 1:
+        parser.error("--jobs value must be >= 1")
+    if args.tiles < 1:
+        parser.error("--tiles value must be >= 1")
+    if args.jobs > 1 and (args.batch or args.serve):
+        parser.error("--jobs cannot be combined with --batch or --serve (use --workers to process images in parallel)")
+    if args.shards < 1:
+        parser.error("--shards value must be >= 1")
+    if args.shards > 1 and args.output == STDOUT_PATH:
+        parser.error("--shards needs an output file to name the shard files after (cannot be used with -o -)")
+    if args.shards > 1 and args.meshCubes is not None:
+        parser.error("--shards cannot be combined with --meshCubes")
+    if args.output == STDOUT_PATH and args.incremental:
+        parser.error("--incremental needs an output file to keep its layout next to (cannot be used with -o -)")
+    if args.serve and (args.batch or args.output is not None):
+        parser.error("--serve cannot be combined with --batch or -o/--output (each job chooses its own output)")
+    if args.queueSize < 0:
+        parser.error("--queueSize value must be >= 0")
+    if args.serve and not os.path.isdir(args.serveRoot):
+        parser.error(f"--serveRoot is not a directory: {args.serveRoot}")
+    if args.sweep and (args.batch or args.serve):
+        parser.error("--sweep cannot be combined with --batch or --serve")
+    if isinstance(args.levels, str):
+        try:
+            args.levels = sorted({int(value) for value in args.levels.split(',')})
+        except ValueError:
+            parser.error(f"--levels must be a comma-separated list of thresholds, got {args.levels!r}")
+        if len(args.levels) < 2 or not all(1 <= threshold <= 255 for threshold in args.levels):
+            parser.error("--levels needs at least two different thresholds between 1 and 255")
+    if args.levels and args.shards > 1:
+        parser.error("--levels cannot be combined with --shards")
+    if args.levels and args.incremental:
+        parser.error("--levels cannot be combined with --incremental (the levels are already decomposed incrementally)")
 
     # Validate edge thickness if provided
     if args.edge is not None and args.edge < 1:
@@ -946,6 +5873,38 @@ def main():
     if args.frame and args.border is None:
         parser.error("--frame requires --border to be specified (use --border=0 for no padding)")
 
+
+def load_run_config(parser: argparse.ArgumentParser, args: argparse.Namespace,
+                    config_loader=parse_openscad_config, log: Callable[..., None] = print) -> Tuple[Dict[str, float], float, Dict[str, float]]:
+    """
+    Load the OpenSCAD config and render cost model of a run and check the
+    options that depend on them.
+
+    Args:
+        parser: Parser the options came from; errors are reported through it
+        args: Parsed command line options
+        config_loader: Function that parses a config file path
+        log: Function the config summary is printed with
+
+    Returns:
+        Tuple of (config, unit_size, cost_model)
+    """
+    # Parse OpenSCAD config file
+    try:
+        config = config_loader(args.config)
+        unit_size = calculate_unit_size(config)
+        log(f"Using config: {args.config}")
+        log(f"  unitMbu = {config['unitMbu']}, unitGrid = {config['unitGrid']}, scale = {config['scale']}")
+        log(f"  Calculated unit size: {unit_size}mm")
+    except (FileNotFoundError, ValueError) as e:
+        parser.error(f"Config error: {e}")
+
+    # Load render cost model
+    try:
+        cost_model = load_render_cost_model(args.costModel)
+    except (FileNotFoundError, ValueError) as e:
+        parser.error(f"Cost model error: {e}")
+
     # Validate border height will be positive
     if args.border is not None:
         # Calculate base border height from config: unitGrid[1] * unitMbu * scale
@@ -954,94 +5913,59 @@ def main():
         if final_border_height <= 0:
             parser.error(f"Border height would be {final_border_height:.2f}mm (base {base_border_height}mm + adjust {args.borderHeightAdjust}mm). Final height must be > 0.")
 
-    try:
-        # Step 1: Load and threshold the image
-        print(f"Loading image: {args.image}")
-        binary_mask = load_and_threshold_image(args.image, args.threshold)
-        print(f"Image size: {binary_mask.shape[1]}x{binary_mask.shape[0]} pixels")
-        print(f"Pixels inside shape: {np.sum(binary_mask)}")
+    return config, unit_size, cost_model
 
-        # Step 2: Decompose into rectangles
-        print("\nDecomposing shape into rectangles...")
 
-        interior_rectangles = None
-        border_rectangles = None
+def main():
+    """Main entry point for the script."""
+    parser = build_argument_parser()
+    args = parser.parse_args()
+    validate_arguments(parser, args)
 
-        if args.edge is not None:
-            # Edge mode: separate edge and interior
-            print(f"Edge mode enabled: edge thickness = {args.edge} brick units")
-            edge_mask, interior_mask = extract_edge_and_interior(binary_mask, args.edge)
+    if args.serve:
+        run_server(args)
+        return
+
+    # With -o - the script is the only thing written to stdout; status
+    # messages go to stderr instead
+    script_output = args.output
+    if args.output == STDOUT_PATH:
+        script_output = sys.stdout
+        sys.stdout = sys.stderr
+
+    # Derive output filename from input image if not specified
+    if args.output is None and not args.batch:
+        # Replace extension with .scad
+        base_name = os.path.splitext(args.image)[0]
+        args.output = f"{base_name}.scad"
 
-            print(f"Edge pixels: {np.sum(edge_mask)}")
-            print(f"Interior pixels: {np.sum(interior_mask)}")
+    config, unit_size, cost_model = load_run_config(parser, args)
 
-            # Decompose edge into baseplates
-            rectangles = greedy_rectangle_decomposition(edge_mask)
+    if args.batch:
+        run_batch(args, config, unit_size, cost_model)
+        return
 
-            # Decompose interior into cubes
-            interior_rectangles = greedy_rectangle_decomposition(interior_mask)
-        else:
-            # Normal mode: all baseplates
-            rectangles = greedy_rectangle_decomposition(binary_mask)
-
-        # Step 2b: Generate border or frame if requested
-        border_rectangles_top = None
-        if args.border is not None:
-            # Get base side adjustment for clearance calculation
-            wall_thickness_adj = config.get('baseSideAdjustment', -0.1)
-            # Inset amount is the negative of base side adjustment (to expand cutout)
-            inset_mm = -wall_thickness_adj if args.borderHeightAdjust > 0 else 0.0
-
-            if args.frame:
-                # Frame mode: filled rectangular border enclosing entire shape
-                print(f"\nFrame mode enabled: padding = {args.border}mm")
-                border_rectangles = extract_frame_rectangles_mm(binary_mask, args.border, unit_size, inset_mm=0.0)
-                print(f"Generated {len(border_rectangles)} frame rectangles (base layer)")
-
-                # Generate top layer with inset if borderHeightAdjust > 0
-                if args.borderHeightAdjust > 0:
-                    print(f"Generating top layer with {inset_mm}mm inset for clearance")
-                    border_rectangles_top = extract_frame_rectangles_mm(binary_mask, args.border, unit_size, inset_mm=inset_mm)
-                    print(f"Generated {len(border_rectangles_top)} frame rectangles (top layer)")
-            else:
-                # Normal border mode: border around shape edges
-                print(f"\nBorder mode enabled: border thickness = {args.border}mm")
-                border_rectangles = extract_border_rectangles_mm(binary_mask, args.border, unit_size, inset_mm=0.0)
-                print(f"Generated {len(border_rectangles)} border rectangles (base layer)")
-
-                # Generate top layer with inset if borderHeightAdjust > 0
-                if args.borderHeightAdjust > 0:
-                    print(f"Generating top layer with {inset_mm}mm inset for clearance")
-                    border_rectangles_top = extract_border_rectangles_mm(binary_mask, args.border, unit_size, inset_mm=inset_mm)
-                    print(f"Generated {len(border_rectangles_top)} border rectangles (top layer)")
-
-        # Step 3: Generate OpenSCAD script
-        print("\nGenerating OpenSCAD script...")
-        if args.debug:
-            print("Debug mode enabled: Using random colors for each baseplate")
-        generate_openscad_script(
-            rectangles,
-            args.output,
-            debug=args.debug,
-            image_height=binary_mask.shape[0],
-            interior_rectangles=interior_rectangles,
-            border_rectangles=border_rectangles,
-            border_rectangles_top=border_rectangles_top,
-            border_thickness_mm=args.border if args.border is not None else 0.0,
-            border_height_adjust_mm=args.borderHeightAdjust,
-            unit_size=unit_size,
-            config_path=args.config,
-            is_frame_mode=args.frame,
-            config=config,
-            center=args.center,
-            image_width=binary_mask.shape[1]
-        )
+    if args.sweep:
+        try:
+            run_threshold_sweep(args.image, args, cost_model)
+        except (FileNotFoundError, ValueError) as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
+        return
 
+    try:
+        stats = generate_baseplate(args.image, script_output, args, config, unit_size, cost_model)
+        if not args.no_cache and not stats['incremental']:
+            print(f"\nDecomposition cache: {'hit' if stats['cache_hit'] else 'miss'}")
         print("\nDone!")
 
     except FileNotFoundError:
         print(f"Error: Image file '{args.image}' not found.", file=sys.stderr)
         sys.exit(1)
+    except BrokenPipeError:
+        # The reader of the script went away; keep the final flush quiet
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.__stdout__.fileno())
+        sys.exit(1)
     except Exception as e:
         print(f"Error: {e}", file=sys.stderr)
         sys.exit(1)
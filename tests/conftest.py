@@ -0,0 +1,23 @@
+"""Make generate_irregular_baseplate importable from the tests, and shared test helpers."""
+
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def painted(rectangles, shape, offset: int = 0, cell_size: float = 1) -> np.ndarray:
+    """
+    Count how many rectangles cover every cell of a raster.
+
+    Rectangles are (x, y, width, height) in cells, or in mm on a grid of
+    cell_size mm (e.g. the 0.1mm border grid), shifted by offset cells.
+    """
+    counts = np.zeros(shape, dtype=np.int32)
+    for rectangle in rectangles:
+        x, y, w, h = (int(round(value / cell_size)) for value in rectangle)
+        assert x + offset >= 0 and y + offset >= 0
+        counts[y + offset:y + offset + h, x + offset:x + offset + w] += 1
+    return counts
@@ -0,0 +1,98 @@
+"""
+Batch mode (--batch) keeps going when a worker process dies, and writes the
+same scripts as single-image runs.
+"""
+
+import argparse
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+import generate_irregular_baseplate as gib
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CONFIG = 'configs/config-nano.scad'
+
+fork_only = pytest.mark.skipif(multiprocessing.get_start_method() != 'fork',
+                               reason="workers must inherit the patched job function")
+
+
+def fake_job(image_path):
+    # Stands in for run_batch_job in the forked workers: 'crash' images kill
+    # their worker, 'error' images fail inside the job
+    name = os.path.basename(image_path)
+    if name.startswith('crash'):
+        os._exit(1)
+    output_path = f"{os.path.splitext(image_path)[0]}.scad"
+    if name.startswith('error'):
+        return (image_path, output_path, None, "ValueError: broken")
+    return (image_path, output_path, {'plates': 2, 'cache_hit': 0}, None)
+
+
+@pytest.fixture
+def images(tmp_path, monkeypatch):
+    monkeypatch.setattr(gib, 'run_batch_job', fake_job)
+    names = ['a.png', 'b.png', 'crash.png', 'c.png', 'error.png', 'd.png']
+    for name in names:
+        (tmp_path / name).write_bytes(b'')
+    return tmp_path
+
+
+@fork_only
+def test_run_batch_pool_returns_unfinished_images(images):
+    paths = gib.find_batch_images(str(images))
+    recorded = []
+    unfinished = gib.run_batch_pool(paths, 2, (None, None, None, None), recorded.append)
+    assert str(images / 'crash.png') in unfinished
+    assert unfinished == [path for path in paths if path in unfinished]
+    assert sorted([result[0] for result in recorded] + unfinished) == paths
+
+
+@fork_only
+def test_run_batch_reports_crashed_image_and_finishes_the_rest(images, capsys):
+    args = argparse.Namespace(image=str(images), workers=2, no_cache=True)
+    with pytest.raises(SystemExit) as excinfo:
+        gib.run_batch(args, {}, 1.0, {})
+    assert excinfo.value.code == 1
+
+    out, err = capsys.readouterr()
+    for name in ['a', 'b', 'c', 'd']:
+        assert f"[ok] {images / name}.png" in out
+    assert f"[failed] {images / 'crash.png'}: worker process died" in err
+    assert f"[failed] {images / 'error.png'}: ValueError: broken" in err
+    assert "Batch finished: 4 succeeded, 2 failed" in out
+    assert "Total baseplates: 8" in out
+
+
+def test_find_batch_images_matches_extensions_case_insensitively(tmp_path):
+    for name in ['a.png', 'B.PNG', 'c.Npy', 'd.pbm', 'e.jpg', 'f.png.txt', 'notes']:
+        (tmp_path / name).write_bytes(b'')
+    (tmp_path / 'folder.png').mkdir()
+    expected = sorted(str(tmp_path / name) for name in ['a.png', 'B.PNG', 'c.Npy', 'd.pbm'])
+    assert gib.find_batch_images(str(tmp_path)) == expected
+    assert gib.find_batch_images(str(tmp_path / '*.png')) == [str(tmp_path / 'a.png')]
+
+
+def run_cli(*argv) -> subprocess.CompletedProcess:
+    """Run the command line script from the repository root."""
+    return subprocess.run([sys.executable, 'generate_irregular_baseplate.py', *argv, f'--config={CONFIG}', '--no-cache'],
+                          cwd=ROOT, capture_output=True, text=True, check=True)
+
+
+@pytest.mark.parametrize('options', [[], ['--edge=1', '--border=2', '--borderHeightAdjust=1', '--compact']])
+def test_batch_outputs_match_single_image_runs(tmp_path, options):
+    names = ['test-shape', 'test-12x12', 'test-3x3']
+    for name in names:
+        shutil.copy(os.path.join(ROOT, 'tests', f'{name}.png'), tmp_path / f'{name}.png')
+    result = run_cli(str(tmp_path), '--batch', '--workers=2', *options)
+    assert "Batch finished: 3 succeeded, 0 failed" in result.stdout
+
+    (tmp_path / 'single').mkdir()
+    for name in names:
+        single = tmp_path / 'single' / f'{name}.scad'
+        run_cli(str(tmp_path / f'{name}.png'), '-o', str(single), *options)
+        assert (tmp_path / f'{name}.scad').read_bytes() == single.read_bytes()
@@ -0,0 +1,57 @@
+"""
+Decomposition cache keys.
+"""
+
+import numpy as np
+import pytest
+
+import generate_irregular_baseplate as gib
+
+CONFIG = {'unitMbu': 1.6, 'unitGrid': [5, 2], 'scale': 1}
+
+
+def parse(argv):
+    parser = gib.build_argument_parser()
+    args = parser.parse_args(['image.png'] + argv)
+    gib.validate_arguments(parser, args)
+    return args
+
+
+def cache_key(argv, gray):
+    args = parse(argv)
+    binary_mask = gray < (args.levels[-1] if args.levels else args.threshold)
+    return gib.compute_cache_key(binary_mask, args, CONFIG, 8.0, None, gray)
+
+
+def gray_image(inner):
+    gray = np.full((40, 40), 255, dtype=np.uint8)
+    gray[5:35, 5:35] = 150
+    gray[inner] = 50
+    return gray
+
+
+def test_levels_key_depends_on_inner_levels():
+    # Same bottom mask, different inner level: the bottom level is seeded
+    # from the inner one, so the keys must differ
+    first = gray_image(np.s_[10:20, 10:30])
+    second = gray_image(np.s_[12:30, 8:16])
+    assert cache_key(['--levels=100,200'], first) != cache_key(['--levels=100,200'], second)
+
+
+def test_levels_key_ignores_gray_changes_within_a_level():
+    first = gray_image(np.s_[10:20, 10:30])
+    second = first.copy()
+    second[first == 150] = 160
+    assert cache_key(['--levels=100,200'], first) == cache_key(['--levels=100,200'], second)
+
+
+def test_levels_key_needs_gray_levels():
+    args = parse(['--levels=100,200'])
+    with pytest.raises(ValueError):
+        gib.compute_cache_key(np.ones((4, 4), dtype=bool), args, CONFIG, 8.0)
+
+
+def test_single_threshold_key_only_hashes_the_mask():
+    first = gray_image(np.s_[10:20, 10:30])
+    second = gray_image(np.s_[12:30, 8:16])
+    assert cache_key(['-t', '200'], first) == cache_key(['-t', '200'], second)
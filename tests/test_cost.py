@@ -0,0 +1,73 @@
+"""
+Render cost model (--costModel) and the cost-aware decomposition (--decompose=cost).
+"""
+
+import json
+
+import numpy as np
+import pytest
+
+import generate_irregular_baseplate as gib
+from conftest import painted
+
+
+def random_masks():
+    rng = np.random.default_rng(11)
+    for _ in range(60):
+        rows, cols = rng.integers(1, 14, size=2)
+        yield rng.random((rows, cols)) < rng.uniform(0.3, 0.95)
+
+
+def test_load_render_cost_model(tmp_path):
+    assert gib.load_render_cost_model() == gib.DEFAULT_RENDER_COST_MODEL
+    path = tmp_path / 'model.json'
+    path.write_text(json.dumps({'plate': 2, 'seam': 0.5}))
+    assert gib.load_render_cost_model(str(path)) == dict(gib.DEFAULT_RENDER_COST_MODEL, plate=2.0, seam=0.5)
+
+    for content in ['{"plates": 1}', '{"stud": "0.1"}', '{"cube": true}', '[1, 2]', '{broken']:
+        path.write_text(content)
+        with pytest.raises(ValueError):
+            gib.load_render_cost_model(str(path))
+    with pytest.raises(FileNotFoundError):
+        gib.load_render_cost_model(str(tmp_path / 'missing.json'))
+
+
+def test_count_plate_seams():
+    assert gib.count_plate_seams([]) == 0
+    assert gib.count_plate_seams([(0, 0, 3, 2)]) == 0
+    # Two plates sharing a 2-unit edge, and a third touching only a corner
+    assert gib.count_plate_seams([(0, 0, 3, 2), (3, 0, 1, 2), (4, 2, 1, 1)]) == 2
+    # A 3x3 block of unit plates has 2 * 2 * 3 inner edges
+    assert gib.count_plate_seams([(x, y, 1, 1) for y in range(3) for x in range(3)]) == 12
+
+
+@pytest.mark.parametrize('model', [
+    gib.DEFAULT_RENDER_COST_MODEL,
+    {'plate': 0.1, 'stud': 0.0, 'seam': 1.0, 'cube': 0.01},
+])
+def test_cost_decompositions_cover_exactly_and_beat_greedy(model):
+    def layout_cost(rectangles):
+        cost = gib.predict_render_cost(rectangles, model=model)
+        return cost['plate'] + cost['seam']
+
+    for mask in random_masks():
+        cost_greedy = gib.cost_greedy_decomposition(mask, model)
+        np.testing.assert_array_equal(painted(cost_greedy, mask.shape), mask)
+
+        chosen = gib.decompose_mask(mask, 'cost', cost_model=model)
+        np.testing.assert_array_equal(painted(chosen, mask.shape), mask)
+        greedy = gib.decompose_mask(mask, 'greedy')
+        assert layout_cost(chosen) <= layout_cost(greedy) + 1e-9
+        assert gib.predict_render_cost(chosen, model=model)['total'] <= gib.predict_render_cost(greedy, model=model)['total'] + 1e-9
+
+
+def test_cost_strategy_decomposes_interior_cubes_into_fewest_cubes():
+    rng = np.random.default_rng(8)
+    mask = np.ones((40, 40), dtype=bool)
+    mask[rng.integers(4, 36, size=8), rng.integers(4, 36, size=8)] = False
+    cost = gib.plan_baseplate(mask, 'configs/config-nano.scad', edge=1, decompose='cost')
+    optimal = gib.plan_baseplate(mask, 'configs/config-nano.scad', edge=1, decompose='optimal')
+    greedy = gib.plan_baseplate(mask, 'configs/config-nano.scad', edge=1)
+    assert cost.interior_rectangles == optimal.interior_rectangles
+    assert len(cost.interior_rectangles) < len(greedy.interior_rectangles)
+    np.testing.assert_array_equal(painted(cost.interior_rectangles + cost.rectangles, mask.shape), mask)
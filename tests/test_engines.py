@@ -0,0 +1,83 @@
+"""
+Decomposition engines against the original cell-by-cell scan.
+
+Every engine must return exactly the same rectangles, in the same order,
+as scan_rectangle_decomposition(), and encode_mask_runs() must describe
+the mask exactly.
+"""
+
+import numpy as np
+import pytest
+
+import generate_irregular_baseplate as gib
+
+
+def special_masks():
+    """Edge-case masks: empty, full, single rows/columns and checkerboards."""
+    checkerboard = np.indices((9, 11)).sum(axis=0) % 2 == 0
+    yield np.zeros((0, 0), dtype=bool)
+    yield np.zeros((0, 5), dtype=bool)
+    yield np.zeros((7, 9), dtype=bool)
+    yield np.ones((7, 9), dtype=bool)
+    yield np.ones((1, 13), dtype=bool)
+    yield np.ones((13, 1), dtype=bool)
+    yield np.array([[True, False, True, True, False, True]])
+    yield np.array([[True], [True], [False], [True]])
+    yield checkerboard
+    yield ~checkerboard
+    # Blocks of a coarse checkerboard
+    yield np.kron(checkerboard, np.ones((3, 2), dtype=bool))
+
+
+def random_masks(count: int = 120):
+    """Seeded random masks of varying size, density and blockiness."""
+    rng = np.random.default_rng(2024)
+    for _ in range(count):
+        rows, cols = rng.integers(1, 40, size=2)
+        mask = rng.random((rows, cols)) < rng.uniform(0.1, 0.95)
+        if rng.random() < 0.4:
+            # Blocky masks give tall runs and repeated rows
+            mask = np.kron(mask[:max(rows // 3, 1), :max(cols // 3, 1)], np.ones((3, 3), dtype=bool))
+        yield mask
+
+
+MASKS = list(special_masks()) + list(random_masks())
+
+
+@pytest.mark.parametrize('index', range(len(MASKS)))
+def test_histogram_matches_scan(index):
+    mask = MASKS[index]
+    assert gib.histogram_rectangle_decomposition(mask) == gib.scan_rectangle_decomposition(mask)
+
+
+def decode_mask_runs(runs, cols: int) -> np.ndarray:
+    mask = np.zeros((len(runs), cols), dtype=bool)
+    for row, (starts, ends) in enumerate(runs):
+        assert starts == sorted(starts) and len(starts) == len(ends)
+        for start, end in zip(starts, ends):
+            assert start < end
+            mask[row, start:end] = True
+    return mask
+
+
+@pytest.mark.parametrize('index', range(len(MASKS)))
+def test_rle_matches_scan(index):
+    mask = MASKS[index]
+    assert gib.rle_rectangle_decomposition(mask) == gib.scan_rectangle_decomposition(mask)
+
+
+@pytest.mark.parametrize('index', range(len(MASKS)))
+def test_encode_mask_runs_round_trips(index):
+    mask = MASKS[index]
+    runs = gib.encode_mask_runs(mask)
+    assert len(runs) == mask.shape[0]
+    np.testing.assert_array_equal(decode_mask_runs(runs, mask.shape[1]), mask)
+
+
+def test_rle_across_row_chunks():
+    # Taller than one RLE_CHUNK_ROWS chunk, with runs crossing the chunk border
+    rng = np.random.default_rng(7)
+    mask = np.kron(rng.random((gib.RLE_CHUNK_ROWS // 8 + 5, 6)) < 0.6, np.ones((8, 4), dtype=bool))
+    runs = gib.encode_mask_runs(mask)
+    np.testing.assert_array_equal(decode_mask_runs(runs, mask.shape[1]), mask)
+    assert gib.decompose_runs(runs) == gib.histogram_rectangle_decomposition(mask)
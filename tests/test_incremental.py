@@ -0,0 +1,124 @@
+"""
+Incremental decomposition (--incremental): updated rectangles still cover the
+edited mask exactly, and the layout sidecar is only reused with equal options.
+"""
+
+import numpy as np
+import pytest
+
+import generate_irregular_baseplate as gib
+from conftest import painted
+
+
+def edit_mask(rng, mask: np.ndarray) -> np.ndarray:
+    """Fill or clear a few random blocks of a mask."""
+    edited = mask.copy()
+    rows, cols = mask.shape
+    for _ in range(rng.integers(1, 4)):
+        y, x = rng.integers(0, rows), rng.integers(0, cols)
+        h, w = rng.integers(1, 5, size=2)
+        edited[y:y + h, x:x + w] = rng.random() < 0.5
+    return edited
+
+
+def random_edits(seed, count=40):
+    rng = np.random.default_rng(seed)
+    for _ in range(count):
+        rows, cols = rng.integers(3, 25, size=2)
+        mask = rng.random((rows, cols)) < rng.uniform(0.4, 0.9)
+        yield rng, mask, edit_mask(rng, mask)
+
+
+@pytest.mark.parametrize('strategy', gib.DECOMPOSITION_STRATEGIES)
+def test_update_mask_decomposition_covers_edited_mask(strategy):
+    for _, mask, edited in random_edits(1):
+        previous = gib.decompose_mask(mask, strategy)
+        updated = gib.update_mask_decomposition(mask, previous, edited, strategy)
+        np.testing.assert_array_equal(painted(updated, edited.shape), edited)
+
+
+def test_update_mask_decomposition_keeps_far_rectangles():
+    mask = np.ones((30, 30), dtype=bool)
+    previous = [(0, 0, 10, 30), (10, 0, 20, 30)]
+    edited = mask.copy()
+    edited[12:14, 25:27] = False
+    updated = gib.update_mask_decomposition(mask, previous, edited)
+    assert (0, 0, 10, 30) in updated
+    np.testing.assert_array_equal(painted(updated, edited.shape), edited)
+
+
+def random_boxes(rng, count, size):
+    corners = rng.integers(0, size - 1, size=(count, 2))
+    extents = rng.integers(1, size // 3, size=(count, 2))
+    return np.concatenate([corners, np.minimum(corners + extents, size)], axis=1).astype(np.int64)
+
+
+def region(include: np.ndarray, exclude: np.ndarray, size: int) -> np.ndarray:
+    covered = np.zeros((size, size), dtype=bool)
+    for x0, y0, x1, y1 in include:
+        covered[y0:y1, x0:x1] = True
+    for x0, y0, x1, y1 in exclude:
+        covered[y0:y1, x0:x1] = False
+    return covered
+
+
+def test_update_region_rectangles_covers_edited_region():
+    rng = np.random.default_rng(2)
+    size = 48
+    for _ in range(60):
+        include = random_boxes(rng, rng.integers(1, 12), size)
+        exclude = random_boxes(rng, rng.integers(0, 6), size)
+        previous = np.array(gib.compressed_region_rectangles(include, exclude), dtype=np.int64).reshape(-1, 4)
+
+        # Replace a few include boxes; the region only changes inside them
+        replaced = rng.choice(len(include), size=rng.integers(1, len(include) + 1), replace=False)
+        edited = include.copy()
+        edited[replaced] = random_boxes(rng, len(replaced), size)
+        dirty = np.concatenate([include[replaced], edited[replaced]])
+
+        keep, rectangles = gib.update_region_rectangles(edited, exclude, previous, dirty)
+        kept = [tuple(rect) for rect in previous[keep]]
+        np.testing.assert_array_equal(painted(kept + list(rectangles), (size, size)),
+                                      region(edited, exclude, size))
+
+
+@pytest.mark.parametrize('frame', [False, True])
+def test_updated_border_matches_fresh_border(frame):
+    extract = gib.extract_frame_rectangles_mm if frame else gib.extract_border_rectangles_mm
+    margin, size = 40, 200
+
+    def raster(rectangles):
+        return painted(rectangles, (size, size), margin, gib.BORDER_RESOLUTION_MM)
+
+    for _, mask, edited in random_edits(3, 15):
+        mask, edited = mask[:6, :6], edited[:6, :6]
+        previous = extract(mask, 1.5, 1.6, inset_mm=0.3)
+        updated = extract(edited, 1.5, 1.6, inset_mm=0.3, previous=(mask, previous))
+        np.testing.assert_array_equal(raster(updated), raster(extract(edited, 1.5, 1.6, inset_mm=0.3)))
+        assert raster(updated).max() <= 1
+
+
+def test_layout_sidecar_round_trip_and_mismatched_options(tmp_path):
+    parser = gib.build_argument_parser()
+    args = parser.parse_args(['shape.png', '--edge=1'])
+    gib.validate_arguments(parser, args)
+    config = {'unitMbu': 1.6, 'unitGrid': [5, 2], 'scale': 1}
+    options = gib.decomposition_options(args, config, 8.0)
+
+    rng = np.random.default_rng(4)
+    mask = rng.random((13, 9)) < 0.6
+    result = {'rectangles': gib.decompose_mask(mask, 'greedy'), 'interior_rectangles': None,
+              'border_rectangles': [(0.5, 0.0, 2.5, 1.0)], 'border_rectangles_top': None}
+    path = gib.layout_sidecar_path(str(tmp_path / 'shape.scad'))
+    assert path == str(tmp_path / 'shape.layout.json')
+    gib.store_layout_sidecar(path, mask, options, result)
+
+    loaded_mask, loaded_result = gib.load_layout_sidecar(path, options)
+    np.testing.assert_array_equal(loaded_mask, mask)
+    assert loaded_result == result
+
+    assert gib.load_layout_sidecar(path, dict(options, edge=2)) is None
+    assert gib.load_layout_sidecar(path, dict(options, decompose='optimal')) is None
+    assert gib.load_layout_sidecar(str(tmp_path / 'missing.layout.json'), options) is None
+    (tmp_path / 'broken.layout.json').write_text('{broken')
+    assert gib.load_layout_sidecar(str(tmp_path / 'broken.layout.json'), options) is None
@@ -0,0 +1,56 @@
+"""
+Decomposing connected parts on an executor (--jobs) gives the serial result.
+"""
+
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+import generate_irregular_baseplate as gib
+
+
+@pytest.fixture
+def small_batches(monkeypatch):
+    # Close a batch after a few cells so even small masks are split into
+    # several batches and run on the executor
+    monkeypatch.setattr(gib, 'split_components', functools.partial(gib.split_components, batch_cells=16))
+
+
+def island_masks():
+    """Seeded masks of several islands, some touching only at corners."""
+    rng = np.random.default_rng(9)
+    for _ in range(40):
+        rows, cols = rng.integers(10, 40, size=2)
+        mask = np.zeros((rows, cols), dtype=bool)
+        for _ in range(rng.integers(2, 10)):
+            y, x = rng.integers(0, rows), rng.integers(0, cols)
+            h, w = rng.integers(1, 8, size=2)
+            mask[y:y + h, x:x + w] = rng.random((min(h, rows - y), min(w, cols - x))) < 0.85
+        yield mask
+
+
+@pytest.mark.parametrize('strategy', ['greedy', 'optimal'])
+def test_decompose_mask_on_executor_matches_serial(small_batches, strategy):
+    with ThreadPoolExecutor(3) as executor:
+        for mask in island_masks():
+            serial = gib.decompose_mask(mask, strategy)
+            assert gib.decompose_mask(mask, strategy, executor=executor) == serial
+
+
+def test_compressed_region_rectangles_on_executor_matches_serial(small_batches):
+    rng = np.random.default_rng(10)
+    with ThreadPoolExecutor(3) as executor:
+        for _ in range(40):
+            # Clusters of boxes far apart are separate parts of the grid
+            include = []
+            for cx, cy in rng.integers(0, 5, size=(rng.integers(2, 6), 2)) * 100:
+                corners = rng.integers(0, 60, size=(4, 2)) + (cx, cy)
+                include.append(np.concatenate([corners, corners + rng.integers(1, 30, size=(4, 2))], axis=1))
+            include = np.concatenate(include).astype(np.int64)
+            exclude = include[rng.random(len(include)) < 0.3] + np.array([3, 3, -3, -3])
+            exclude = exclude[(exclude[:, 0] < exclude[:, 2]) & (exclude[:, 1] < exclude[:, 3])]
+
+            serial = gib.compressed_region_rectangles(include, exclude)
+            assert gib.compressed_region_rectangles(include, exclude, executor) == serial
@@ -0,0 +1,72 @@
+"""
+Stacked threshold levels (--levels) and the threshold sweep (--sweep).
+"""
+
+import argparse
+
+import numpy as np
+import pytest
+
+import generate_irregular_baseplate as gib
+from conftest import painted
+
+CONFIG = 'configs/config-nano.scad'
+
+
+def gray_image(seed: int, shape=(20, 24)) -> np.ndarray:
+    """Seeded gray levels darkening towards a few random centres, with noise."""
+    rng = np.random.default_rng(seed)
+    rows, cols = np.indices(shape)
+    distance = np.full(shape, np.inf)
+    for row, col in rng.integers(0, shape, size=(3, 2)):
+        distance = np.minimum(distance, np.hypot(rows - row, cols - col))
+    return np.clip(distance * 25 + rng.integers(-30, 30, size=shape), 0, 255).astype(np.uint8)
+
+
+@pytest.mark.parametrize('decompose', gib.DECOMPOSITION_STRATEGIES)
+@pytest.mark.parametrize('seed', range(4))
+def test_levels_cover_nested_masks_exactly(decompose, seed):
+    gray = gray_image(seed)
+    args = argparse.Namespace(decompose=decompose, engine=gib.DEFAULT_DECOMPOSITION_ENGINE,
+                              optimalMaxCells=gib.DEFAULT_OPTIMAL_MAX_CELLS, merge=False)
+    levels = gib.decompose_levels(gray, [40, 90, 150, 220], args, log=gib.discard_log)
+    assert [threshold for threshold, _, _ in levels] == [40, 90, 150, 220]
+    for (_, inner_mask, _), (_, mask, _) in zip(levels, levels[1:]):
+        assert not (inner_mask & ~mask).any()
+    for threshold, mask, rectangles in levels:
+        np.testing.assert_array_equal(mask, gray < threshold)
+        np.testing.assert_array_equal(painted(rectangles, mask.shape), mask)
+        if decompose == 'greedy' and threshold == 40:
+            assert rectangles == gib.decompose_mask(mask, 'greedy')
+
+
+def test_plan_stacks_levels_on_the_bottom_level():
+    gray = gray_image(5)
+    plan = gib.plan_baseplate(gray, CONFIG, levels='60,120,200', border=2.0)
+    np.testing.assert_array_equal(plan.mask, gray < 200)
+    np.testing.assert_array_equal(painted(plan.rectangles, gray.shape), gray < 200)
+    # Stacked levels bottom to top: darker pixels stack higher
+    assert [threshold for threshold, _ in plan.levels] == [120, 60]
+    for threshold, rectangles in plan.levels:
+        np.testing.assert_array_equal(painted(rectangles, gray.shape), gray < threshold)
+
+    script = plan.render()
+    assert '// Level 2: ' in script and 'stacked at 1 plate height(s)' in script
+    assert '// Level 3: ' in script and 'stacked at 2 plate height(s)' in script
+
+    # The same bottom level as a single threshold run
+    single = gib.plan_baseplate(gray, CONFIG, threshold=200, border=2.0)
+    np.testing.assert_array_equal(painted(single.rectangles, gray.shape), painted(plan.rectangles, gray.shape))
+    assert single.border_rectangles == plan.border_rectangles
+
+
+def test_sweep_counts_match_single_threshold_runs():
+    gray = gray_image(6, shape=(12, 14)) // 32 * 32
+    args = argparse.Namespace(decompose='greedy', engine=gib.DEFAULT_DECOMPOSITION_ENGINE,
+                              optimalMaxCells=gib.DEFAULT_OPTIMAL_MAX_CELLS, merge=False)
+    counts = gib.threshold_sweep(gray, args)
+    assert [threshold for threshold, _, _ in counts] == list(range(256))
+    for threshold, inside, plates in counts:
+        mask = gray < threshold
+        assert inside == np.count_nonzero(mask)
+        assert plates == len(gib.decompose_mask(mask, 'greedy'))
@@ -0,0 +1,184 @@
+"""
+Image and raw mask loading: the strip-wise PNG reader (--streamPng) against
+PIL, and the memory-mapped .npy and .pbm masks.
+"""
+
+import io
+import struct
+import zlib
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import generate_irregular_baseplate as gib
+
+
+def png_chunk(chunk_type: bytes, data: bytes) -> bytes:
+    return struct.pack('>I', len(data)) + chunk_type + data + struct.pack('>I', zlib.crc32(data, zlib.crc32(chunk_type)))
+
+
+def filter_row(row: bytes, above: bytes, kind: int, bpp: int) -> bytes:
+    """Straightforward PNG row filter, the inverse of what the reader undoes."""
+    out = bytearray()
+    for i, value in enumerate(row):
+        a = row[i - bpp] if i >= bpp else 0
+        b = above[i]
+        c = above[i - bpp] if i >= bpp else 0
+        if kind == 0:
+            predicted = 0
+        elif kind == 1:
+            predicted = a
+        elif kind == 2:
+            predicted = b
+        elif kind == 3:
+            predicted = (a + b) // 2
+        else:
+            p = a + b - c
+            pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+            predicted = a if pa <= pb and pa <= pc else (b if pb <= pc else c)
+        out.append((value - predicted) % 256)
+    return bytes(out)
+
+
+def encode_png(samples: np.ndarray, depth: int, color_type: int, palette: bytes = b'', rng=None) -> bytes:
+    """Write a PNG with a random filter type per row (or a fixed one for an int rng)."""
+    height, width = samples.shape[:2]
+    channels = gib.PNG_CHANNELS[color_type]
+    flat = samples.reshape(height, width * channels)
+    if depth == 16:
+        rows = [row.astype('>u2').tobytes() for row in flat]
+    elif depth == 8:
+        rows = [row.astype(np.uint8).tobytes() for row in flat]
+    else:
+        bits = ((flat[:, :, None] >> np.arange(depth - 1, -1, -1)) & 1).astype(np.uint8).reshape(height, -1)
+        rows = [np.packbits(row).tobytes() for row in bits]
+    bpp = max(1, channels * depth // 8)
+    above = bytes(len(rows[0]))
+    raw = bytearray()
+    for row in rows:
+        kind = rng if isinstance(rng, int) else int(rng.integers(0, 5))
+        raw.append(kind)
+        raw += filter_row(row, above, kind, bpp)
+        above = row
+    compressed = zlib.compress(bytes(raw))
+    chunks = png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, depth, color_type, 0, 0, 0))
+    if palette:
+        chunks += png_chunk(b'PLTE', palette)
+    # Split the image data over several IDAT chunks
+    for start in range(0, len(compressed), 97):
+        chunks += png_chunk(b'IDAT', compressed[start:start + 97])
+    return gib.PNG_SIGNATURE + chunks + png_chunk(b'IEND', b'')
+
+
+def pil_gray(data: bytes) -> np.ndarray:
+    image = Image.open(io.BytesIO(data))
+    return np.asarray(image if image.mode == 'L' else image.convert('L'))
+
+
+def read_strips(data: bytes, rows: int) -> np.ndarray:
+    width, height, strips = gib.read_png_gray_strips(io.BytesIO(data), 'test.png', rows)
+    gray = np.empty((height, width), dtype=np.uint8)
+    for strip, values in strips:
+        gray[strip] = values
+    return gray
+
+
+@pytest.mark.parametrize('color_type,depth', [
+    (0, 1), (0, 2), (0, 4), (0, 8), (0, 16),
+    (2, 8), (2, 16),
+    (3, 1), (3, 2), (3, 4), (3, 8),
+    (4, 8), (4, 16),
+    (6, 8), (6, 16),
+])
+def test_png_strips_match_pil(color_type, depth):
+    rng = np.random.default_rng([color_type, depth])
+    width, height = 13, 23
+    channels = gib.PNG_CHANNELS[color_type]
+    top = (1 << depth) - 1
+    samples = rng.integers(0, top + 1, size=(height, width, channels))
+    if color_type == 0 and depth == 16:
+        # Mostly values PIL keeps, some it clips to 255
+        samples = np.where(rng.random(samples.shape) < 0.8, samples % 256, samples)
+    palette = b''
+    if color_type == 3:
+        # Fewer palette entries than indices: missing ones are black
+        palette = rng.integers(0, 256, size=3 * max(1, (top + 1) * 3 // 4), dtype=np.uint8).tobytes()
+    data = encode_png(samples, depth, color_type, palette, rng)
+    expected = pil_gray(data)
+    for rows in (1, 4, 64):
+        np.testing.assert_array_equal(read_strips(data, rows), expected)
+
+
+@pytest.mark.parametrize('kind', range(5))
+def test_png_strips_undo_every_filter(kind):
+    rng = np.random.default_rng(kind)
+    samples = rng.integers(0, 256, size=(17, 11, 3))
+    data = encode_png(samples, 8, 2, rng=kind)
+    np.testing.assert_array_equal(read_strips(data, 5), pil_gray(data))
+
+
+@pytest.mark.parametrize('stream_png', [False, True])
+def test_pil_written_png_matches_pil(tmp_path, stream_png):
+    rng = np.random.default_rng(5)
+    path = tmp_path / 'shape.png'
+    Image.fromarray(rng.integers(0, 256, size=(40, 30, 4), dtype=np.uint8), 'RGBA').save(path)
+    expected = np.asarray(Image.open(path).convert('L')) < 100
+    np.testing.assert_array_equal(gib.load_and_threshold_image(str(path), 100, stream_png=stream_png), expected)
+    with open(path, 'rb') as f:
+        np.testing.assert_array_equal(gib.load_and_threshold_image(f, 100, stream_png=stream_png), expected)
+    np.testing.assert_array_equal(gib.load_grayscale_image(str(path), stream_png), np.asarray(Image.open(path).convert('L')))
+
+
+def test_interlaced_png_and_other_formats_fall_back_to_pil(tmp_path):
+    rng = np.random.default_rng(6)
+    data = bytearray(encode_png(rng.integers(0, 256, size=(6, 5, 1)), 8, 0, rng=0))
+    # Interlace method byte of IHDR (PIL does not write interlaced PNGs)
+    data[28] = 1
+    data[29:33] = struct.pack('>I', zlib.crc32(bytes(data[12:29])))
+    stream = io.BytesIO(bytes(data))
+    assert gib.read_png_gray_strips(stream, 'interlaced.png') is None
+    assert stream.tell() == 0
+
+    image = Image.fromarray(rng.integers(0, 256, size=(20, 25), dtype=np.uint8), 'L')
+    path = tmp_path / 'shape.bmp'
+    image.save(path)
+    np.testing.assert_array_equal(gib.load_and_threshold_image(str(path), stream_png=True), np.asarray(image) < 128)
+
+
+def test_truncated_and_broken_pngs_are_rejected():
+    data = encode_png(np.zeros((4, 8, 1), dtype=np.uint8), 8, 0, rng=0)
+    # Header promising more rows than the image data holds
+    header = png_chunk(b'IHDR', struct.pack('>IIBBBBB', 8, 9, 8, 0, 0, 0, 0))
+    with pytest.raises(ValueError, match='truncated'):
+        read_strips(gib.PNG_SIGNATURE + header + data[33:], 3)
+    # Corrupted CRC of the header
+    broken = bytearray(data)
+    broken[32] ^= 0xFF
+    with pytest.raises(ValueError, match='CRC'):
+        read_strips(bytes(broken), 3)
+
+
+def test_npy_masks(tmp_path):
+    rng = np.random.default_rng(7)
+    gray = rng.integers(0, 256, size=(30, 20), dtype=np.uint8)
+    np.save(tmp_path / 'gray.npy', gray)
+    np.save(tmp_path / 'mask.npy', gray < 50)
+    mask = gib.load_and_threshold_image(str(tmp_path / 'mask.npy'))
+    assert isinstance(mask, np.memmap)
+    np.testing.assert_array_equal(mask, gray < 50)
+    np.testing.assert_array_equal(gib.load_and_threshold_image(str(tmp_path / 'gray.npy'), 50), gray < 50)
+    np.save(tmp_path / 'cube.npy', np.zeros((2, 2, 2)))
+    with pytest.raises(ValueError):
+        gib.load_and_threshold_image(str(tmp_path / 'cube.npy'))
+
+
+def test_pbm_masks(tmp_path):
+    rng = np.random.default_rng(8)
+    mask = rng.random((21, 13)) < 0.5
+    path = tmp_path / 'mask.pbm'
+    path.write_bytes(b'P4\n# comment\n13 21\n' + np.packbits(mask, axis=1).tobytes())
+    np.testing.assert_array_equal(gib.load_and_threshold_image(str(path)), mask)
+    path.write_bytes(b'P4\n13 21\n' + np.packbits(mask, axis=1).tobytes()[:-1])
+    with pytest.raises(ValueError, match='truncated'):
+        gib.load_and_threshold_image(str(path))
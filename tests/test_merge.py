@@ -0,0 +1,91 @@
+"""
+merge_rectangles() against the cells of its input.
+
+Merging must cover exactly the cells the input covers, never let two
+rectangles overlap, never return more rectangles than it was given, and
+stop only when no two rectangles share a complete edge.
+"""
+
+import numpy as np
+import pytest
+
+import generate_irregular_baseplate as gib
+from conftest import painted
+
+
+def fragment(rectangles, rng, cuts: int = 3):
+    """Cut every rectangle at random positions into smaller non-overlapping pieces."""
+    pieces = []
+    for rect in rectangles:
+        stack = [rect]
+        for _ in range(rng.integers(0, cuts + 1)):
+            x, y, w, h = stack.pop(rng.integers(len(stack)))
+            if w > 1 and (h == 1 or rng.random() < 0.5):
+                cut = int(rng.integers(1, w))
+                stack += [(x, y, cut, h), (x + cut, y, w - cut, h)]
+            elif h > 1:
+                cut = int(rng.integers(1, h))
+                stack += [(x, y, w, cut), (x, y + cut, w, h - cut)]
+            else:
+                stack.append((x, y, w, h))
+        pieces += stack
+    rng.shuffle(pieces)
+    return [tuple(int(v) for v in piece) for piece in pieces]
+
+
+def rectangle_sets(count: int = 150):
+    """Seeded rectangle sets: decompositions of random masks, cut into random fragments."""
+    rng = np.random.default_rng(7)
+    yield []
+    yield [(0, 0, 1, 1)]
+    # A solid block cut into a grid merges back into one rectangle
+    yield [(x, y, 1, 1) for x in range(6) for y in range(4)]
+    # Pinwheel: no two pieces share a complete edge
+    yield [(0, 0, 2, 1), (2, 0, 1, 2), (1, 2, 2, 1), (0, 1, 1, 2), (1, 1, 1, 1)]
+    for _ in range(count):
+        rows, cols = rng.integers(1, 30, size=2)
+        mask = rng.random((rows, cols)) < rng.uniform(0.2, 0.95)
+        strategy = ('greedy', 'optimal')[rng.integers(2)]
+        yield fragment(gib.decompose_mask(mask, strategy), rng)
+
+
+def shared_complete_edge(a, b) -> bool:
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    return ((ay, ah) == (by, bh) and (ax + aw == bx or bx + bw == ax)) or \
+           ((ax, aw) == (bx, bw) and (ay + ah == by or by + bh == ay))
+
+
+RECTANGLE_SETS = list(rectangle_sets())
+
+
+@pytest.mark.parametrize('rectangles', RECTANGLE_SETS)
+def test_merge_keeps_cells_and_never_adds_rectangles(rectangles):
+    merged = gib.merge_rectangles(rectangles)
+    shape = (max([y + h for _, y, _, h in rectangles], default=0), max([x + w for x, _, w, _ in rectangles], default=0))
+    counts = painted(merged, shape)
+    np.testing.assert_array_equal(counts, painted(rectangles, shape))
+    assert counts.max(initial=0) <= 1
+    assert len(merged) <= len(rectangles)
+    assert merged == sorted(merged, key=lambda r: (r[1], r[0]))
+    for i, a in enumerate(merged):
+        for b in merged[i + 1:]:
+            assert not shared_complete_edge(a, b), (a, b)
+
+
+def test_merge_known_results():
+    assert gib.merge_rectangles(RECTANGLE_SETS[2]) == [(0, 0, 6, 4)]
+    assert len(gib.merge_rectangles(RECTANGLE_SETS[3])) == 5
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_merge_mm_rectangles_with_rounded_coordinates(seed):
+    # mm rectangles on a 0.1mm grid whose sums are off by float rounding
+    rng = np.random.default_rng(seed)
+    mask = rng.random((12, 14)) < 0.7
+    pieces = fragment(gib.decompose_mask(mask), rng)
+    mm = [(x * 0.1, y * 0.1, w * 0.1, h * 0.1) for x, y, w, h in pieces]
+    merged = gib.merge_mm_rectangles(mm)
+    cells = [tuple(int(round(v / 0.1)) for v in rect) for rect in merged]
+    np.testing.assert_array_equal(painted(cells, mask.shape), mask.astype(np.int32))
+    assert len(merged) <= len(mm)
@@ -0,0 +1,126 @@
+"""
+Manifoldness and volume of the merged cube mesh (--meshCubes).
+"""
+
+import struct
+import xml.etree.ElementTree as ElementTree
+import zipfile
+from collections import Counter
+
+import numpy as np
+import pytest
+
+import generate_irregular_baseplate as gib
+
+
+def random_boxes(seed: int) -> np.ndarray:
+    """
+    Non-overlapping boxes from a seeded random voxel grid with uneven spacing.
+
+    Every z layer is decomposed into rectangles, so boxes of neighbouring
+    layers and diagonal neighbours touch along edges and at corners.
+    """
+    rng = np.random.default_rng(seed)
+    voxels = rng.random((4, 6, 7)) < 0.35
+    xs = np.concatenate([[0.0], np.cumsum(np.round(rng.uniform(0.5, 3.0, voxels.shape[2]), 2))])
+    ys = np.concatenate([[0.0], np.cumsum(np.round(rng.uniform(0.5, 3.0, voxels.shape[1]), 2))])
+    zs = np.concatenate([[0.0], np.cumsum(np.round(rng.uniform(0.5, 3.0, voxels.shape[0]), 2))])
+    boxes = []
+    for z, layer in enumerate(voxels):
+        for (x, y, w, h) in gib.greedy_rectangle_decomposition(layer):
+            boxes.append((xs[x], ys[y], zs[z], xs[x + w], ys[y + h], zs[z + 1]))
+    return np.array(boxes, dtype=np.float64).reshape(-1, 6)
+
+
+def box_volume(boxes: np.ndarray) -> float:
+    return float(np.prod(boxes[:, 3:] - boxes[:, :3], axis=1).sum())
+
+
+def signed_volume(vertices: np.ndarray, triangles: np.ndarray) -> float:
+    corners = vertices[triangles]
+    return float(np.einsum('ij,ij->i', corners[:, 0], np.cross(corners[:, 1], corners[:, 2])).sum() / 6)
+
+
+def assert_manifold(triangles: np.ndarray) -> None:
+    """
+    Every undirected edge is used by exactly two faces, once in each
+    direction, and the faces around every vertex form a single fan.
+    """
+    directed = Counter()
+    for (v0, v1, v2) in triangles.tolist():
+        for edge in ((v0, v1), (v1, v2), (v2, v0)):
+            directed[edge] += 1
+    for (u, v), count in directed.items():
+        assert count == 1, f"edge {u}-{v} used {count} times in the same direction"
+        assert directed.get((v, u)) == 1, f"edge {u}-{v} has no opposite half"
+
+    # Around vertex v, triangle (v, a, b) is followed by the one holding v -> b
+    fans = {}
+    for (v0, v1, v2) in triangles.tolist():
+        for (v, a, b) in ((v0, v1, v2), (v1, v2, v0), (v2, v0, v1)):
+            fans.setdefault(v, {})[a] = b
+    for v, following in fans.items():
+        start = next(iter(following))
+        current, length = following[start], 1
+        while current != start:
+            current, length = following[current], length + 1
+        assert length == len(following), f"vertex {v} is shared by more than one fan"
+
+
+@pytest.mark.parametrize('seed', range(40))
+def test_random_boxes_mesh_is_manifold_with_box_volume(seed):
+    boxes = random_boxes(seed)
+    vertices, triangles = gib.mesh_boxes(boxes)
+    assert_manifold(triangles)
+    assert signed_volume(vertices, triangles) == pytest.approx(box_volume(boxes), rel=1e-9)
+
+
+@pytest.mark.parametrize('boxes', [
+    # Touching along an edge only
+    [(0, 0, 0, 1, 1, 1), (1, 1, 0, 2, 2, 1)],
+    # Touching at a corner only
+    [(0, 0, 0, 1, 1, 1), (1, 1, 1, 2, 2, 2)],
+    # Diagonal steps of a border next to a shared face
+    [(0, 0, 0, 2, 1, 1), (2, 1, 0, 3, 2, 1), (0, 1, 1, 2, 2, 2)],
+])
+def test_edge_and_corner_contacts(boxes):
+    boxes = np.array(boxes, dtype=np.float64)
+    vertices, triangles = gib.mesh_boxes(boxes)
+    assert_manifold(triangles)
+    assert signed_volume(vertices, triangles) == pytest.approx(box_volume(boxes))
+
+
+def test_border_cube_mesh_matches_rectangle_areas():
+    # 0.8mm bricks keep the 0.1mm border grid small
+    mask = np.zeros((6, 6), dtype=bool)
+    mask[1:3, 1:3] = True
+    mask[3:5, 3:5] = True
+    rectangles = gib.extract_border_rectangles_mm(mask, 0.3, 0.8, 0.0, geometry='raster')
+    height = 1.5
+    boxes = np.array([(x, y, 0.0, x + w, y + h, height) for (x, y, w, h) in rectangles])
+    vertices, triangles = gib.mesh_boxes(boxes)
+    assert_manifold(triangles)
+    area = sum(w * h for (_, _, w, h) in rectangles)
+    assert signed_volume(vertices, triangles) == pytest.approx(area * height)
+
+
+def test_writers_keep_triangles(tmp_path):
+    vertices, triangles = gib.mesh_boxes(random_boxes(1))
+
+    stl_path = tmp_path / 'cubes.stl'
+    gib.write_binary_stl(str(stl_path), vertices, triangles)
+    data = stl_path.read_bytes()
+    assert struct.unpack('<I', data[80:84])[0] == len(triangles)
+    assert len(data) == 84 + 50 * len(triangles)
+
+    mf_path = tmp_path / 'cubes.3mf'
+    gib.write_3mf(str(mf_path), vertices, triangles)
+    with zipfile.ZipFile(mf_path) as package:
+        model = ElementTree.fromstring(package.read('3D/3dmodel.model'))
+    namespace = {'m': 'http://schemas.microsoft.com/3dmanufacturing/core/2015/02'}
+    read_triangles = np.array([[int(t.get(k)) for k in ('v1', 'v2', 'v3')]
+                               for t in model.iterfind('.//m:triangle', namespace)])
+    read_vertices = np.array([[float(v.get(k)) for k in 'xyz'] for v in model.iterfind('.//m:vertex', namespace)])
+    np.testing.assert_array_equal(read_triangles, triangles)
+    assert len(read_vertices) == len(vertices)
+    assert_manifold(read_triangles)
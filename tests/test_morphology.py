@@ -0,0 +1,169 @@
+"""
+Chessboard distance morphology against iterated 3x3 dilation and erosion.
+
+dilate_chessboard() and chessboard_depth() replace loops of
+ndimage.binary_dilation()/binary_erosion() with the 8-connected structure;
+these tests check that the masks they produce are bit-identical.
+"""
+
+import numpy as np
+import pytest
+from scipy import ndimage
+
+import generate_irregular_baseplate as gib
+from conftest import painted
+
+
+STRUCTURE = ndimage.generate_binary_structure(2, 2)
+RADII = range(0, 13)
+SEEDS = range(6)
+
+
+def random_mask(seed: int, shape=(23, 31), density=0.15) -> np.ndarray:
+    """Seeded random mask with pixels set on every side of the array."""
+    rng = np.random.default_rng(seed)
+    mask = rng.random(shape) < density
+    mask[0, rng.integers(shape[1])] = True
+    mask[-1, rng.integers(shape[1])] = True
+    mask[rng.integers(shape[0]), 0] = True
+    mask[rng.integers(shape[0]), -1] = True
+    return mask
+
+
+def blob_mask(seed: int, shape=(19, 17)) -> np.ndarray:
+    """Seeded mask of solid blobs that reach the array border."""
+    rng = np.random.default_rng(seed)
+    mask = ndimage.binary_dilation(rng.random(shape) < 0.08, structure=STRUCTURE, iterations=2)
+    mask[:, :3] = True
+    return mask
+
+
+def iterated_dilation(mask: np.ndarray, radius: int) -> np.ndarray:
+    result = mask.copy()
+    for _ in range(radius):
+        result = ndimage.binary_dilation(result, structure=STRUCTURE)
+    return result
+
+
+def iterated_erosion(mask: np.ndarray, radius: int) -> np.ndarray:
+    result = mask.copy()
+    for _ in range(radius):
+        result = ndimage.binary_erosion(result, structure=STRUCTURE)
+    return result
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_dilate_chessboard_matches_iterated_dilation(seed):
+    for mask in (random_mask(seed), blob_mask(seed)):
+        distance = gib.chessboard_distance_to(mask)
+        for radius in RADII:
+            expected = iterated_dilation(mask, radius)
+            np.testing.assert_array_equal(gib.dilate_chessboard(distance, radius, mask.shape), expected)
+
+
+def test_dilate_chessboard_empty_mask():
+    mask = np.zeros((7, 9), dtype=bool)
+    distance = gib.chessboard_distance_to(mask)
+    assert distance is None
+    for radius in RADII:
+        np.testing.assert_array_equal(gib.dilate_chessboard(distance, radius, mask.shape), iterated_dilation(mask, radius))
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_chessboard_depth_matches_iterated_erosion(seed):
+    full = np.ones((12, 15), dtype=bool)
+    for mask in (blob_mask(seed), ~random_mask(seed), full):
+        depth = gib.chessboard_depth(mask)
+        for radius in RADII:
+            np.testing.assert_array_equal(depth > radius, iterated_erosion(mask, radius))
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_edge_and_interior_match_iterated_erosion(seed):
+    mask = blob_mask(seed)
+    for thickness in RADII:
+        edge, interior = gib.extract_edge_and_interior(mask, thickness)
+        expected = iterated_erosion(mask, thickness)
+        np.testing.assert_array_equal(interior, expected)
+        np.testing.assert_array_equal(edge, mask & ~expected)
+
+
+@pytest.mark.parametrize('geometry', gib.BORDER_GEOMETRIES)
+@pytest.mark.parametrize('seed', range(3))
+def test_border_layers_match_iterated_dilation(geometry, seed):
+    # 0.8mm bricks are 8 pixels of the 0.1mm grid, which keeps the arrays small
+    unit_size = 0.8
+    scale = int(round(unit_size / gib.BORDER_RESOLUTION_MM))
+    mask = random_mask(seed, shape=(6, 7), density=0.4)
+    for border_mm, inset_mm in ((0.1, 0.0), (0.45, 0.2), (1.1, 0.1), (1.2, 1.1)):
+        # Pixel radii as extract_border_rectangles_mm() derives them
+        border_pixels = int(np.ceil(border_mm / gib.BORDER_RESOLUTION_MM))
+        inset_pixels = int(np.round(inset_mm / gib.BORDER_RESOLUTION_MM))
+        hr_shape = np.kron(mask, np.ones((scale, scale), dtype=bool))
+        hr_shape = np.pad(hr_shape, border_pixels)
+        expected_base = iterated_dilation(hr_shape, border_pixels) & ~hr_shape
+        expected_top = iterated_dilation(hr_shape, border_pixels) & ~iterated_dilation(hr_shape, inset_pixels)
+
+        base = gib.extract_border_rectangles_mm(mask, border_mm, unit_size, 0.0, geometry=geometry)
+        top = gib.extract_border_rectangles_mm(mask, border_mm, unit_size, inset_mm, geometry=geometry)
+
+        np.testing.assert_array_equal(painted(base, hr_shape.shape, border_pixels, gib.BORDER_RESOLUTION_MM), expected_base)
+        np.testing.assert_array_equal(painted(top, hr_shape.shape, border_pixels, gib.BORDER_RESOLUTION_MM), expected_top)
+
+
+@pytest.mark.parametrize('geometry', gib.BORDER_GEOMETRIES)
+@pytest.mark.parametrize('seed', range(3))
+def test_frame_layers_match_raster(geometry, seed):
+    unit_size = 0.8
+    scale = int(round(unit_size / gib.BORDER_RESOLUTION_MM))
+    # Frame edges lie on the 0.1mm grid from the padded bounding box, so the
+    # paddings are whole pixels; the empty first row and column keep the
+    # bounding box off the mask origin
+    mask = random_mask(seed, shape=(6, 7), density=0.4)
+    mask[0, :] = mask[:, 0] = False
+    for padding_mm, inset_mm in ((0.0, 0.0), (0.4, 0.2), (1.1, 0.1), (1.2, 1.1), (0.3, 0.7)):
+        padding_pixels = int(np.round(padding_mm / gib.BORDER_RESOLUTION_MM))
+        inset_pixels = int(np.round(inset_mm / gib.BORDER_RESOLUTION_MM))
+        offset = padding_pixels + inset_pixels
+        hr_shape = np.pad(np.kron(mask, np.ones((scale, scale), dtype=bool)), offset)
+        rows, cols = np.nonzero(hr_shape)
+        box = np.zeros_like(hr_shape)
+        box[rows.min() - padding_pixels:rows.max() + 1 + padding_pixels, cols.min() - padding_pixels:cols.max() + 1 + padding_pixels] = True
+        expected = box & ~iterated_dilation(hr_shape, inset_pixels)
+
+        frame = gib.extract_frame_rectangles_mm(mask, padding_mm, unit_size, inset_mm, geometry=geometry)
+        raster = gib.extract_frame_rectangles_mm(mask, padding_mm, unit_size, inset_mm, geometry='raster')
+        assert frame == raster
+        np.testing.assert_array_equal(painted(frame, hr_shape.shape, offset, gib.BORDER_RESOLUTION_MM), expected)
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_upsample_mask_hr_matches_kron(seed):
+    rng = np.random.default_rng(seed)
+    mask = random_mask(seed, shape=(9, 11), density=0.4)
+    scale, pad = 8, 5
+    expected = np.pad(np.kron(mask, np.ones((scale, scale), dtype=bool)), pad)
+    col_starts = np.arange(mask.shape[1]) * scale
+    row_starts = np.arange(mask.shape[0]) * scale
+    windows = [(0, 0, mask.shape[1] * scale, mask.shape[0] * scale), (-pad, -pad, mask.shape[1] * scale + pad, mask.shape[0] * scale + pad)]
+    for _ in range(10):
+        x0, x1 = np.sort(rng.integers(-pad, mask.shape[1] * scale + pad, size=2))
+        y0, y1 = np.sort(rng.integers(-pad, mask.shape[0] * scale + pad, size=2))
+        windows.append((x0, y0, x1 + 1, y1 + 1))
+    for x0, y0, x1, y1 in windows:
+        upsampled = gib.upsample_mask_hr(mask, col_starts, col_starts + scale, row_starts, row_starts + scale, (x0, y0, x1, y1))
+        np.testing.assert_array_equal(upsampled, expected[y0 + pad:y1 + pad, x0 + pad:x1 + pad])
+
+
+def test_upsample_mask_hr_matches_painted_cells_on_rounded_bounds():
+    # 1.55mm bricks on the 0.1mm grid are 15 or 16 pixels wide; the first
+    # and last cells are cut by the clamped grid edges
+    mask = random_mask(2, shape=(8, 8), density=0.5)
+    bounds = np.clip(np.round(np.arange(9) * 15.5 - 3), 0, 100).astype(np.int64)
+    expected = np.zeros((100, 100), dtype=bool)
+    for row, col in zip(*np.nonzero(mask)):
+        expected[bounds[row]:bounds[row + 1], bounds[col]:bounds[col + 1]] = True
+    for window in ((0, 0, 100, 100), (7, 20, 61, 93)):
+        x0, y0, x1, y1 = window
+        upsampled = gib.upsample_mask_hr(mask, bounds[:-1], bounds[1:], bounds[:-1], bounds[1:], window)
+        np.testing.assert_array_equal(upsampled, expected[y0:y1, x0:x1])
@@ -0,0 +1,104 @@
+"""
+Minimum rectangle partition (--decompose=optimal) against brute force.
+"""
+
+from functools import lru_cache
+
+import numpy as np
+import pytest
+
+import generate_irregular_baseplate as gib
+from conftest import painted
+
+
+def brute_force_minimum(mask: np.ndarray) -> int:
+    """Minimum number of rectangles partitioning the mask, by exhaustive search."""
+    rows, cols = mask.shape
+    cells = [(r, c) for r in range(rows) for c in range(cols) if mask[r, c]]
+    index = {cell: i for i, cell in enumerate(cells)}
+
+    @lru_cache(maxsize=None)
+    def best(uncovered: int) -> int:
+        if uncovered == 0:
+            return 0
+        # The first uncovered cell in scan order is the top-left corner of
+        # the rectangle covering it
+        row, col = cells[(uncovered & -uncovered).bit_length() - 1]
+        result = len(cells)
+        for height in range(1, rows - row + 1):
+            for width in range(1, cols - col + 1):
+                bits = 0
+                for r in range(row, row + height):
+                    for c in range(col, col + width):
+                        i = index.get((r, c))
+                        if i is None or not (uncovered >> i) & 1:
+                            break
+                        bits |= 1 << i
+                    else:
+                        continue
+                    break
+                else:
+                    result = min(result, 1 + best(uncovered & ~bits))
+        return result
+
+    return best((1 << len(cells)) - 1)
+
+
+def assert_partition(rectangles, mask: np.ndarray) -> None:
+    np.testing.assert_array_equal(painted(rectangles, mask.shape), mask.astype(np.int32))
+
+
+def small_masks():
+    """Seeded random masks plus shapes with holes."""
+    rng = np.random.default_rng(6)
+    for _ in range(150):
+        rows, cols = rng.integers(2, 6, size=2)
+        yield rng.random((rows, cols)) < rng.uniform(0.5, 0.9)
+    ring = np.ones((5, 5), dtype=bool)
+    ring[2, 2] = False
+    yield ring
+    two_holes = np.ones((5, 6), dtype=bool)
+    two_holes[1, 1] = two_holes[3, 4] = False
+    yield two_holes
+    wide_hole = np.ones((5, 6), dtype=bool)
+    wide_hole[2, 1:4] = False
+    yield wide_hole
+    for _ in range(20):
+        mask = np.ones(tuple(rng.integers(4, 6, size=2)), dtype=bool)
+        mask[1:-1, 1:-1] &= rng.random((mask.shape[0] - 2, mask.shape[1] - 2)) < 0.6
+        yield mask
+
+
+MASKS = list(small_masks())
+
+
+@pytest.mark.parametrize('index', range(len(MASKS)))
+def test_optimal_matches_brute_force_minimum(index):
+    mask = MASKS[index]
+    rectangles = gib.decompose_mask(mask, 'optimal')
+    assert_partition(rectangles, mask)
+    assert len(rectangles) == brute_force_minimum(mask)
+
+
+def test_fallback_above_cell_limit_uses_greedy():
+    rng = np.random.default_rng(11)
+    mask = rng.random((30, 30)) < 0.7
+    assert gib.decompose_mask(mask, 'optimal', max_component_cells=0) == gib.greedy_rectangle_decomposition(mask)
+
+
+def test_fallback_applies_per_component():
+    # A large component above the limit next to a small one below it
+    large = np.ones((6, 8), dtype=bool)
+    large[2:4, 3:5] = False
+    small = np.array([[True, True, False], [True, True, True], [False, True, True]])
+    mask = np.zeros((6, 13), dtype=bool)
+    mask[:, :8] = large
+    mask[:3, 10:] = small
+    limit = int(small.sum())
+
+    rectangles = gib.decompose_mask(mask, 'optimal', max_component_cells=limit)
+    assert_partition(rectangles, mask)
+    left = [rect for rect in rectangles if rect[0] < 8]
+    right = [rect for rect in rectangles if rect[0] >= 10]
+    assert left == gib.greedy_rectangle_decomposition(large)
+    assert len(right) == brute_force_minimum(small)
@@ -0,0 +1,77 @@
+"""
+Border/frame outlines (--borderStyle=outline): the traced polygons, filled
+with the even-odd rule, cover exactly the cube rectangles they replace.
+"""
+
+import re
+
+import numpy as np
+import pytest
+
+import generate_irregular_baseplate as gib
+from conftest import painted
+
+CONFIG = 'configs/config-nano.scad'
+
+
+def even_odd_fill(loops, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+    """Points (xs x ys) inside the loops, by counting edges crossed by a ray to the right."""
+    inside = np.zeros((len(ys), len(xs)), dtype=bool)
+    for loop in loops:
+        for (x0, y0), (x1, y1) in zip(loop, loop[1:] + loop[:1]):
+            if x0 != x1:
+                continue
+            low, high = min(y0, y1), max(y0, y1)
+            crossed = (ys[:, None] >= low) & (ys[:, None] < high) & (xs[None, :] < x0)
+            inside ^= crossed
+    return inside
+
+
+def test_traced_outlines_fill_the_rectangles():
+    rng = np.random.default_rng(14)
+    for _ in range(80):
+        rows, cols = rng.integers(1, 16, size=2)
+        mask = rng.random((rows, cols)) < rng.uniform(0.2, 0.9)
+        rectangles = gib.decompose_mask(mask, 'greedy')
+        loops = gib.trace_region_outlines(rectangles)
+        centers_x, centers_y = np.arange(cols) + 0.5, np.arange(rows) + 0.5
+        np.testing.assert_array_equal(even_odd_fill(loops, centers_x, centers_y), mask)
+        for loop in loops:
+            # Closed, simple loops of axis-aligned edges without collinear vertices
+            assert len(loop) >= 4 and len(set(loop)) == len(loop)
+            for a, b, c in zip(loop, loop[1:] + loop[:1], loop[2:] + loop[:2]):
+                assert (a[0] == b[0]) != (a[1] == b[1])
+                assert (a[0] == b[0]) != (b[0] == c[0])
+
+
+def polygons(script: str):
+    """Loops of every polygon() in a script, as lists of (x, y) points."""
+    found = []
+    for points, paths in re.findall(r"polygon\(\s*points = \[(.*?)\],\s*paths = \[(.*?)\]\s*\);", script, re.DOTALL):
+        vertices = [tuple(float(v) for v in point.split(',')) for point in re.findall(r"\[([^\[\]]+)\]", points)]
+        found.append([[vertices[int(i)] for i in path.split(',')] for path in re.findall(r"\[([^\[\]]+)\]", paths)])
+    return found
+
+
+@pytest.mark.parametrize('frame', [False, True])
+def test_outline_script_covers_the_cube_rectangles(frame):
+    rng = np.random.default_rng(15)
+    mask = rng.random((9, 8)) < 0.6
+    options = {'border': 2.3, 'frame': frame, 'borderHeightAdjust': 1.0}
+    plan = gib.plan_baseplate(mask, CONFIG, **options)
+    script = gib.plan_baseplate(mask, CONFIG, borderStyle='outline', **options).render()
+    layers = polygons(script)
+    assert len(layers) == 2
+    assert 'cube(' not in script
+
+    # Even-odd fill sampled at the centers of the 0.1mm border grid
+    low = min(x for x, _, _, _ in plan.border_rectangles) - 1.0
+    high = max(max(x + w, y + h) for x, y, w, h in plan.border_rectangles) + 1.0
+    size = int(round((high - low) / 0.1))
+    centers = low + (np.arange(size) + 0.5) * 0.1
+    image_height = mask.shape[0] * plan.unit_size
+    for loops, rectangles in zip(layers, (plan.border_rectangles, plan.border_rectangles_top)):
+        # The script flips Y so the image top ends up at the back
+        grid = [(int(round((x - low) / 0.1)), int(round((image_height - y - h - low) / 0.1)), int(round(w / 0.1)), int(round(h / 0.1)))
+                for x, y, w, h in rectangles]
+        np.testing.assert_array_equal(even_odd_fill(loops, centers, centers), painted(grid, (size, size)))
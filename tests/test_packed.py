@@ -0,0 +1,130 @@
+"""
+PackedMask bit operations and the 'packed' border geometry.
+
+The packed mask must behave exactly like the boolean array it stores,
+including the padding bits at the end of rows whose width is not a
+multiple of 8, and the 'packed' border and frame must cover the same
+pixels as the 'raster' and 'exact' geometries.
+"""
+
+import numpy as np
+import pytest
+
+import generate_irregular_baseplate as gib
+from conftest import painted
+
+
+WIDTHS = (1, 5, 8, 9, 13, 16, 23)
+SEEDS = range(4)
+
+
+def random_mask(seed: int, width: int, rows: int = 11, density: float = 0.4) -> np.ndarray:
+    return np.random.default_rng(seed * 100 + width).random((rows, width)) < density
+
+
+def assert_packed_equal(packed: gib.PackedMask, expected: np.ndarray):
+    """Cells match and the padding bits are still zero."""
+    assert packed.shape == expected.shape
+    np.testing.assert_array_equal(packed.to_bool(), expected)
+    np.testing.assert_array_equal(packed.bits, np.packbits(expected, axis=1))
+
+
+def shifted(mask: np.ndarray, row_offset: int, col_offset: int) -> np.ndarray:
+    """Reference shift: cell (r, c) moves to (r + row_offset, c + col_offset), zero filled."""
+    result = np.zeros_like(mask)
+    rows, cols = mask.shape
+    src_rows = slice(max(-row_offset, 0), max(rows - row_offset, 0))
+    dst_rows = slice(max(row_offset, 0), max(rows + row_offset, 0))
+    src_cols = slice(max(-col_offset, 0), max(cols - col_offset, 0))
+    dst_cols = slice(max(col_offset, 0), max(cols + col_offset, 0))
+    if abs(row_offset) < rows and abs(col_offset) < cols:
+        result[dst_rows, dst_cols] = mask[src_rows, src_cols]
+    return result
+
+
+@pytest.mark.parametrize('width', WIDTHS)
+@pytest.mark.parametrize('seed', SEEDS)
+def test_bitwise_operators(width, seed):
+    first = random_mask(seed, width)
+    second = random_mask(seed + 50, width)
+    packed_first = gib.PackedMask.from_bool(first)
+    packed_second = gib.PackedMask.from_bool(second)
+    assert_packed_equal(packed_first & packed_second, first & second)
+    assert_packed_equal(packed_first | packed_second, first | second)
+    assert_packed_equal(~packed_first, ~first)
+    assert_packed_equal(packed_first & ~packed_second, first & ~second)
+    assert packed_first.count() == int(first.sum())
+    assert packed_first.any() == bool(first.any())
+
+
+@pytest.mark.parametrize('width', WIDTHS)
+def test_invert_of_empty_and_full_masks(width):
+    empty = np.zeros((3, width), dtype=bool)
+    assert_packed_equal(~gib.PackedMask.zeros(empty.shape), ~empty)
+    assert_packed_equal(~gib.PackedMask.from_bool(~empty), empty)
+    assert (~gib.PackedMask.zeros(empty.shape)).count() == empty.size
+
+
+@pytest.mark.parametrize('width', WIDTHS)
+@pytest.mark.parametrize('seed', SEEDS)
+def test_row_and_column_shifts(width, seed):
+    mask = random_mask(seed, width)
+    packed = gib.PackedMask.from_bool(mask)
+    for offset in range(-mask.shape[0] - 1, mask.shape[0] + 2):
+        assert_packed_equal(packed.shift_rows(offset), shifted(mask, offset, 0))
+    for offset in range(-width - 9, width + 10):
+        assert_packed_equal(packed.shift_cols(offset), shifted(mask, 0, offset))
+
+
+@pytest.mark.parametrize('width', WIDTHS)
+@pytest.mark.parametrize('seed', SEEDS)
+def test_dilate_matches_dilate_chessboard(width, seed):
+    mask = random_mask(seed, width, density=0.1)
+    packed = gib.PackedMask.from_bool(mask)
+    distance = gib.chessboard_distance_to(mask)
+    for pixels in range(0, 12):
+        assert_packed_equal(packed.dilate(pixels), gib.dilate_chessboard(distance, pixels, mask.shape))
+
+
+@pytest.mark.parametrize('width', WIDTHS)
+@pytest.mark.parametrize('seed', SEEDS)
+def test_runs_and_row_slices(width, seed):
+    mask = random_mask(seed, width)
+    mask[0] = True
+    mask[1] = False
+    packed = gib.PackedMask.from_bool(mask)
+    assert packed.runs() == gib.encode_mask_runs(mask)
+    np.testing.assert_array_equal(packed[2:7], mask[2:7])
+
+
+def test_from_cells_matches_upsample_mask_hr():
+    mask = random_mask(0, 9, rows=7)
+    # Uneven brick sizes, as rounding to the 0.1mm grid produces them
+    col_starts = np.array([0, 3, 7, 10, 13, 17, 20, 23, 27])
+    col_ends = col_starts + np.array([3, 4, 3, 3, 4, 3, 3, 4, 3])
+    row_starts = np.array([0, 2, 5, 7, 10, 12, 15])
+    row_ends = row_starts + np.array([3, 3, 2, 3, 3, 3, 2])
+    for window in ((0, 0, 30, 17), (2, 1, 21, 14), (5, 4, 6, 5)):
+        expected = gib.upsample_mask_hr(mask, col_starts, col_ends, row_starts, row_ends, window)
+        assert_packed_equal(gib.PackedMask.from_cells(mask, col_starts, col_ends, row_starts, row_ends, window), expected)
+
+
+@pytest.mark.parametrize('extract', [gib.extract_border_rectangles_mm, gib.extract_frame_rectangles_mm])
+@pytest.mark.parametrize('seed', range(3))
+def test_packed_border_and_frame_match_raster_and_exact(extract, seed):
+    # 0.8mm bricks are 8 pixels of the 0.1mm grid; 0.75mm bricks make the
+    # brick edges round unevenly
+    mask = random_mask(seed, 7, rows=6, density=0.45)
+    for unit_size in (0.8, 0.75):
+        for thickness_mm, inset_mm in ((0.1, 0.0), (0.4, 0.2), (0.7, 0.3), (1.1, 0.1), (1.2, 1.1), (0.0, 0.0)):
+            offset = int(np.ceil(thickness_mm / gib.BORDER_RESOLUTION_MM)) + 1
+            shape = (int(np.ceil(mask.shape[0] * unit_size / gib.BORDER_RESOLUTION_MM)) + 2 * offset,
+                     int(np.ceil(mask.shape[1] * unit_size / gib.BORDER_RESOLUTION_MM)) + 2 * offset)
+            counts = {
+                geometry: painted(extract(mask, thickness_mm, unit_size, inset_mm, geometry=geometry), shape, offset,
+                                  gib.BORDER_RESOLUTION_MM)
+                for geometry in gib.BORDER_GEOMETRIES
+            }
+            assert counts['packed'].max() <= 1
+            np.testing.assert_array_equal(counts['packed'], counts['raster'])
+            np.testing.assert_array_equal(counts['packed'], counts['exact'])
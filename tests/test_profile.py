@@ -0,0 +1,61 @@
+"""
+Pipeline profiling (--profile, --profileStats): stage records and the
+profile sidecar written next to the output.
+"""
+
+import json
+import os
+import pstats
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import generate_irregular_baseplate as gib
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_profile_stage_records_time_memory_and_slowest_stage():
+    with gib.profile_stage(None, 'skipped') as record:
+        record['cells'] = 1
+    assert record == {'stage': 'skipped', 'cells': 1}
+
+    profile = gib.new_profile(cprofile=True)
+    tracemalloc.start()
+    try:
+        with gib.profile_stage(profile, 'fast') as record:
+            record['cells'] = 2
+        with gib.profile_stage(profile, 'slow'):
+            buffer = bytearray(4 * 1024 * 1024)
+            time.sleep(0.05)
+            del buffer
+    finally:
+        tracemalloc.stop()
+
+    fast, slow = profile['stages']
+    assert fast['stage'] == 'fast' and fast['cells'] == 2
+    assert slow['wall_s'] >= 0.05 > fast['wall_s']
+    assert slow['peak_mb'] >= 4 > fast['peak_mb']
+    assert profile['slowest'][1] == 'slow'
+
+
+def test_profile_sidecar_of_a_run(tmp_path):
+    output = tmp_path / 'shape.scad'
+    subprocess.run([sys.executable, 'generate_irregular_baseplate.py', 'tests/test-shape.png', '-o', str(output),
+                    '--config=configs/config-nano.scad', '--no-cache', '--edge=1', '--border=2', '--profile', '--profileStats'],
+                   cwd=ROOT, capture_output=True, text=True, check=True)
+
+    profile = json.loads((tmp_path / 'shape.profile.json').read_text())
+    stages = {record['stage']: record for record in profile['stages']}
+    assert list(stages) == ['load', 'threshold', 'edge split', 'decompose', 'decompose interior', 'border base', 'script', 'write']
+    assert stages['load']['image'] == '5x5'
+    assert stages['edge split']['edge_cells'] + stages['edge split']['interior_cells'] == stages['threshold']['inside_cells']
+    assert stages['script']['bytes'] == output.stat().st_size
+    assert stages['script']['lines'] == len(output.read_text().splitlines())
+    assert all(record['peak_mb'] <= profile['peak_mb'] for record in profile['stages'])
+    assert abs(profile['total_wall_s'] - sum(record['wall_s'] for record in profile['stages'])) < 1e-5
+    assert profile['slowest_stage'] == max(profile['stages'], key=lambda record: record['wall_s'])['stage']
+
+    assert profile['cprofile_stats'] == 'shape.prof'
+    assert pstats.Stats(str(tmp_path / 'shape.prof')).total_calls > 0
@@ -0,0 +1,138 @@
+"""
+Generated OpenSCAD scripts: compact and expanded output place the same plates
+and cubes, a script streamed to stdout equals the written file, shards add up
+to the full script, and the plan_baseplate() API renders what the command line
+writes.
+"""
+
+import json
+import os
+import re
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+import generate_irregular_baseplate as gib
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CONFIG = 'configs/config-nano.scad'
+
+# Translation z offsets may index config vectors, e.g. unitGrid[1]
+Z = r"((?:[^\[\]]|\[\d\])+)"
+EXPANDED_PLATE = re.compile(r"translate\(\[([^,\]]+), ([^,\]]+), " + Z + r"\]\) \{\s*machineblock\(\s*size = \[(\d+), (\d+), 1\]")
+EXPANDED_CUBE = re.compile(r"translate\(\[([^,\]]+), ([^,\]]+), " + Z + r"\]\) \{\s*cube\(\[\s*([\d.]+)[^\n]*\n\s*([\d.]+)")
+COMPACT_LOOP = re.compile(r"for \((\w) = \[\n(.*?)\n\]\) translate\(\[\w\[0\], \w\[1\], " + Z + r"\]\) "
+                          r"(?:baseplate\(\[(\d+), (\d+)\]\)|cube)", re.DOTALL)
+
+
+def placements(script: str):
+    """Sorted (kind, x, y, z, width, height) of every plate and cube in a script."""
+    found = []
+    for pattern, kind in ((EXPANDED_PLATE, 'plate'), (EXPANDED_CUBE, 'cube')):
+        for x, y, z, w, h in pattern.findall(script):
+            found.append((kind, float(x), float(y), z, float(w), float(h)))
+    for variable, rows, z, plate_w, plate_h in COMPACT_LOOP.findall(script):
+        for row in re.findall(r"\[([^\]]+)\]", rows):
+            values = [float(value) for value in row.split(',')]
+            if variable == 'p':
+                found.append(('plate', values[0], values[1], z, float(plate_w), float(plate_h)))
+            else:
+                found.append(('cube', values[0], values[1], z, values[2], values[3]))
+    return sorted(found)
+
+
+def shape_mask() -> np.ndarray:
+    rng = np.random.default_rng(13)
+    mask = np.zeros((12, 14), dtype=bool)
+    mask[1:11, 1:13] = True
+    mask[rng.integers(1, 11, size=12), rng.integers(1, 13, size=12)] = False
+    return mask
+
+
+@pytest.mark.parametrize('options', [
+    {},
+    {'edge': 1, 'border': 2.0, 'borderHeightAdjust': 1.0},
+    {'border': 3.0, 'frame': True, 'borderHeightAdjust': 0.5},
+    {'edge': 2, 'center': True},
+])
+def test_compact_and_expanded_scripts_place_the_same_parts(options):
+    mask = shape_mask()
+    expanded = gib.plan_baseplate(mask, CONFIG, **options).render()
+    compact = gib.plan_baseplate(mask, CONFIG, compact=True, **options).render()
+    expected = placements(expanded)
+    assert sum(kind == 'plate' for kind, *_ in expected) > 1
+    assert placements(compact) == expected
+    # One machineblock() call, inside the baseplate(size) module
+    assert compact.count('machineblock(') == 1
+    assert len(compact) < len(expanded)
+
+
+def run_cli(*argv) -> subprocess.CompletedProcess:
+    """Run the command line script from the repository root."""
+    return subprocess.run([sys.executable, 'generate_irregular_baseplate.py', *argv, f'--config={CONFIG}', '--no-cache'],
+                          cwd=ROOT, capture_output=True, text=True, check=True)
+
+
+@pytest.mark.parametrize('options', [[], ['--edge=1', '--border=2', '--borderHeightAdjust=1', '--compact']])
+def test_script_on_stdout_matches_file(tmp_path, options):
+    output = tmp_path / 'shape.scad'
+    written = run_cli('tests/test-shape.png', '-o', str(output), *options)
+    streamed = run_cli('tests/test-shape.png', '-o', '-', *options)
+    assert streamed.stdout == output.read_text()
+    # Status messages go to stderr so they cannot end up in the script
+    assert 'Done!' in streamed.stderr and 'Done!' in written.stdout
+    lines = int(re.search(r"Script size: (\d+) lines", written.stdout).group(1))
+    assert lines == len(output.read_text().split('\n'))
+
+
+def test_compact_comparison_only_when_profiling(tmp_path):
+    expanded = tmp_path / 'expanded.scad'
+    run_cli('tests/test-shape.png', '-o', str(expanded), '--border=2')
+    compact = run_cli('tests/test-shape.png', '-o', str(tmp_path / 'compact.scad'), '--border=2', '--compact')
+    assert 'Without compact mode' not in compact.stdout
+    profiled = run_cli('tests/test-shape.png', '-o', str(tmp_path / 'compact.scad'), '--border=2', '--compact', '--profile')
+    lines, size = re.search(r"Without compact mode: (\d+) lines, ([\d.]+) KB", profiled.stdout).groups()
+    assert int(lines) == len(expanded.read_text().split('\n'))
+    assert size == f"{expanded.stat().st_size / 1024:.1f}"
+
+
+@pytest.mark.parametrize('compact', [False, True])
+def test_shards_add_up_to_the_full_script(tmp_path, compact):
+    mask = shape_mask()
+    options = {'edge': 1, 'border': 2.0, 'borderHeightAdjust': 1.0, 'compact': compact}
+    full = gib.plan_baseplate(mask, CONFIG, **options).render()
+    assert full.split(';\n\n')[0].endswith(f'include <{CONFIG}>')
+    gib.plan_baseplate(mask, CONFIG, shards=3, **options).render(str(tmp_path / 'shape.scad'))
+
+    manifest = json.loads((tmp_path / 'shape.shards.json').read_text())
+    assert [shard['scad'] for shard in manifest['shards']] == [f'shape.shard-0{i}.scad' for i in (1, 2, 3)]
+    sharded = []
+    for shard in manifest['shards']:
+        script = (tmp_path / shard['scad']).read_text()
+        # Every shard is a complete script with the same imports and config
+        assert script.split(';\n\n')[0] == full.split(';\n\n')[0]
+        found = placements(script)
+        assert shard['plates'] == sum(kind == 'plate' for kind, *_ in found)
+        assert shard['plates'] + shard['interior_cubes'] + shard['border_cubes'] == len(found)
+        sharded.extend(found)
+    assert sorted(sharded) == placements(full)
+
+    assembly = (tmp_path / 'shape.scad').read_text()
+    assert [line for line in assembly.splitlines() if line.startswith('import(')] == \
+        [f'import("{shard["mesh"]}");' for shard in manifest['shards']]
+
+
+@pytest.mark.parametrize('options', [
+    {},
+    {'edge': 2, 'border': 2.5, 'borderHeightAdjust': 1.0, 'compact': True},
+    {'border': 3.0, 'frame': True, 'decompose': 'optimal', 'center': True},
+    {'threshold': 200, 'borderStyle': 'outline', 'border': 1.0},
+])
+def test_plan_render_matches_command_line(tmp_path, monkeypatch, options):
+    output = tmp_path / 'shape.scad'
+    argv = [f'--{name}' if value is True else f'--{name}={value}' for name, value in options.items()]
+    run_cli('tests/test-shape.png', '-o', str(output), *argv)
+    monkeypatch.chdir(ROOT)
+    assert gib.plan_baseplate('tests/test-shape.png', CONFIG, **options).render() == output.read_text()
@@ -0,0 +1,75 @@
+"""
+Server mode (--serve): jobs only read and write files inside --serveRoot.
+"""
+
+import base64
+import os
+import shutil
+
+import pytest
+
+import generate_irregular_baseplate as gib
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def serve_root(tmp_path, monkeypatch):
+    """A server root holding a config and an image, set up like a worker process."""
+    root = tmp_path / 'root'
+    (root / 'shapes').mkdir(parents=True)
+    shutil.copy(os.path.join(ROOT, 'configs', 'config-nano.scad'), root / 'config.scad')
+    shutil.copy(os.path.join(ROOT, 'tests', 'test-shape.png'), root / 'shapes' / 'shape.png')
+    shutil.copy(os.path.join(ROOT, 'tests', 'test-shape.png'), tmp_path / 'outside.png')
+    monkeypatch.setattr(gib, 'server_worker_settings', {})
+    monkeypatch.chdir(tmp_path)
+    gib.init_server_worker(str(root), str(tmp_path / 'cache'), 1.0)
+    return root
+
+
+def test_check_job_path_confines_paths_to_the_root(serve_root):
+    for path in ['shapes/shape.png', 'shape.scad', 'new/dir/out.scad']:
+        gib.check_job_path(path, 'image')
+    for path in [str(serve_root / 'shapes' / 'shape.png'), '../outside.png', 'shapes/../../outside.png', 'shapes\\..\\..\\outside.png']:
+        with pytest.raises(ValueError, match='inside the server root'):
+            gib.check_job_path(path, 'image')
+
+    # Symbolic links are followed: only those staying inside the root are allowed
+    os.symlink(serve_root.parent / 'outside.png', serve_root / 'escape.png')
+    os.symlink(serve_root / 'shapes', serve_root / 'linked')
+    with pytest.raises(ValueError, match='resolves outside'):
+        gib.check_job_path('escape.png', 'image')
+    gib.check_job_path('linked/shape.png', 'image')
+
+
+def test_server_jobs_stay_inside_the_root(serve_root):
+    os.mkdir(serve_root / 'out')
+    status, response = gib.run_server_job({'image': 'shapes/shape.png', 'args': ['--config=config.scad', '-o', 'out/shape.scad']})
+    assert status == 200 and response['ok'], response
+    assert (serve_root / 'out' / 'shape.scad').read_text().startswith('/**')
+
+    image_base64 = base64.b64encode((serve_root / 'shapes' / 'shape.png').read_bytes()).decode('ascii')
+    status, response = gib.run_server_job({'image_base64': image_base64, 'args': ['--config=config.scad']})
+    assert status == 200 and 'machineblock(' in response['scad']
+
+    rejected = [
+        ({'image': '../outside.png'}, 'image'),
+        ({'image': str(serve_root / 'shapes' / 'shape.png')}, 'image'),
+        ({'image': 'shapes/shape.png', 'args': ['-o', '../stolen.scad']}, '-o/--output'),
+        ({'image': 'shapes/shape.png', 'args': ['--config=../config.scad']}, '--config'),
+        ({'image': 'shapes/shape.png', 'args': [f'--costModel={serve_root.parent / "model.json"}']}, '--costModel'),
+        ({'image': 'shapes/shape.png', 'args': ['--cacheDir=cache']}, '--cacheDir'),
+    ]
+    for job, option in rejected:
+        job['args'] = ['--config=config.scad'] + job.get('args', [])
+        status, response = gib.run_server_job(job)
+        assert status == 400 and option in response['error'], response
+    assert not (serve_root.parent / 'stolen.scad').exists()
+
+
+def test_only_loopback_hosts_count_as_local():
+    assert gib.is_loopback_host('')
+    assert gib.is_loopback_host('127.0.0.1')
+    assert gib.is_loopback_host('::1')
+    assert not gib.is_loopback_host('0.0.0.0')
+    assert not gib.is_loopback_host('192.168.1.10')
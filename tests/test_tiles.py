@@ -0,0 +1,59 @@
+"""
+Tiled decomposition (--tiles): strips of rows stitched by the seam pass.
+"""
+
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+import benchmark_baseplate as bench
+import generate_irregular_baseplate as gib
+
+
+@pytest.mark.parametrize('tiles', [2, 3, 5, 16])
+@pytest.mark.parametrize('seed', range(6))
+def test_tiled_greedy_matches_untiled(seed, tiles):
+    rng = np.random.default_rng(seed)
+    mask = rng.random((37, 43)) < [0.5, 0.7, 0.9][seed % 3]
+    assert gib.decompose_mask(mask, 'greedy', tiles=tiles) == gib.decompose_mask(mask, 'greedy')
+
+
+@pytest.mark.parametrize('shape', list(bench.MASK_GENERATORS))
+def test_tiled_greedy_matches_untiled_on_benchmark_shapes(shape):
+    rng = np.random.default_rng([7, list(bench.MASK_GENERATORS).index(shape)])
+    mask = bench.MASK_GENERATORS[shape](120, rng)
+    expected = gib.decompose_mask(mask, 'greedy')
+    for tiles in (2, 8):
+        assert gib.decompose_mask(mask, 'greedy', tiles=tiles) == expected
+
+
+def test_tiled_greedy_on_an_executor_matches_untiled():
+    rng = np.random.default_rng(3)
+    mask = rng.random((60, 50)) < 0.8
+    with ThreadPoolExecutor(3) as executor:
+        assert gib.decompose_mask(mask, 'greedy', executor=executor, tiles=4) == gib.decompose_mask(mask, 'greedy')
+
+
+@pytest.mark.parametrize('tiles', [2, 7])
+def test_tiled_weighted_greedy_matches_untiled(tiles):
+    rng = np.random.default_rng(tiles)
+    mask = rng.random((30, 25)) < 0.7
+    col_widths = rng.integers(1, 9, size=25)
+    row_heights = rng.integers(1, 9, size=30)
+    expected = gib.weighted_rectangle_decomposition(mask, col_widths, row_heights)
+    expected.sort(key=lambda r: (r[1], r[0]))
+    assert gib.tiled_greedy_decomposition(mask, tiles, None, col_widths, row_heights) == expected
+
+
+def test_more_strips_than_rows():
+    mask = np.array([[True, True, False], [True, True, True]])
+    assert gib.decompose_mask(mask, 'greedy', tiles=5) == gib.decompose_mask(mask, 'greedy')
+
+
+def test_tiled_optimal_keeps_the_partition():
+    rng = np.random.default_rng(1)
+    mask = rng.random((20, 20)) < 0.8
+    decompose = functools.partial(gib.decompose_mask, mask, 'optimal', max_component_cells=50)
+    assert decompose(tiles=3) == decompose()